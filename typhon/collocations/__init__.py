@@ -10,5 +10,6 @@ Created by John Mrziglod, June 2017
 
 from .collocator import *  # noqa
 from .common import *  # noqa
+from .ledger import *  # noqa
 
 __all__ = [s for s in dir() if not s.startswith('_')]
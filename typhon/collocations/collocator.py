@@ -1,19 +1,23 @@
+from concurrent.futures import ThreadPoolExecutor
 import gc
 import logging
 import traceback
-from collections import defaultdict
+from collections import defaultdict, deque
 from datetime import datetime, timedelta
 from multiprocessing import Process, Queue
+import queue
 
 import numpy as np
 import pandas as pd
 import xarray as xr
 
 from typhon.geodesy import great_circle_distance
-from typhon.geographical import GeoIndex
+from typhon.geographical import GeoIndex, GeoIndexCache
 from typhon.utils import add_xarray_groups, get_xarray_groups
 from typhon.utils.timeutils import to_datetime, to_timedelta, Timer
 
+from .ledger import CollocationLedger
+
 __all__ = [
     "Collocator",
     "check_collocation_data"
@@ -44,14 +48,9 @@ PROCESS_NAMES = [
 ]
 
 
-class ProcessCrashed(Exception):
-    """Helper exception for crashed processes"""
-    pass
-
-
 class Collocator:
     def __init__(
-            self, threads=None, name=None, #log_dir=None
+            self, threads=None, name=None, index_cache=None, #log_dir=None
     ):
         """Initialize a collocator object that can find collocations
 
@@ -60,16 +59,35 @@ class Collocator:
                 here the maximum number of threads that you want to use. Which
                 number of threads is the best, may be machine-dependent. So
                 this is a parameter that you can use to fine-tune the
-                performance. Note: Not yet implemented due to GIL usage of
-                sklearn BallTree.
+                performance. If this is greater than one, the spatial index
+                is a KD tree from scipy (which releases the GIL) instead of
+                the BallTree from scikit-learn. The temporal bins are then
+                searched in parallel, a single search uses all threads to
+                query the index. Default is None (no parallelization).
             name: The name of this collocator, will be used in log statements.
+            index_cache: A :class:`~typhon.geographical.GeoIndexCache` object
+                that keeps the spatial indices. Data on a fixed grid (e.g.
+                from geostationary satellites) recur in many files, the
+                index for the grid is only built once then. Pass a cache with
+                a `directory` to reuse the indices in other processes or
+                later runs. Pass a cache with `detect_grids=True` to use the
+                faster :class:`~typhon.geographical.GridIndex` for data on
+                regular latitude-longitude grids (note that it measures great
+                circle instead of tunnel distances, so pairs close to
+                `max_distance` may differ). Default is an in-memory cache with
+                four indices.
         """
 
         self.empty = None  # xr.Dataset()
 
+        # The last used index:
         self.index = None
         self.index_with_primary = False
 
+        if index_cache is None:
+            index_cache = GeoIndexCache()
+        self.index_cache = index_cache
+
         self.threads = threads
 
         # These optimization parameters will be overwritten in collocate
@@ -80,6 +98,9 @@ class Collocator:
 
         self.name = name if name is not None else "Collocator"
 
+        # Throughput statistics of the last run of collocate_filesets:
+        self.statistics = None
+
     # If no collocations are found, this will be returned. We need empty
     # arrays to concatenate the results without problems:
     @property
@@ -109,7 +130,7 @@ class Collocator:
     def collocate_filesets(
             self, filesets, start=None, end=None, processes=None, output=None,
             bundle=None, skip_file_errors=False, post_processor=None,
-            post_processor_kwargs=None, **kwargs
+            post_processor_kwargs=None, max_retries=1, ledger=None, **kwargs
     ):
         """Find collocation between the data of two filesets
 
@@ -134,7 +155,9 @@ class Collocator:
                 datetime.max per default.
             processes: Collocating can be parallelized which improves the
                 performance significantly. Pass here the number of processes to
-                use.
+                use. The processes pull the file matches one after another
+                from a common queue, i.e. a process that finished a small
+                match immediately continues with the next one.
             output: Fileset object where the collocated data should be stored.
             bundle: Set this to *primary* if you want to bundle the output 
                 files by their collocated primaries, i.e. there will be only 
@@ -143,8 +166,8 @@ class Collocator:
                 collocations for each file match will be saved separately.
                 This might lead to a high number of output files.
                 Note: *daily* means one process bundles all collocations from
-                one day into one output file. If using multiple processes, this
-                could still produce several daily output files per day.
+                one day into one output file. All file matches whose primary
+                starts on the same day are processed by the same process.
             skip_file_errors: If this is *True* and a file could not be read, 
                 the file and its match will be skipped and a warning will be 
                 printed. Otheriwse the program will stop (default).
@@ -154,6 +177,16 @@ class Collocator:
                 the path attributes from the collocated files.
             post_processor_kwargs: A dictionary with keyword arguments that
                 should be passed to `post_processor`.
+            max_retries: How often a file match should be retried if
+                collocating it failed or its process crashed. Default is 1.
+            ledger: Path to a SQLite file (or a
+                :class:`~typhon.collocations.ledger.CollocationLedger`
+                object) that records which file matches have already been
+                collocated and stored in `output`. If you run the
+                collocation search again (e.g. after it has been interrupted
+                or with a later end date), these matches are skipped and only the missing or failed
+                matches are processed. The filenames of the skipped matches
+                are yielded nevertheless. Requires `output`.
             **kwargs: Further keyword arguments that are allowed for
                 :meth:`collocate`.
 
@@ -162,7 +195,10 @@ class Collocator:
             If `output` is set to a FileSet-like object, only the filename of
             the stored collocations is yielded. The results are not ordered if
             you use more than one process. For more information about the 
-            yielded xarray.Dataset have a look at :meth:`collocate`.
+            yielded xarray.Dataset have a look at :meth:`collocate`. After
+            the iteration, the throughput statistics of the run (number of
+            finished, failed and retried tasks, task durations, etc.) are
+            logged and stored in the attribute `statistics`.
 
         Examples:
 
@@ -200,25 +236,89 @@ class Collocator:
         if processes is None:
             processes = 1
 
-        # Make sure that there are never more processes than matches
-        processes = min(processes, len(matches))
+        # The scheduler distributes tasks instead of matches. A task is the
+        # smallest unit that can be processed independently (one match or
+        # all matches of one day when bundling daily):
+        tasks = self._make_tasks(matches, bundle)
 
         total_matches = sum(len(match[1]) for match in matches)
+        statistics = {
+            "tasks": len(tasks), "matches": total_matches, "finished": 0,
+            "finished_matches": 0, "failed": 0, "retried": 0, "crashed": 0,
+            "skipped": 0, "skipped_matches": 0, "task_durations": [],
+        }
+
+        # The ids of all tasks that have been neither finished nor given up:
+        remaining = set(range(len(tasks)))
+
+        # Skip all tasks that have been finished during a previous run:
+        if ledger is not None:
+            if output is None:
+                raise ValueError("A ledger can only be used with output!")
+            if isinstance(ledger, str):
+                ledger = CollocationLedger(ledger)
+            ledger.check_output(output.path)
+
+            # Only the parameters that change the collocations of a match
+            # or the files they are written to are part of its key. The
+            # search period matters only where it cuts the files of the match:
+            parameters = {
+                **kwargs,
+                "bundle": bundle,
+                "output": output.path,
+                "post_processor": getattr(
+                    post_processor, "__qualname__", post_processor),
+                "post_processor_kwargs": post_processor_kwargs,
+            }
+            task_keys = [
+                [
+                    ledger.task_key([match], {
+                        **parameters,
+                        "period": self._match_period(match, start, end)
+                    })
+                    for match in task
+                ]
+                for task in tasks
+            ]
+
+            # Several matches may share an output (when bundling):
+            skipped_outputs = set()
+            for task_id, keys in enumerate(task_keys):
+                if all(ledger.is_finished(key) for key in keys):
+                    remaining.discard(task_id)
+                    statistics["skipped"] += 1
+                    statistics["skipped_matches"] += sum(
+                        len(match[1]) for match in tasks[task_id])
+                    for key in keys:
+                        for filename in ledger.get(key)["outputs"]:
+                            if filename not in skipped_outputs:
+                                skipped_outputs.add(filename)
+                                yield filename
+
+            self._info(f"Skip {statistics['skipped']} finished task(s)")
+
+        # Make sure that there are never more processes than tasks
+        processes = min(processes, len(remaining))
+
         self._info(f"using {processes} process(es) on {total_matches} matches")
 
+        if not remaining:
+            statistics["elapsed"] = timer.elapsed
+            self.statistics = statistics
+            return
+
         # MAGIC with processes
-        # Each process gets a list with matches. Important: the matches should
-        # be continuous to guarantee a good performance. After finishing one
-        # match, the process pushes its results to the result queue. If errors
-        # are raised during collocating, the raised errors are pushed to the 
-        # error queue,
-        matches_chunks = np.array_split(matches, processes)
-
-        # This queue collects all results:
-        results = Queue(maxsize=processes)
+        # Each process has its own inbox and gets the next pending task as
+        # soon as it has pushed the results of the previous one to the result
+        # queue. Hence, processes with small granules do not wait for
+        # processes with large ones. The main process assigns the tasks
+        # itself, so it always knows which task has to be retried if a
+        # process crashes (even if it crashes before starting the task).
+        pending = deque(sorted(remaining))
+        assigned = [None] * processes
+        inboxes = [None] * processes
 
-        # This queue collects all error exceptions
-        errors = Queue()
+        results = Queue(maxsize=processes)
 
         # Extend the keyword arguments that we are going to pass to
         # _collocate_files:
@@ -233,101 +333,194 @@ class Collocator:
             "post_processor_kwargs": post_processor_kwargs,
         })
 
-        # This list contains all running processes
-        process_list = [
-            Process(
+        def start_worker(slot, generation):
+            name = PROCESS_NAMES[
+                (slot + generation * processes) % len(PROCESS_NAMES)]
+            # A new inbox, the old one might still contain the task that
+            # has been assigned to the crashed process:
+            inboxes[slot] = Queue()
+            process = Process(
                 target=Collocator._process_caller,
-                args=(
-                    self, results, errors, PROCESS_NAMES[i],
-                ),
-                kwargs={**kwargs, "matches": matches_chunk},
+                args=(self, inboxes[slot], results, slot, name),
+                kwargs=kwargs,
                 daemon=True,
             )
-            for i, matches_chunk in enumerate(matches_chunks)
-        ]
-
-        # We want to keep track of the progress of the collocation search since
-        # it may take a while.
-        process_progress = {
-            name: 0.  # Each process is at 0 percent at the beginning
-            for name in PROCESS_NAMES[:processes]
-        }
-
-        # Start all processes:
-        for process in process_list:
             process.start()
+            return process
+
+        def dispatch():
+            # Give the pending tasks to the idle processes:
+            for slot in range(processes):
+                while assigned[slot] is None and pending:
+                    task_id = pending.popleft()
+                    if task_id in remaining:
+                        assigned[slot] = task_id
+                        inboxes[slot].put((task_id, tasks[task_id]))
+
+        workers = [start_worker(slot, 0) for slot in range(processes)]
+
+        attempts = defaultdict(int)
+        errors = {}
+
+        def retry_or_give_up(task_id, error):
+            attempts[task_id] += 1
+            if attempts[task_id] <= max_retries:
+                statistics["retried"] += 1
+                self._info(f"Retry task {task_id} ({error.splitlines()[-1]})")
+                pending.append(task_id)
+            else:
+                statistics["failed"] += 1
+                remaining.discard(task_id)
+                errors[task_id] = error
+                if ledger is not None:
+                    for key in task_keys[task_id]:
+                        ledger.set_failed(key, error)
+
+        # The main process has three tasks during its child processes are
+        # collocating.
+        # 1) Collect their results and yield them to the user
+        # 2) Restart crashed processes and retry their tasks
+        # 3) Display the progress and estimate the remaining processing time
+        try:
+            while remaining:
+                for slot, process in enumerate(workers):
+                    if process.is_alive():
+                        continue
+
+                    # The process must have crashed since all processes
+                    # run until all tasks are done.
+                    statistics["crashed"] += 1
+                    task_id = assigned[slot]
+                    assigned[slot] = None
+                    if task_id in remaining:
+                        retry_or_give_up(
+                            task_id, f"Process {process.name} crashed with "
+                                     f"exit code {process.exitcode}"
+                        )
+                    workers[slot] = start_worker(
+                        slot, statistics["crashed"])
+
+                dispatch()
 
-        # As long as some processes are still running, wait for their results:
-        running = process_list.copy()
-
-        processed_matches = 0
+                try:
+                    # Wait for the next result but check regularly whether
+                    # all processes are still alive:
+                    slot, status, name, task_id, payload, duration = \
+                        results.get(timeout=1)
+                except queue.Empty:
+                    continue
 
-        # The main process has two tasks during its child processes are
-        # collocating. 
-        # 1) Collect their results and yield them to the user
-        # 2) Display the progress and estimate the remaining processing time
-        while running:
+                # The process is idle now (unless it has been restarted and
+                # got another task in the meantime):
+                if assigned[slot] == task_id:
+                    assigned[slot] = None
+                dispatch()
 
-            # Filter out all processes that are dead: they either crashed or
-            # complete their task
-            running = [
-                process for process in running if process.is_alive()
-            ]
+                # A task could have been retried although it succeeded (if
+                # the process crashed right after finishing it). We do not
+                # want to yield its results twice:
+                if task_id not in remaining:
+                    continue
 
-            # Get all results from the result queue
-            while not results.empty():
-                process, progress, result = results.get()
+                if status == "failed":
+                    self._error(
+                        f"Process {name} failed on task {task_id}")
+                    retry_or_give_up(task_id, payload)
+                    continue
 
-                # The process might be crashed. To keep the remaining time
-                # estimation useful, we exclude the crashed process from the
-                # calculation.
-                if result is ProcessCrashed:
-                    del process_progress[process]
-                else:
-                    process_progress[process] = progress
+                remaining.discard(task_id)
+                if ledger is not None:
+                    for key in task_keys[task_id]:
+                        ledger.set_finished(key, payload)
+                statistics["finished"] += 1
+                statistics["finished_matches"] += sum(
+                    len(match[1]) for match in tasks[task_id])
+                statistics["task_durations"].append(duration)
 
-                try:
-                    nerrors = errors.qsize()
-                except NotImplementedError:
-                    nerrors = 'unknown'
+                self._print_progress(timer.elapsed, statistics)
 
-                self._print_progress(
-                    timer.elapsed, process_progress, len(running), nerrors)
-                if result is not None:
-                    yield result
+                yield from payload
 
                 # Explicit free up memory:
+                del payload
                 gc.collect()
+        finally:
+            # Tell all processes that there is no work left. If the user
+            # stopped the iteration, the processes are terminated instead.
+            for inbox in inboxes:
+                inbox.put(None)
+            for process in workers:
+                if remaining:
+                    process.terminate()
+                process.join()
+
+            statistics["elapsed"] = timer.elapsed
+            self.statistics = statistics
 
-        for process in process_list:
-            process.join()
+        self._info(self._format_statistics(statistics))
 
-        if not errors.empty():
-            self._error("Some processes terminated due to errors:")
+        if errors:
+            self._error("Some tasks failed due to errors:")
 
-        while not errors.empty():
-            error = errors.get()
+        for task_id, error in errors.items():
             msg = '\n'.join([
                 "-"*79,
-                error[2],
-                "".join(traceback.format_tb(error[1])),
+                f"Task {task_id} ({len(tasks[task_id])} match(es) from "
+                f"{tasks[task_id][0][0].times[0]}) failed after "
+                f"{attempts[task_id]} attempt(s):",
+                error,
                 "-" * 79 + "\n"
             ])
             self._error(msg)
 
     @staticmethod
-    def _print_progress(elapsed_time, process_progress, processes, errors):
+    def _make_tasks(matches, bundle):
+        """Split the matches into tasks for the scheduler
 
-        elapsed_time -= timedelta(microseconds=elapsed_time.microseconds)
-        if len(process_progress) == 0:
-            msg = "-"*79 + "\n"
-            msg += f"100% | {elapsed_time} hours elapsed | " \
-                   f"{errors} processes failed\n"
-            msg += "-"*79 + "\n"
-            logger.error(msg)
-            return
+        Args:
+            matches: A list of matches as yielded by
+                :meth:`~typhon.files.fileset.FileSet.match`.
+            bundle: The `bundle` option of :meth:`collocate_filesets`.
 
-        progress = sum(process_progress.values()) / len(process_progress)
+        Returns:
+            A list of tasks. Each task is a list of matches.
+        """
+        if bundle != "daily":
+            # Each match has only one primary, so we can bundle by primaries
+            # within one task:
+            return [[match] for match in matches]
+
+        # All matches from one day have to be processed by the same process:
+        tasks = []
+        for match in matches:
+            day = match[0].times[0].date()
+            if tasks and tasks[-1][0][0].times[0].date() == day:
+                tasks[-1].append(match)
+            else:
+                tasks.append([match])
+        return tasks
+
+    @staticmethod
+    def _match_period(match, start, end):
+        """Get the part of the search period that overlaps with a match
+
+        Returns:
+            A list with the start and end as datetime objects.
+        """
+        files = [match[0], *match[1]]
+        return [
+            max(start, min(file.times[0] for file in files)),
+            min(end, max(file.times[1] for file in files)),
+        ]
+
+    @staticmethod
+    def _print_progress(elapsed_time, statistics):
+
+        elapsed_time -= timedelta(microseconds=elapsed_time.microseconds)
+        # Skipped matches do not count, otherwise the remaining time would be
+        # underestimated:
+        progress = 100 * statistics["finished_matches"] \
+            / max(statistics["matches"] - statistics["skipped_matches"], 1)
 
         try:
             expected_time = elapsed_time * (100 / progress - 1)
@@ -338,38 +531,89 @@ class Collocator:
 
         msg = "-"*79 + "\n"
         msg += f"{progress:.0f}% | {elapsed_time} hours elapsed, " \
-               f"{expected_time} hours left | {processes} proc running, " \
-               f"{errors} failed\n"
+               f"{expected_time} hours left | " \
+               f"{statistics['finished']}/{statistics['tasks']} tasks done, " \
+               f"{statistics['failed']} failed\n"
         msg += "-"*79 + "\n"
         logger.error(msg)
 
     @staticmethod
-    def _process_caller(
-            self, results, errors, name, output, bundle, post_processor,
-            post_processor_kwargs, **kwargs):
-        """Wrapper around _collocate_matches
+    def _format_statistics(statistics):
+        """Summarize the throughput statistics of collocate_filesets"""
+        elapsed = statistics["elapsed"].total_seconds()
+        throughput = 3600 * statistics["finished_matches"] / max(elapsed, 1e-9)
+        durations = statistics["task_durations"]
+        msg = f"Finished {statistics['finished']} of {statistics['tasks']} " \
+              f"tasks ({statistics['finished_matches']} matches) in " \
+              f"{statistics['elapsed']}: {throughput:.1f} matches per hour, " \
+              f"{statistics['failed']} failed, " \
+              f"{statistics['retried']} retried, " \
+              f"{statistics['skipped']} skipped, " \
+              f"{statistics['crashed']} process crash(es)"
+        if durations:
+            msg += f", task duration: mean {np.mean(durations):.1f}s, " \
+                   f"max {np.max(durations):.1f}s"
+        return msg
 
-        This function is called for each process. It communicates with the main
-        process via the result and error queue.
+    @staticmethod
+    def _process_caller(self, inbox, results, slot, name, **kwargs):
+        """Worker function of the processes of collocate_filesets
 
-        Result Queue:
-            Adds for each collocated file match the process name, its progress
-            and the actual results.
+        The process pulls tasks from its inbox until it gets None. It
+        communicates with the main process via the result queue.
 
-        Error Queue:
-            If an error is raised, the name of this proces and the error
-            messages is put to this queue.
+        Result Queue:
+            Adds for each task a list with the slot of this process, the
+            status (*finished* or *failed*), the name of this process, the
+            task id, the results of the task (or the error message) and the
+            duration of the task in seconds.
         """
         self.name = name
 
-        # We keep track of how many file pairs we have already processed to
-        # make the error debugging easier. We need the match in flat form:
-        matches = [
-            [match[0], secondary]
-            for match in kwargs['matches']
-            for secondary in match[1]
-        ]
+        while True:
+            task = inbox.get()
+            if task is None:
+                break
+
+            task_id, matches = task
+            timer = Timer(verbose=False).start()
+
+            try:
+                # Do not send any result before the task is complete. If the
+                # task is retried, we would yield results twice otherwise.
+                collocated = [
+                    result
+                    for result in self._collocate_bundles(
+                        matches=matches, **kwargs)
+                    if result is not None
+                ]
+                message = ["finished", name, task_id, collocated]
+            except Exception as exception:
+                self._error(exception)
+
+                # The main process needs to know about this exception! We
+                # cannot send the traceback object itself since it cannot be
+                # pickled:
+                message = [
+                    "failed", name, task_id,
+                    f"Failed to collocate {matches[0][0].path} with "
+                    f"{[file.path for file in matches[0][1]]}\n"
+                    + traceback.format_exc()
+                ]
+
+            timer.stop()
+            results.put([slot, *message, timer.elapsed.total_seconds()])
+
+        self._info("Finished all tasks")
+
+    def _collocate_bundles(
+            self, output, bundle, post_processor, post_processor_kwargs,
+            **kwargs):
+        """Collocate matches and bundle the results
 
+        Yields:
+            The results of :meth:`_save_and_return` for each bundle.
+        """
         # If we want to bundle the output, we need to collect some contents.
         # The current_bundle_tag stores a certain information for the current
         # bundle (e.g. filename of primary or day of the year). If it changes,
@@ -377,97 +621,66 @@ class Collocator:
         cached_data = []
         cached_attributes = {}
         current_bundle_tag = None
-        try:
-            processed = 0
-            collocated_matches = self._collocate_matches(**kwargs)
-            for collocations, attributes in collocated_matches:
-                match = matches[processed]
-                processed += 1
-                progress = 100 * processed / len(matches)
-
-                if collocations is None:
-                    results.put([name, progress, None])
-                    continue
 
-                # The user does not want to bundle anything therefore just save
-                # the current collocations
-                if bundle is None:
-                    result = self._save_and_return(
-                            collocations, attributes, output,
-                            post_processor, post_processor_kwargs
-                    )
-                    results.put([name, progress, result])
-                    continue
+        # We need the matches in flat form to know which match belongs to
+        # which collocations:
+        matches = [
+            [match[0], secondary]
+            for match in kwargs['matches']
+            for secondary in match[1]
+        ]
 
-                # The user may want to bundle the collocations before writing
-                # them to disk, e.g. by their primaries.
-                save_cache = self._should_save_cache(
-                        bundle, current_bundle_tag, match,
-                        to_datetime(collocations.attrs["start_time"])
-                )
+        collocated_matches = self._collocate_matches(**kwargs)
+        for match, (collocations, attributes) in zip(
+                matches, collocated_matches):
+            if collocations is None:
+                continue
 
-                if save_cache:
-                    result = self._save_and_return(
-                        cached_data,
-                        cached_attributes, output,
+            # The user does not want to bundle anything therefore just save
+            # the current collocations
+            if bundle is None:
+                yield self._save_and_return(
+                        collocations, attributes, output,
                         post_processor, post_processor_kwargs
-                    )
-                    results.put([name, progress, result])
-
-                    cached_data = []
-                    cached_attributes = {}
-
-                # So far, we have not cached any collocations or we still need
-                # to wait before saving them to disk.
-                cached_data.append(collocations)
-                cached_attributes.update(**attributes)
+                )
+                continue
 
-                if bundle == "primary":
-                    current_bundle_tag = match[0].path
-                elif bundle == "daily":
-                    current_bundle_tag = \
-                        to_datetime(collocations.attrs["start_time"]).date()
+            # The user may want to bundle the collocations before writing
+            # them to disk, e.g. by their primaries.
+            save_cache = self._should_save_cache(
+                    bundle, current_bundle_tag, match,
+                    to_datetime(collocations.attrs["start_time"])
+            )
 
-            # After all iterations, save last cached data to disk:
-            if cached_data:
-                result = self._save_and_return(
+            if save_cache:
+                yield self._save_and_return(
                     cached_data,
                     cached_attributes, output,
                     post_processor, post_processor_kwargs
                 )
-                results.put([name, progress, result])
 
-        except Exception as exception:
-            # Tell the main process to stop considering this process for the 
-            # remaining processing time:
-            results.put(
-                [name, 100., ProcessCrashed]
+                cached_data = []
+                cached_attributes = {}
+
+            # So far, we have not cached any collocations or we still need
+            # to wait before saving them to disk.
+            cached_data.append(collocations)
+            cached_attributes.update(**attributes)
+
+            if bundle == "primary":
+                current_bundle_tag = match[0].path
+            elif bundle == "daily":
+                current_bundle_tag = \
+                    to_datetime(collocations.attrs["start_time"]).date()
+
+        # After all iterations, save last cached data to disk:
+        if cached_data:
+            yield self._save_and_return(
+                cached_data,
+                cached_attributes, output,
+                post_processor, post_processor_kwargs
             )
 
-            self._error("ERROR: I got a problem and terminate!")
-
-            # Build a message that contains all important information for
-            # debugging:
-
-            msg = f"Process {name} ({matches[0][0].times[0]} -" \
-                f"{matches[-1][0].times[1]}) failed\n" \
-                f"Failed to collocate {matches[processed]} with"\
-                f"{matches[processed]}\n"
-
-            # The main process needs to know about this exception!
-            error = [
-                name, exception.__traceback__,
-                msg + "ERROR: " + str(exception)
-            ]
-            errors.put(error)
-
-            self._error(exception)
-
-            # Finally, raise the exception to terminate this process:
-            raise exception
-
-        self._info(f"Finished all {len(matches)} matches")
-
     def _save_and_return(self, collocations, attributes, output,
             post_processor, post_processor_kwargs):
         """Save collocations to disk or return them"""
@@ -1232,22 +1445,21 @@ class Collocator:
             for bin_pair in bin_pairs
         )
 
-        # Unfortunately, a first attempt parallelizing this using threads
-        # worsened the performance. Update: The BallTree code from scikit-learn
-        # does not release the GIL. But apparently there will be a new version
-        # coming that solves this problem, see this scikit-learn issue:
-        # https://github.com/scikit-learn/scikit-learn/pull/10887. So stay
-        # tuned!
-        # threads = 1 if self.threads is None else self.threads
+        # The BallTree code from scikit-learn does not release the GIL, hence
+        # parallelizing the bins with threads worsened the performance. The
+        # KD tree from scipy releases it, so we use it when searching the bins
+        # in parallel. Each bin gets its own index then, the cached index
+        # cannot be shared between threads.
         t = Timer(verbose=False).start()
-        # with ThreadPoolExecutor(max_workers=2) as pool:
-        #     results = list(pool.map(
-        #         Collocator._spatial_search_bin, bins_with_args
-        #     ))
-
-        results = list(map(
-            Collocator._spatial_search_bin, bins_with_args
-        ))
+        if self._is_parallel():
+            with ThreadPoolExecutor(max_workers=self.threads) as pool:
+                results = list(pool.map(
+                    Collocator._spatial_search_bin, bins_with_args
+                ))
+        else:
+            results = list(map(
+                Collocator._spatial_search_bin, bins_with_args
+            ))
 
         self._debug(f"Collocated {len(results)} bins in {t.stop()}")
 
@@ -1286,20 +1498,25 @@ class Collocator:
 
         pairs, distances = self.spatial_search(
             data1["lat"].values, data1["lon"].values,
-            data2["lat"].values, data2["lon"].values, max_distance
+            data2["lat"].values, data2["lon"].values, max_distance,
+            cache=not self._is_parallel(),
         )
         pairs[0] += offset1
         pairs[1] += offset2
         return pairs, distances
 
-    def spatial_search(self, lat1, lon1, lat2, lon2, max_distance):
-        # Finding collocations is expensive, therefore we want to optimize it
-        # and have to decide which points to use for the index building.
-        index_with_primary = self._choose_points_to_build_index(
-            [lat1, lon1], [lat2, lon2],
-        )
-
-        self.index_with_primary = index_with_primary
+    def spatial_search(
+            self, lat1, lon1, lat2, lon2, max_distance, cache=True):
+        if cache:
+            # Finding collocations is expensive, therefore we want to optimize
+            # it and have to decide which points to use for the index building.
+            index_with_primary = self._choose_points_to_build_index(
+                [lat1, lon1], [lat2, lon2],
+            )
+            self.index_with_primary = index_with_primary
+        else:
+            # Without caching, the larger dataset is always the better choice:
+            index_with_primary = lat1.size > lat2.size
 
         if index_with_primary:
             build_points = lat1, lon1
@@ -1308,8 +1525,16 @@ class Collocator:
             build_points = lat2, lon2
             query_points = lat1, lon1
 
-        self.index = self._build_spatial_index(*build_points)
-        pairs, distances = self.index.query(*query_points, r=max_distance)
+        if cache:
+            self.index = self._build_spatial_index(*build_points)
+            index = self.index
+        else:
+            # This runs in a thread, the index must not use further threads:
+            index = GeoIndex(
+                *build_points, leaf_size=self.leaf_size,
+                **self._index_options(workers=1)
+            )
+        pairs, distances = index.query(*query_points, r=max_distance)
 
         # No collocations were found.
         if not pairs.any():
@@ -1324,25 +1549,28 @@ class Collocator:
         return pairs, distances
 
     def _build_spatial_index(self, lat, lon):
-        # Find out whether the cached index still works with the new points:
-        if self._spatial_is_cached(lat, lon):
-            self._debug("Spatial index is cached and can be reused")
-            return self.index
+        # The cache recognizes points that have been indexed before:
+        return self.index_cache.get(
+            lat, lon, leaf_size=self.leaf_size,
+            **self._index_options(workers=self.threads)
+        )
 
-        return GeoIndex(lat, lon, leaf_size=self.leaf_size)
+    def _is_parallel(self):
+        return self.threads is not None and self.threads > 1
 
-    def _spatial_is_cached(self, lat, lon):
-        """Return True if the cached ball tree is still applicable to the new
-        data"""
-        if self.index is None:
-            return False
+    def _index_options(self, workers):
+        """Return the options for GeoIndex depending on the parallelization"""
+        if not self._is_parallel():
+            return {}
 
-        try:
-            return np.allclose(lat, self.index.lat) \
-                   & np.allclose(lon, self.index.lon)
-        except ValueError:
-            # The shapes are different
-            return False
+        return {"tree_class": "cKD", "workers": workers}
+
+    def _spatial_is_cached(self, lat, lon):
+        """Return True if there is a cached index for the data"""
+        return self.index_cache.contains(
+            lat, lon, leaf_size=self.leaf_size,
+            **self._index_options(workers=self.threads)
+        )
 
     def _choose_points_to_build_index(self, primary, secondary):
         """Choose which points should be used for tree building
@@ -1377,14 +1605,10 @@ class Collocator:
             return False
 
         # Apparently, none of the datasets is much larger than the others. So
-        # just check whether we still have a cached tree. If we used the
-        # primary points last time and they still fit, use them again:
-        if self.index_with_primary and self._spatial_is_cached(*primary):
-            return True
-
-        # Check the same for the secondary data:
-        if not self.index_with_primary and self._spatial_is_cached(*secondary):
-            return False
+        # just check whether we have a cached tree for one of them:
+        primary_is_cached = self._spatial_is_cached(*primary)
+        if primary_is_cached != self._spatial_is_cached(*secondary):
+            return primary_is_cached
 
         # Otherwise, just use the larger dataset:
         return primary[0].size > secondary[0].size
@@ -0,0 +1,226 @@
+"""
+This module contains a persistent ledger for collocation campaigns.
+
+Searching collocations between two filesets over several months may take days.
+If :meth:`~typhon.collocations.collocator.Collocator.collocate_filesets` is
+interrupted (e.g. the job got killed), the :class:`CollocationLedger` allows
+to resume it: it records which file matches have already been collocated and
+stored, so only the missing or failed ones are processed again.
+"""
+
+from contextlib import closing
+from datetime import datetime
+import hashlib
+import json
+import os
+import sqlite3
+
+__all__ = [
+    "CollocationLedger",
+]
+
+
+class CollocationLedger:
+    """Persistent record of finished collocation tasks
+
+    You normally do not need to use this class directly, simply pass a
+    filename to the `ledger` parameter of
+    :meth:`~typhon.collocations.collocator.Collocator.collocate_filesets`.
+
+    Each file match is identified by the paths of its primary and secondary
+    files, the collocation parameters and the part of the search period that
+    overlaps with its files. Hence, if you change a parameter (e.g.
+    `max_distance`), all matches are processed again. If you only extend the
+    search period or change the bundling, the finished matches are skipped.
+    A ledger belongs to one output fileset, it is reset if it is used with
+    another one.
+
+    Examples:
+
+    .. code-block:: python
+
+        from typhon.collocations import Collocations
+
+        collocations = Collocations(
+            path="/path/{year}/{doy}/{hour}{minute}{second}.nc"
+        )
+
+        # If this gets interrupted, simply run it again. Already stored
+        # collocations will be skipped.
+        collocations.search(
+            [mhs, seviri], start="2013-12-10", end="20 Dec 2013",
+            processes=10, max_interval="5 min", max_distance="5 km",
+            ledger="/path/ledger.sqlite",
+        )
+    """
+
+    def __init__(self, filename):
+        """Initialize a CollocationLedger object
+
+        Args:
+            filename: Path to the SQLite database. It will be created if it
+                does not exist yet.
+        """
+        self.filename = filename
+
+        with closing(self._connect()) as connection, connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    key TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    outputs TEXT,
+                    error TEXT,
+                    updated TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+
+    def __len__(self):
+        with closing(self._connect()) as connection:
+            return connection.execute(
+                "SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def __repr__(self):
+        return f"CollocationLedger('{self.filename}')"
+
+    def _connect(self):
+        # We open a new connection for each operation. Connections cannot be
+        # pickled and the collocator is passed to other processes.
+        return sqlite3.connect(self.filename, timeout=60)
+
+    def check_output(self, output):
+        """Make sure that the ledger belongs to an output
+
+        The outputs of the recorded tasks are not in another output fileset.
+        Hence, all records are removed if the ledger has been used with
+        another one.
+
+        Args:
+            output: The path (with placeholders) of the output fileset.
+
+        Returns:
+            None
+        """
+        with closing(self._connect()) as connection, connection:
+            row = connection.execute(
+                "SELECT value FROM meta WHERE key = 'output'").fetchone()
+            if row is not None and row[0] == output:
+                return
+            connection.execute("DELETE FROM tasks")
+            connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) "
+                "VALUES ('output', ?)", (output,)
+            )
+
+    @staticmethod
+    def task_key(matches, parameters):
+        """Create the key of a collocation task
+
+        Args:
+            matches: A list of matches, i.e. tuples of a primary
+                :class:`~typhon.files.handlers.common.FileInfo` object and a
+                list with its secondary FileInfo objects.
+            parameters: A dictionary with the collocation parameters. Values
+                that cannot be converted to JSON are converted to strings.
+
+        Returns:
+            A string with the hexadecimal SHA-1 hash of the task.
+        """
+        content = json.dumps(
+            [
+                [[primary.path, [file.path for file in secondaries]]
+                 for primary, secondaries in matches],
+                parameters,
+            ],
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha1(content.encode()).hexdigest()
+
+    def get(self, key):
+        """Get the record of a task
+
+        Args:
+            key: The key of the task (see :meth:`task_key`).
+
+        Returns:
+            None if the task is unknown. Otherwise, a dictionary with the
+            keys *status* (*finished* or *failed*), *outputs* (a list of
+            filenames), *error* and *updated* (the time of the last update).
+        """
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT status, outputs, error, updated FROM tasks "
+                "WHERE key = ?", (key,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        status, outputs, error, updated = row
+        return {
+            "status": status,
+            "outputs": json.loads(outputs) if outputs else [],
+            "error": error,
+            "updated": updated,
+        }
+
+    def is_finished(self, key):
+        """Check whether a task has been finished and its outputs still exist
+
+        Args:
+            key: The key of the task (see :meth:`task_key`).
+
+        Returns:
+            True or False
+        """
+        record = self.get(key)
+        return record is not None and record["status"] == "finished" \
+            and all(os.path.exists(output) for output in record["outputs"])
+
+    def set_finished(self, key, outputs):
+        """Mark a task as finished
+
+        Args:
+            key: The key of the task (see :meth:`task_key`).
+            outputs: A list with the filenames that were written by the task.
+
+        Returns:
+            None
+        """
+        self._set(key, "finished", json.dumps(list(outputs)), None)
+
+    def set_failed(self, key, error):
+        """Mark a task as failed
+
+        Failed tasks are processed again at the next run.
+
+        Args:
+            key: The key of the task (see :meth:`task_key`).
+            error: The error message.
+
+        Returns:
+            None
+        """
+        self._set(key, "failed", None, error)
+
+    def _set(self, key, status, outputs, error):
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO tasks "
+                "(key, status, outputs, error, updated) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, status, outputs, error, datetime.now().isoformat())
+            )
+
+    def reset(self):
+        """Remove all records from the ledger
+
+        Returns:
+            None
+        """
+        with closing(self._connect()) as connection, connection:
+            connection.execute("DELETE FROM tasks")
+            connection.execute("DELETE FROM meta")
@@ -14,14 +14,15 @@ import itertools
 import logging
 import pathlib
 import re
-import shelve
+import sqlite3
 import string
-import shutil
-import tempfile
 import datetime
 import sys
 import collections
+import functools
 import warnings
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import numpy
 import numpy.lib.arraysetops
@@ -38,9 +39,17 @@ from ..physics.units import em
 from ..constants import MiB
 
 from . import filters
+from .granules import GranuleIndex, locator_key
 
 logger = logging.getLogger(__name__)
 
+# Directory for the results of Dataset.read and Dataset.read_period, so
+# that other processes can load them instead of reading the files again.
+# Set it in the section [main] of the configuration file or via the
+# attribute *cache* of these methods, e.g.
+# Dataset.read_period.cache.directory = "/path/to/cache":
+_cache_directory = config.conf.get("main", "cachedir", fallback=None)
+
 try:
     import progressbar
 except ImportError:
@@ -144,6 +153,11 @@ class Dataset(metaclass=abc.ABCMeta):
     read_returns = "ndarray"
     default_orbit_filters = []
 
+    # sorting orders of the keys of secondaries in combine, by the identity
+    # of the (read-only) key arrays; replace it or change its max_bytes to
+    # configure its size
+    key_index_cache = utils.cache.ResultCache(max_bytes=512*MiB)
+
     # in case of xarray returns, if concatenation is NOT along time
     # coordinate, this should be set to something else
     concat_coor = None
@@ -195,6 +209,15 @@ class Dataset(metaclass=abc.ABCMeta):
         else:
             raise AttributeError("Unknown attribute: {}. ".format(k))
 
+    def _cache_identity(self):
+        """Identify the dataset in the keys of the result caches
+
+        Datasets are singletons per class and name, hence this is also
+        valid in other processes (other than the identity of the object).
+        """
+        return f"{type(self).__module__}.{type(self).__qualname__}:" \
+               f"{self.name}"
+
     def setlocal(self):
         """Set local attributes, from config or otherwise.
 
@@ -269,9 +292,11 @@ class Dataset(metaclass=abc.ABCMeta):
         """
         ...
 
-    # Cannot use functools.lru_cache because it cannot handle mutable
-    # results or arguments
-    @utils.cache.mutable_cache(maxsize=10)
+    # Results are cached by the content of the arguments, the class and name
+    # of the dataset and the modification time of files. They are returned
+    # as read-only views, copy them before modifying them in-place.
+    @utils.cache.result_cache(max_bytes=2*1024*MiB,
+                              directory=_cache_directory)
     def read_period(self, start=None,
                           end=None,
                           onerror="skip",
@@ -284,7 +309,9 @@ class Dataset(metaclass=abc.ABCMeta):
                           simple_filters=(),
                           orbit_filters=None,
                           enforce_no_duplicates=True,
-                          excs=(DataFileError, filters.FilterError)):
+                          excs=(DataFileError, filters.FilterError),
+                          max_workers=None,
+                          worker_type="thread"):
         """Read all granules between start and end, in bulk.
 
         Arguments:
@@ -349,6 +376,19 @@ class Dataset(metaclass=abc.ABCMeta):
             excs (Sequence[Exception]): what exceptions to try and catch
                 after every read.  Use with onorrer.
 
+            max_workers (int): Number of granules to read in parallel.
+                Defaults to None, which means that granules are read one
+                after another.  Reading (e.g. decompression and
+                calibration) happens in a pool of workers, but the
+                granules are still filtered and concatenated in the order
+                in which they were found, so that orbit filters see them in
+                time order.
+
+            worker_type (str): Either "thread" (default) or "process".
+                Processes pay off for reading routines that hold the
+                global interpreter lock, but require that the dataset
+                object can be pickled.
+
         Returns:
             
             Masked array containing all data in period.  Invalid data may
@@ -405,13 +445,14 @@ class Dataset(metaclass=abc.ABCMeta):
         if len(overlap_filters) > 1:
             raise ValueError("Found {:d} overlap filters: {!s}".format(
                 len(overlap_filters), overlap_filters))
-        for (g_start, gran) in finder(start, end, return_time=True, 
-                                      include_last_before=True,
-                                      **locator_args):
+        granules = finder(start, end, return_time=True,
+                          include_last_before=True, **locator_args)
+        reader_args = {**reader_args, **extra_filter_args}
+        for (g_start, gran, result) in self._iread_granules(
+                granules, fields, pseudo_fields, reader_args, max_workers,
+                worker_type):
             try:
-                (cont, extra) = self.read(str(gran), fields=fields,
-                    pseudo_fields=pseudo_fields, **reader_args,
-                    **extra_filter_args)
+                (cont, extra) = result()
                 for of in orbit_filters:
                     cont = of.filter(cont, **extra)
                 # FIXME: handle cases where very few scanlines are left
@@ -419,40 +460,9 @@ class Dataset(metaclass=abc.ABCMeta):
                 # are very few scanlines left.
                 if (not late and
                     cont[time].size > 0):
-
-                    if (enforce_no_duplicates and sorted and
-                            arr is not None and
-                            N>0 and (cont[time][0] <= latest)):
-                        if isinstance(latest, xarray.DataArray):
-                            latest = latest.values.astype("M8[ms]")
-                        if isinstance(cont[time][0], xarray.DataArray):
-                            conttime = cont[time][0].values.astype("M8[ms]")
-                        else:
-                            conttime = cont[time][0]
-                        raise InvalidDataError(
-                            "Reading routine for {!s} returned data starting "
-                            "{:%Y-%m-%d %H:%M:%S}, which precedes last entry "
-                            "for preceding granule at {:%Y-%m-%d %H:%M:%S}. "
-                            "As data are supposed to be sorted in time, this "
-                            "probably means duplicate removal is not working "
-                            "as it should, or you are using an implementation "
-                            "that deliberately leaves duplicates in, and you "
-                            "should be passing enforce_no_duplicates=False to "
-                            "read_period.".format(gran,
-                                conttime.astype(datetime.datetime),
-                                latest.astype(datetime.datetime)))
-
-                    # NB: when datasets erroneously contain duplicate coordinates
-                    # (I'm looking at you, FIDUCEO/FCDR_HIRS#159!), this
-                    # comparison will cause a failure in xarray.  In this case,
-                    # compare values instead.
-                    arrrr = cont[time]
-                    if isinstance(arrrr, xarray.DataArray):
-                        arrrr = arrrr.values
-                    if not (arrrr[1:] >= arrrr[:-1]).all():
-                        raise InvalidDataError("Reader for {!s} returned data "
-                            "with unsorted time.  This must be fixed.".format(
-                                f))
+                    self._verify_granule_times(cont, gran,
+                        latest if (enforce_no_duplicates and sorted and
+                                   arr is not None and N>0) else None)
 
                 cont = self._apply_limits_and_filters(cont, limits, simple_filters)
 
@@ -489,6 +499,272 @@ class Dataset(metaclass=abc.ABCMeta):
         else:
             raise DataFileError("Can not find any valid data!")
 
+    def iter_period(self, start=None,
+                          end=None,
+                          chunk=datetime.timedelta(days=1),
+                          onerror="skip",
+                          fields="all",
+                          pseudo_fields=None,
+                          sorted=True,
+                          locator_args=None,
+                          reader_args=None,
+                          limits=None,
+                          simple_filters=(),
+                          orbit_filters=None,
+                          enforce_no_duplicates=True,
+                          excs=(DataFileError, filters.FilterError),
+                          max_workers=None,
+                          worker_type="thread"):
+        """Read all granules between start and end, chunk by chunk.
+
+        Like :func:`Dataset.read_period`, but rather than returning all
+        data at once, this generator yields the data in consecutive,
+        non-overlapping time intervals of length `chunk` (the first
+        starting at `start`).  Granules crossing the boundary of an
+        interval are split.  Only one chunk (plus the granules being read)
+        is held in memory at any time, so that even decades of data can be
+        processed::
+
+            for M in hirs.iter_period(start, end,
+                    chunk=datetime.timedelta(days=7)):
+                stats.update(M)
+
+        Orbit filters are reset once and see all granules in time order,
+        such that overlaps between granules are removed as with
+        :func:`Dataset.read_period`.  Their `finalise` method is called
+        for every chunk.
+
+        Arguments:
+
+            start (datetime.datetime): Start
+                Starting datetime.  When omitted, start at complete
+                beginning of dataset.
+
+            end (datetime.datetime or datetime.timedelta): End
+                End datetime.  When omitted, continue to end of dataset.
+
+            chunk (datetime.timedelta): Length of each chunk.  Defaults to
+                one day.  Intervals without data are skipped.
+
+            sorted (bool): Must be True.  Chunks can only be yielded when
+                the granules come in time order.
+
+            All other arguments have the same meaning as for
+            :func:`Dataset.read_period`.
+
+        Yields:
+
+            Data for each chunk, of the same type as returned by
+            :func:`Dataset.read_period`.
+        """
+
+        if locator_args is None:
+            locator_args = {}
+
+        if reader_args is None:
+            reader_args = {}
+
+        if limits is None:
+            limits = {}
+
+        if orbit_filters is None:
+            orbit_filters = self.default_orbit_filters
+
+        if not sorted:
+            # Data before the current chunk would be dropped silently
+            raise ValueError("iter_period needs sorted granules, "
+                "sorted=False is not supported")
+
+        start = start or self.start_date
+        end = end or self.end_date
+        if isinstance(end, datetime.timedelta):
+            end = start + end
+
+        finder = self.find_granules_sorted
+        logger.info("Iterating {self.name:s} {locator_args!s} "
+                     "for period {start:%Y-%m-%d %H:%M:%S} "
+                     " – {end:%Y-%m-%d %H:%M:%S} "
+                     "in chunks of {chunk!s}".format(**vars()))
+
+        time = self.time_field
+        for of in orbit_filters:
+            of.reset()
+        extra_filter_args = collections.ChainMap(*(of.args_to_reader
+            for of in orbit_filters))
+
+        overlap_filters = [
+            f for f in orbit_filters if isinstance(f, filters.OverlapFilter)]
+        late = overlap_filters[0].late if len(overlap_filters) > 0 else True
+        if len(overlap_filters) > 1:
+            raise ValueError("Found {:d} overlap filters: {!s}".format(
+                len(overlap_filters), overlap_filters))
+        granules = finder(start, end, return_time=True,
+                          include_last_before=True, **locator_args)
+        reader_args = {**reader_args, **extra_filter_args}
+
+        step = numpy.timedelta64(chunk).astype("m8[us]")
+        chunk_start = numpy.datetime64(start, "us")
+        pieces = []
+        latest = None
+        for (g_start, gran, result) in self._iread_granules(
+                granules, fields, pseudo_fields, reader_args, max_workers,
+                worker_type):
+            try:
+                (cont, extra) = result()
+                for of in orbit_filters:
+                    cont = of.filter(cont, **extra)
+                if (not late and
+                    cont[time].size > 0):
+                    self._verify_granule_times(cont, gran,
+                        latest if enforce_no_duplicates else None)
+
+                cont = self._apply_limits_and_filters(cont, limits, simple_filters)
+            except excs as exc:
+                if onerror == "skip":
+                    logger.error("Can not read file {}: {}".format(
+                        gran, exc.args[0]))
+                    continue
+                else:
+                    raise
+
+            cont = self._select_period(cont, chunk_start, end)
+            if cont[time].size > 0:
+                latest = numpy.asarray(cont[time]).max()
+            while cont[time].size > 0:
+                first = numpy.asarray(cont[time]).min()
+                if first >= chunk_start + step:
+                    # all data for the current chunk have been read
+                    if pieces:
+                        yield self._finalise_chunk(pieces, orbit_filters)
+                        pieces = []
+                    chunk_start += (first - chunk_start) // step * step
+                pieces.append(
+                    self._select_period(cont, chunk_start, chunk_start+step))
+                cont = self._select_period(cont, chunk_start+step, end)
+
+        if pieces:
+            yield self._finalise_chunk(pieces, orbit_filters)
+
+    def _select_period(self, cont, start, end):
+        """Select the data of a granule in [start, end)
+
+        Used internally by iter_period.
+        """
+        if isinstance(cont, xarray.Dataset):
+            # label-based slices include the end
+            return cont.loc[dict.fromkeys(
+                utils.get_time_coordinates(cont)&cont.dims.keys(),
+                slice(numpy.datetime64(start),
+                      numpy.datetime64(end) - numpy.timedelta64(1, "ns")))]
+        else:
+            return cont[(cont[self.time_field]<end)&
+                        (cont[self.time_field]>=start)]
+
+    def _finalise_chunk(self, pieces, orbit_filters):
+        """Concatenate the pieces of a chunk and finalise them
+
+        Used internally by iter_period.
+        """
+        if isinstance(pieces[0], xarray.Dataset):
+            for piece in pieces:
+                piece.load()
+            arr = self._finalise_arr(pieces, len(pieces))
+        elif any(isinstance(piece, numpy.ma.MaskedArray) for piece in pieces):
+            arr = numpy.ma.concatenate(pieces)
+        else:
+            arr = numpy.concatenate(pieces)
+
+        for of in orbit_filters:
+            arr = of.finalise(arr)
+
+        if "flags" in self.related:
+            arr = self.flag(arr)
+
+        return arr
+
+    def _verify_granule_times(self, cont, gran, latest):
+        """Verify that a granule is sorted and follows earlier granules
+
+        Used internally by read_period and iter_period unless an overlap
+        filter removes duplicates late.  Pass None as `latest` to skip the
+        check against the preceding granules.
+        """
+        time = self.time_field
+        if latest is not None and cont[time][0] <= latest:
+            raise InvalidDataError(
+                "Reading routine for {!s} returned data starting "
+                "{:%Y-%m-%d %H:%M:%S}, which precedes last entry "
+                "for preceding granule at {:%Y-%m-%d %H:%M:%S}. "
+                "As data are supposed to be sorted in time, this "
+                "probably means duplicate removal is not working "
+                "as it should, or you are using an implementation "
+                "that deliberately leaves duplicates in, and you "
+                "should be passing enforce_no_duplicates=False to "
+                "read_period.".format(gran,
+                    numpy.asarray(cont[time][0]).astype("M8[ms]").item(),
+                    numpy.asarray(latest).astype("M8[ms]").item()))
+
+        # NB: when datasets erroneously contain duplicate coordinates
+        # (I'm looking at you, FIDUCEO/FCDR_HIRS#159!), this
+        # comparison will cause a failure in xarray.  In this case,
+        # compare values instead.
+        arrrr = cont[time]
+        if isinstance(arrrr, xarray.DataArray):
+            arrrr = arrrr.values
+        if not (arrrr[1:] >= arrrr[:-1]).all():
+            raise InvalidDataError("Reader for {!s} returned data "
+                "with unsorted time.  This must be fixed.".format(
+                    gran))
+
+    def _iread_granules(self, granules, fields, pseudo_fields, reader_args,
+                        max_workers, worker_type):
+        """Read granules sequentially or in a pool of workers
+
+        Used internally by read_period.  Yields tuples of the granule start
+        time, the granule and a function without arguments returning the
+        result of self.read (or raising its exception).  The granules are
+        yielded in the same order as given, no matter in which order the
+        workers finish.
+
+        The granules are not taken from the cache of self.read: cached
+        results are read-only, but orbit filters may change the data
+        in-place.  Whole periods are cached by read_period anyway.
+        """
+        reader_args = {**reader_args, "NO_CACHE": True}
+        if max_workers is None:
+            for (g_start, gran) in granules:
+                yield (g_start, gran, functools.partial(self.read,
+                    str(gran), fields=fields, pseudo_fields=pseudo_fields,
+                    **reader_args))
+            return
+
+        if worker_type == "process":
+            pool_class = ProcessPoolExecutor
+        elif worker_type == "thread":
+            pool_class = ThreadPoolExecutor
+        else:
+            raise ValueError(f"Unknown worker type '{worker_type}'!")
+
+        # Keep a few more granules in flight than we have workers so that
+        # no worker idles while we filter the next granule in order:
+        in_flight = collections.deque()
+        with pool_class(max_workers=max_workers) as pool:
+            try:
+                for (g_start, gran) in granules:
+                    if len(in_flight) >= 2 * max_workers:
+                        (done_start, done_gran, future) = in_flight.popleft()
+                        yield (done_start, done_gran, future.result)
+                    in_flight.append((g_start, gran, pool.submit(self.read,
+                        str(gran), fields=fields, pseudo_fields=pseudo_fields,
+                        **reader_args)))
+                while in_flight:
+                    (done_start, done_gran, future) = in_flight.popleft()
+                    yield (done_start, done_gran, future.result)
+            finally:
+                # Do not wait for granules that nobody will look at anymore
+                for (_, _, future) in in_flight:
+                    future.cancel()
+
     def _apply_limits_and_filters(self, cont, limits, simple_filters):
         if isinstance(cont, xarray.Dataset):
             if len(limits)>0:
@@ -646,9 +922,11 @@ class Dataset(metaclass=abc.ABCMeta):
 
         raise NotImplementedError()
 
-    # Cannot use functools.lru_cache because it cannot handle mutable
-    # results or arguments
-    @utils.cache.mutable_cache(maxsize=10)
+    # Results are cached by the content of the arguments, the class and name
+    # of the dataset and the modification time of files. They are returned
+    # as read-only views, copy them before modifying them in-place.
+    @utils.cache.result_cache(max_bytes=2*1024*MiB,
+                              directory=_cache_directory)
     def read(self, f=None, fields="all", pseudo_fields=None, **kwargs):
         """Read granule in file and do some other fixes
 
@@ -769,7 +1047,8 @@ class Dataset(metaclass=abc.ABCMeta):
 #        process=dict(
 #            my_data=lambda x: x.view(dtype="i1")))
     def combine(self, my_data, other_obj, other_data=None, other_args=None, trans=None,
-                timetol=numpy.timedelta64(1, 's'), time_name="time"):
+                timetol=numpy.timedelta64(1, 's'), time_name="time",
+                period_gap=numpy.timedelta64(1, 'h')):
         """Combine with data from other dataset.
 
         Combine a set of measurements from this dataset with another
@@ -781,6 +1060,13 @@ class Dataset(metaclass=abc.ABCMeta):
         The other dataset may contain flags, DMPs, or different
         information altogether.
 
+        Measurements are joined on their keys: the other data are sorted
+        once by the first field in `trans` (this index is cached between
+        calls in `key_index_cache` if the other data are read-only, e.g.
+        from `read_period`), candidates within the tolerance are found by binary
+        search, and of the candidates for which all fields in `trans`
+        match, the one nearest in the first field is taken.
+
         Arguments:
         
             my_data (ndarray): Data for self.
@@ -803,8 +1089,9 @@ class Dataset(metaclass=abc.ABCMeta):
                 corresponds to what field in `other_data`.  Optional; by
                 default, merges self.unique_fields and
                 other_obj.unique_fields, and assumes names between the two
-                are identical.  Order is relevant for optimal recursive
-                bisection search for matches, which is to be implemented.
+                are identical.  The first field is used for the binary
+                search and should be the most selective one (usually the
+                time).
     
             timetol (timedelta64): For datetime types, `isclose` does not
                 work (https://github.com/numpy/numpy/issues/5610).  User
@@ -814,12 +1101,15 @@ class Dataset(metaclass=abc.ABCMeta):
                 Used to determine the period to read from the other
                 dataset.
 
+            period_gap (timedelta64): When reading the other dataset,
+                periods longer than this without any measurement in
+                `my_data` are not read.  Defaults to 1 hour.
+
         Returns:
 
             Masked ndarray of same size as `my_data` and same `dtype` as
-            returned by `other_obj.read`.
-
-        TODO: Allow user to pass already-read data from other dataset.
+            returned by `other_obj.read`.  Its elements correspond to
+            those of `my_data`.
         """
 
         if trans is None:
@@ -829,40 +1119,20 @@ class Dataset(metaclass=abc.ABCMeta):
         if other_args is None:
             other_args = {}
 
-        if self.read_returns == "ndarray":
-            if other_data is None:
-                first = my_data[time_name].min().astype(datetime.datetime)
-                last = my_data[time_name].max().astype(datetime.datetime)
-
-        elif self.read_returns == "xarray":
-            if other_data is None:
-                first = my_data[time_name].min().values.astype("M8[ms]"
-                    ).astype(datetime.datetime)
-                last = my_data[time_name].max().values.astype("M8[ms]"
-                    ).astype(datetime.datetime)
-        else:
+        if self.read_returns not in ("ndarray", "xarray"):
             raise ValueError("read_returns must be ndarray or xarray")
 
+        timetol = numpy.timedelta64(timetol)
+        my_times = numpy.asarray(my_data[time_name]).astype("M8[ms]")
+        first = my_times.min().astype(datetime.datetime)
+        last = my_times.max().astype(datetime.datetime)
+
         if other_data is None:
-            other_data = other_obj.read_period(first, last,
-                            **other_args)
+            other_data = self._read_for_combine(other_obj, my_times,
+                other_args, timetol, numpy.timedelta64(period_gap))
         (my_prim, other_prim) = next(iter(trans.items()))
 
-        if self.read_returns == "ndarray":
-            # my_data needs to be sorted
-            try:
-                my_data._fill_value
-            except AttributeError:
-                my_data.sort(order=my_prim, kind="heapsort")
-            else:
-                # see 
-                # https://github.com/numpy/numpy/issues/8069
-                my_data.sort(order=my_prim, kind="heapsort",
-                                    fill_value=my_data._fill_value)
-
-        elif self.read_returns == "xarray":
-
-            # ensure sorted along time dimension
+        if self.read_returns == "xarray":
             if not len(my_data[my_prim].dims) == len(other_data[other_prim].dims) == 1:
                 raise ValueError(
                     "Must use 1-D index for finding combinations, "
@@ -872,37 +1142,7 @@ class Dataset(metaclass=abc.ABCMeta):
                         my_data[my_prim].dims,
                         other_prim, len(other_data[other_prim].dims),
                         other_data[other_prim].dims))
-            my_dim = my_data[my_prim].dims[0]
             other_dim = other_data[other_prim].dims[0]
-            if not (my_data[my_prim][1:] >= my_data[my_prim][:-1]).all():
-                warnings.warn("Primary/reference instrument data should "
-                    "be sorted in time to find matching data in other set. "
-                    f"Field {my_prim:s} in {self.name:s} is not sorted in "
-                    "time.  Note that this problem may be unavoidable if "
-                    "we are tasked to search for additional information "
-                    "for both pairs of collocations, and times are sorted "
-                    "according to one but not the other.  Therefore, I "
-                    "will force the sorting for now, but I'm not entirely "
-                    "sure this cannot lead to problems later.  You have "
-                    "been warned.", UserWarning)
-                my_data = my_data.loc[
-                    {my_data[my_prim].dims[0]:
-                    numpy.argsort(my_data[my_prim])}]
-
-        # through interpolation, find times in `other` closest to times in
-        # myself; hopefully that means the difference is zero
-        if issubclass(my_data[my_prim].dtype.type, numpy.datetime64):
-            x = other_data[other_prim].astype("<M8[ms]").astype("f8")
-            xx = my_data[my_prim].astype("<M8[ms]").astype("f8")
-        else:
-            x = other_data[other_prim]
-            xx = my_data[my_prim]
-
-        if self.read_returns == "ndarray":
-            ii = numpy.interp(xx, x,
-                numpy.arange(other_data[other_prim].shape[0])).round().astype(
-                    numpy.uint64)
-        else:
             if not other_data[other_prim].dtype.kind=="M":
                 raise ValueError("When finding combinations based "
                     "on xarray datasets, I can only do so based on "
@@ -914,44 +1154,26 @@ class Dataset(metaclass=abc.ABCMeta):
                         "that is not a coordinate, I'm confused, "
                         "should I interpolate it?  Assign as a coordinate "
                         "to be sure!")
-            ii = dict.fromkeys(utils.get_time_dimensions(other_data))
-            for k in ii.keys():
-                x = other_data[k].astype("<M8[ms]").astype("f8")
-                ii[k] = numpy.interp(xx, x,
-                    numpy.arange(x.shape[0])).round().astype(numpy.int64)
-
-#        if self.read_returns == "ndarray":
-#            other_combi = other_data[ii]
-#            # now go through fields to see that there is an actual match
-#        elif self.read_returns == "xarray":
-        other_combi = other_data[ii]
 
-        if self.read_returns == "ndarray":
-            near = numpy.all([(numpy.isclose(my_data[f_my], other_combi[f_oth])
-                    if issubclass(my_data[f_my].dtype.type,
-                                  numpy.inexact) else
-                    abs(my_data[f_my] - other_combi[f_oth]) < timetol
-                    if issubclass(my_data[f_my].dtype.type,
-                                  numpy.datetime64) else
-                    my_data[f_my] == other_combi[f_oth])
-                        for (f_my, f_oth) in trans.items()], 0)
-        elif self.read_returns == "xarray":
-            near = numpy.all([
-                (numpy.isclose(my_data[f_my].values,
-                               other_combi[f_oth].values)
-                    if issubclass(my_data[f_my].dtype.type,
-                                  numpy.inexact) else
-                    abs(my_data[f_my].values -
-                        other_combi[f_oth].values) < timetol
-                    if issubclass(my_data[f_my].dtype.type,
-                                  numpy.datetime64) else
-                    my_data[f_my].values == other_combi[f_oth].values)
-                        for (f_my, f_oth) in trans.items()], 0)
+        (ii, near) = self._join_on_keys(my_data, other_data, trans, timetol)
+
+        if self.read_returns == "xarray":
+            # other time dimensions (such as calibration cycles) are
+            # taken from the nearest time
+            ii = {k: (ii if k == other_dim else
+                      self._find_nearest(other_data[k].values,
+                                         my_data[my_prim].values))
+                  for k in utils.get_time_dimensions(other_data)}
+
+        other_combi = other_data[ii]
 
         if not near.any():
             # check time coverage
-            first_found = other_data["time"].min().values.astype("M8[ms]").astype(datetime.datetime)
-            last_found = other_data["time"].max().values.astype("M8[ms]").astype(datetime.datetime)
+            other_times = numpy.asarray(other_data[other_prim])
+            if other_times.dtype.kind != "M" or other_times.size == 0:
+                raise ValueError("Did not find any secondaries!")
+            first_found = other_times.min().astype("M8[ms]").astype(datetime.datetime)
+            last_found = other_times.max().astype("M8[ms]").astype(datetime.datetime)
             if (abs(first_found - first) > timetol and
                 abs(last_found - last) > timetol):
                 raise ValueError(f"Primary covers "
@@ -982,6 +1204,142 @@ class Dataset(metaclass=abc.ABCMeta):
             
         return other_combi
 
+    @staticmethod
+    def _read_for_combine(other_obj, my_times, other_args, timetol,
+                          period_gap):
+        """Read the periods of other_obj that contain my_times
+
+        Used internally by combine.  Times in my_times that are closer
+        than period_gap are read in one go.
+        """
+        times = numpy.unique(my_times[~numpy.isnat(my_times)])
+        gaps = numpy.flatnonzero(numpy.diff(times) > period_gap)
+        periods = list(zip(times[numpy.r_[0, gaps+1]],
+                           times[numpy.r_[gaps, times.size-1]]))
+        logger.debug("Reading {:d} period(s) of {!s} to combine".format(
+            len(periods), other_obj.name))
+        parts = []
+        for (start, end) in periods:
+            try:
+                parts.append(other_obj.read_period(
+                    (start-timetol).astype("M8[ms]").astype(datetime.datetime),
+                    (end+timetol).astype("M8[ms]").astype(datetime.datetime),
+                    **other_args))
+            except DataFileError:
+                if len(periods) == 1:
+                    raise
+                logger.warning("No {!s} data between {!s} and {!s}".format(
+                    other_obj.name, start, end))
+        if not parts:
+            raise DataFileError("Can not find any valid data!")
+        if len(parts) == 1:
+            return parts[0]
+        if isinstance(parts[0], xarray.Dataset):
+            return other_obj._finalise_arr(parts, len(parts))
+        if any(isinstance(part, numpy.ma.MaskedArray) for part in parts):
+            return numpy.ma.concatenate(parts)
+        return numpy.concatenate(parts)
+
+    def _get_key_index(self, keys):
+        """Sorting order and sorted keys, cached by identity of the keys
+
+        Only read-only keys (such as the results of read_period, which are
+        cached themselves) are cached, since others may be changed in-place.
+        """
+        if keys.flags.writeable:
+            order = numpy.argsort(keys, kind="stable")
+            return (order, keys[order])
+
+        # the keys are a view of an array that owns the memory
+        owner = keys
+        while isinstance(owner.base, numpy.ndarray):
+            owner = owner.base
+        interface = keys.__array_interface__
+        h = "{:d}-{:d}-{!s}-{!s}-{:s}".format(
+            id(owner), interface["data"][0], keys.shape, keys.strides,
+            keys.dtype.str)
+        index = self.key_index_cache.get(h)
+        # the id of the owner may have been reused by now
+        if index is None or index[0]() is not owner:
+            order = numpy.argsort(keys, kind="stable")
+            index = self.key_index_cache.set(
+                h, (weakref.ref(owner), order, keys[order]))
+        return index[1:]
+
+    @staticmethod
+    def _keys_match(mine, other, timetol):
+        """Elementwise comparison of keys, with tolerance if inexact"""
+        if mine.dtype.kind == "M":
+            match = abs(mine - other) < timetol
+        elif mine.dtype.kind in "fc":
+            match = numpy.isclose(mine, other)
+        else:
+            match = mine == other
+        if match.ndim > 1:
+            match = match.reshape(match.shape[0], -1).all(1)
+        return match
+
+    @staticmethod
+    def _key_distance(mine, other):
+        """Elementwise distance between keys (0 for exact keys)"""
+        if mine.dtype.kind == "M":
+            return abs(mine - other) / numpy.timedelta64(1, "us")
+        elif mine.dtype.kind in "fc":
+            return abs(mine - other)
+        return numpy.zeros(mine.shape[0])
+
+    def _join_on_keys(self, my_data, other_data, trans, timetol):
+        """For each of my measurements, find the matching other one
+
+        Used internally by combine.  Returns the indices into
+        `other_data` (along its first dimension) and a boolean array
+        telling whether a match was found.
+        """
+        pairs = [(numpy.asarray(my_data[f_my]), numpy.asarray(other_data[f_oth]))
+                 for (f_my, f_oth) in trans.items()]
+        (x, other_x) = pairs[0]
+        (order, keys) = self._get_key_index(other_x)
+
+        # range of candidates within the tolerance of the first field
+        if x.dtype.kind == "M":
+            lo = numpy.searchsorted(keys, x - timetol, side="right")
+            hi = numpy.searchsorted(keys, x + timetol, side="left")
+        elif x.dtype.kind in "fc":
+            # generous with respect to numpy.isclose, which is applied
+            # to all candidates below
+            tol = 2 * (1e-8 + 1e-5 * abs(x))
+            lo = numpy.searchsorted(keys, x - tol, side="left")
+            hi = numpy.searchsorted(keys, x + tol, side="right")
+        else:
+            lo = numpy.searchsorted(keys, x, side="left")
+            hi = numpy.searchsorted(keys, x, side="right")
+
+        ii = numpy.zeros(x.shape[0], dtype=numpy.intp)
+        near = numpy.zeros(x.shape[0], dtype=bool)
+        # distance in the first field of the best match so far
+        best = numpy.full(x.shape[0], numpy.inf)
+        # check the k-th candidate of all measurements at once
+        for k in range(int((hi - lo).max(initial=0))):
+            todo = numpy.flatnonzero(lo + k < hi)
+            cand = order[lo[todo] + k]
+            match = numpy.ones(todo.size, dtype=bool)
+            for (mine, other) in pairs:
+                match &= self._keys_match(mine[todo], other[cand], timetol)
+            dist = self._key_distance(x[todo], other_x[cand])
+            better = match & (dist < best[todo])
+            ii[todo[better]] = cand[better]
+            near[todo[better]] = True
+            best[todo[better]] = dist[better]
+        return (ii, near)
+
+    @staticmethod
+    def _find_nearest(x, xx):
+        """Indices of the elements in sorted x nearest to xx"""
+        i = numpy.searchsorted(x, xx).clip(1, max(x.shape[0]-1, 1))
+        if x.shape[0] > 1:
+            i -= (abs(xx - x[i-1]) <= abs(x[i] - xx))
+        return i.clip(0, max(x.shape[0]-1, 0))
+
     def get_additional_field(self, M, fld):
         """Get additional field.
 
@@ -1080,10 +1438,14 @@ class MultiFileDataset(Dataset):
             ending time (hopefully the header is enough).
 
         granule_cache_file (pathlib.Path or str):
-            If set, use this file to cache information related to
-            granules.  This is used to cache granule times if those are
-            not directly inferred from the filename.  Otherwise, this is
-            not used.  The full path to this file shall be `basedir` /
+            If set, use this file as index of granules (see
+            :class:`~typhon.datasets.granules.GranuleIndex`).  It caches
+            granule times if those are not directly inferred from the
+            filename, and remembers the granules found by
+            :meth:`find_granules`: once a period has been searched, later
+            searches within it are answered from the index without listing
+            any directories.  Use :meth:`update_granule_index` to pick up
+            new granules.  The full path to this file shall be `basedir` /
             `granule_cache_file`.
 
         granule_duration (datetime.timedelta):
@@ -1096,6 +1458,7 @@ class MultiFileDataset(Dataset):
     re = None
     _re = None # compiled version, do not touch
     granule_cache_file = None
+    _granule_index = None
     _granule_start_times = None
     granule_duration = None
 
@@ -1126,15 +1489,6 @@ class MultiFileDataset(Dataset):
                     not isinstance(getattr(self, attr), pathlib.PurePath)):
                 setattr(self, attr, pathlib.Path(getattr(self, attr)))
 
-    def __getstate__(self):
-        state = self.__dict__.copy()
-        del state["_granule_start_times"]
-        return state
-
-    def __setstate__(self, state):
-        self.__dict__.update(state)
-        self._open_granule_file()
-
     def find_dir_for_time(self, dt):
         """Find the directory containing granules/measurements at (date)time
 
@@ -1354,14 +1708,49 @@ class MultiFileDataset(Dataset):
                 yield before
             except GranuleLocatorError: # no problem
                 pass
+            else:
+                if return_time:
+                    before = before[1]
+
+        locator = locator_key(extra)
+        if (self._granule_index is not None and
+                self._granule_index.covers(d_start, d_end, locator)):
+            logger.debug("Taking {!s} granules from index {!s}".format(
+                self.name, self._granule_index.filename))
+            # Give the same granules as searching the directories, i.e. not
+            # the ones from directories of other dates:
+            subdirs = {subdir for (_, subdir)
+                       in self.iterate_subdirs(d_start, d_end, **extra)}
+            for (g_start, g_end, child) in self._granule_index.query(
+                    dt_start, dt_end, locator):
+                if child == before: # already yielded it as "last before"
+                    continue
+                if child.parent not in subdirs:
+                    continue
+                if return_time:
+                    yield (g_start, child)
+                else:
+                    yield child
+            return
 
+        # all granules in the searched directories and the dates of these
+        # directories, for the index
+        indexed = []
+        listed = []
         for (timeinfo, subdir) in self.iterate_subdirs(d_start, d_end,
                                                        **extra):
             if subdir.exists() and subdir.is_dir():
                 logger.debug("Searching directory {!s}".format(subdir))
                 found_any_dirs = True
+                (first, last) = self._subdir_dates(timeinfo, d_start, d_end)
+                # merge adjacent dates to few ranges
+                if listed and first <= listed[-1][1] + datetime.timedelta(
+                        days=1):
+                    listed[-1] = (listed[-1][0], last)
+                else:
+                    listed.append((first, last))
                 for child in subdir.iterdir():
-                    if before is not None and child == before[1]: # already yielded it as "last before"
+                    if child == before: # already yielded it as "last before"
                         continue
                     m = self._re.fullmatch(child.name)
                     if m is not None:
@@ -1381,6 +1770,7 @@ class MultiFileDataset(Dataset):
                                 "Skipping {!s}.  Problem: {}".format(
                                     child, e.args[0]))
                             continue
+                        indexed.append((child, g_start, g_end))
                         if g_end >= dt_start and g_start <= dt_end:
                             if return_time:
                                 yield (g_start, child)
@@ -1398,7 +1788,80 @@ class MultiFileDataset(Dataset):
                   "files.  Make sure basedir, subdir, and regexp are "
                   "correct and you did not misspell any extra "
                   "information: " + str(extra))
-            
+        if found_any_dirs and self._granule_index is not None:
+            self._granule_index.set_many(indexed, locator)
+            # Dates without directories (yet) are not covered:
+            for (first, last) in listed:
+                self._granule_index.add_coverage(first, last, locator)
+
+    @staticmethod
+    def _subdir_dates(timeinfo, d_start, d_end):
+        """Get the dates of a directory from :meth:`iterate_subdirs`
+
+        Arguments:
+
+            timeinfo (dict): Time information of the directory.
+            d_start (datetime.date): Starting date of the search.
+            d_end (datetime.date): Ending date of the search.
+
+        Returns:
+
+            Tuple of the first and last date (inclusive) of the directory
+            within `d_start` and `d_end`.
+        """
+        if "doy" in timeinfo:
+            first = last = (datetime.date(timeinfo["year"], 1, 1)
+                + datetime.timedelta(days=timeinfo["doy"] - 1))
+        elif "day" in timeinfo:
+            first = last = datetime.date(
+                timeinfo["year"], timeinfo["month"], timeinfo["day"])
+        elif "month" in timeinfo:
+            first = datetime.date(timeinfo["year"], timeinfo["month"], 1)
+            last = (first + datetime.timedelta(days=31)).replace(day=1) \
+                - datetime.timedelta(days=1)
+        elif "year" in timeinfo:
+            first = datetime.date(timeinfo["year"], 1, 1)
+            last = datetime.date(timeinfo["year"], 12, 31)
+        else:
+            return (d_start, d_end)
+        return (max(first, d_start), min(last, d_end))
+
+    def update_granule_index(self, dt_start=None, dt_end=None, **extra):
+        """Search for granules again and update the granule index
+
+        Searches by :meth:`find_granules` are answered from the index
+        (see `granule_cache_file`) once a period has been searched.  Call
+        this method after granules have been added or removed.
+
+        Arguments:
+
+            dt_start (datetime.date): Starting date.
+            dt_end (datetime.date): Ending date.
+            **extra: Locator arguments as for :meth:`find_granules`.
+
+        Returns:
+
+            int: Number of granules found.
+        """
+        if self._granule_index is None:
+            raise ValueError("Dataset {self.name:s} has no granule index. "
+                "Please set `granule_cache_file` in source-code or "
+                "configuration file.".format(self=self))
+
+        if dt_start is None:
+            dt_start = self.start_date
+        if dt_end is None:
+            dt_end = self.end_date
+
+        self.verify_mandatory_fields(extra)
+        self._granule_index.reset(
+            (dt_start.date() if isinstance(dt_start, datetime.datetime)
+                else dt_start),
+            (dt_end.date() if isinstance(dt_end, datetime.datetime)
+                else dt_end),
+            locator_key(extra))
+        return sum(1 for _ in self.find_granules(dt_start, dt_end, **extra))
+
     def find_granules_sorted(self, dt_start=None, dt_end=None, 
                 include_last_before=False, **extra):
         """Yield all granules, sorted by times.
@@ -1523,58 +1986,66 @@ class MultiFileDataset(Dataset):
         """
         if not isinstance(p, pathlib.PurePath):
             p = pathlib.PurePath(p)
-        if str(p) in self._granule_start_times.keys():
-            (start, end) = self._granule_start_times[str(p)]
-        else:
-            gd = self.get_info_for_granule(p)
-            if (any(f in gd.keys() for f in self.datefields) and
-                (any(f in gd.keys() for f in {x+"_end" for x in self.datefields})
-                        or self.granule_duration is not None)):
-                st_date = [int(gd.get(p, kwargs.get(p, 0))) for p in self.datefields]
-                td = datetime.timedelta()
-                if st_date[1] == st_date[2] == 0:
-                    if "doy" in gd:
-                        td += datetime.timedelta(days=int(gd["doy"])-1)
-                    # month and day can't be 0...
-                    st_date[1] = st_date[1] or 1
-                    st_date[2] = st_date[2] or 1
-                # maybe it's a two-year notation
-                st_date[0] = self._getyear(gd, "year", kwargs.get("year", 0))
+        # Times obtained from the filename are cheap, only look up those
+        # from the file contents
+        gd = self.get_info_for_granule(p)
+        if (any(f in gd.keys() for f in self.datefields) and
+            (any(f in gd.keys() for f in {x+"_end" for x in self.datefields})
+                    or self.granule_duration is not None)):
+            st_date = [int(gd.get(p, kwargs.get(p, 0))) for p in self.datefields]
+            td = datetime.timedelta()
+            if st_date[1] == st_date[2] == 0:
+                if "doy" in gd:
+                    td += datetime.timedelta(days=int(gd["doy"])-1)
+                # month and day can't be 0...
+                st_date[1] = st_date[1] or 1
+                st_date[2] = st_date[2] or 1
+            # maybe it's a two-year notation
+            st_date[0] = self._getyear(gd, "year", kwargs.get("year", 0))
 
+            try:
+                start = datetime.datetime(*st_date)
+            except ValueError as e:
+                raise InvalidFileError("File {!s} has invalid "
+                    "starting datetime, giving up".format(p)) from v
+            if "tod" in gd and start.time() == datetime.time(0):
+                td += datetime.timedelta(seconds=int(gd["tod"]))
+            start += td
+            if any(k.endswith("_end") for k in gd.keys()):
+                # FIXME: Does this go well at the end of
+                # year/month/day boundary?  Should really makes sure
+                # that end is the first time occurance after
+                # start_time fulfilling the provided information.
+                end_date = st_date.copy()
+                end_date[0] = self._getyear(gd, "year_end", kwargs.get("year_end", st_date[0]))
+                end_date[1:] = [int(gd.get(p+"_end",
+                                           kwargs.get(p+"_end", sd_x)))
+                               for (p, sd_x) in zip(self.datefields[1:],
+                                                    st_date[1:])]
                 try:
-                    start = datetime.datetime(*st_date)
-                except ValueError as e:
+                    end = datetime.datetime(*end_date)
+                except ValueError as v:
                     raise InvalidFileError("File {!s} has invalid "
-                        "starting datetime, giving up".format(p)) from v
-                if "tod" in gd and start.time() == datetime.time(0):
-                    td += datetime.timedelta(seconds=int(gd["tod"]))
-                start += td
-                if any(k.endswith("_end") for k in gd.keys()):
-                    # FIXME: Does this go well at the end of
-                    # year/month/day boundary?  Should really makes sure
-                    # that end is the first time occurance after
-                    # start_time fulfilling the provided information.
-                    end_date = st_date.copy()
-                    end_date[0] = self._getyear(gd, "year_end", kwargs.get("year_end", st_date[0]))
-                    end_date[1:] = [int(gd.get(p+"_end",
-                                               kwargs.get(p+"_end", sd_x)))
-                                   for (p, sd_x) in zip(self.datefields[1:],
-                                                        st_date[1:])]
-                    try:
-                        end = datetime.datetime(*end_date)
-                    except ValueError as v:
-                        raise InvalidFileError("File {!s} has invalid "
-                            "ending datetime, giving up".format(p)) from v
-                    if end_date < st_date: # must have crossed date boundary
-                        end += datetime.timedelta(days=1)
-                elif self.granule_duration is not None:
-                    end = start + self.granule_duration
-                else:
-                    raise RuntimeError("This code should never execute")
+                        "ending datetime, giving up".format(p)) from v
+                if end_date < st_date: # must have crossed date boundary
+                    end += datetime.timedelta(days=1)
+            elif self.granule_duration is not None:
+                end = start + self.granule_duration
             else:
+                raise RuntimeError("This code should never execute")
+        else:
+            if self._granule_index is not None:
+                times = self._granule_index.get(p)
+            else:
+                times = self._granule_start_times.get(str(p))
+            if times is None:
                 # implementation depends on dataset
-                (start, end) = self.get_time_from_granule_contents(str(p))
-                self._granule_start_times[str(p)] = (start, end)
+                times = self.get_time_from_granule_contents(str(p))
+                if self._granule_index is not None:
+                    self._granule_index.set(p, *times)
+                else:
+                    self._granule_start_times[str(p)] = times
+            (start, end) = times
         return (start, end)
 
     # not an abstract method because subclasses need to implement it /if
@@ -1599,19 +2070,18 @@ class MultiFileDataset(Dataset):
                 type(self).__name__)))
 
     def _open_granule_file(self):
+        self._granule_start_times = {}
         if self.granule_cache_file is not None:
-            p = str(self.basedir / self.granule_cache_file)
+            p = self.basedir / self.granule_cache_file
             try:
-                self._granule_start_times = shelve.open(p, protocol=4)
-            except OSError:
-                logger.error(("Unable to open granule file {} RW.  "
-                               "Opening copy instead.").format(p))
-                tf = tempfile.NamedTemporaryFile()
-                shutil.copyfile(p, tf.name)
-                #self._granule_start_times = shelve.open(p, flag='r')
-                self._granule_start_times = shelve.open(tf.name)
+                self._granule_index = GranuleIndex(p)
+            except sqlite3.DatabaseError:
+                # older versions stored a shelve under this name
+                logger.warning(("Granule file {!s} is not an index.  Using "
+                                "{!s}.sqlite instead.").format(p, p))
+                self._granule_index = GranuleIndex(str(p) + ".sqlite")
         else:
-            self._granule_start_times = {}
+            self._granule_index = None
 
     def _filter_firstline(self, f, M):
         # by default, do nothing
@@ -1921,9 +2391,21 @@ class DatasetDeque:
     data that do not fit into memory, to calculate sliding window
     statistics, or to perform processing where values nearby in time are
     required.
+
+    Moving the window only reads and copies the new data.  The attribute
+    `data` is a view of preallocated arrays and is replaced after each
+    move; earlier views remain valid.
     """
 
-    dsobj = window = init_time = center_time = data = None
+    dsobj = window = init_time = center_time = data = edges = None
+
+    # Data are kept in preallocated arrays per variable (along the time
+    # dimension), of which self.data is a view from _head to _tail.  Parts
+    # that were ever covered by a view (_low to _high) are never written
+    # again, so that earlier views of self.data stay intact.
+    _buffers = _template = None
+    _capacity = _head = _tail = _low = _high = 0
+
     def __init__(self, ds, window, init_time, *args, **kwargs):
         """Initialise a DatasetDeque
 
@@ -1961,13 +2443,13 @@ class DatasetDeque:
             Remaining arguments passed to read_period.
 
         """
-        self.edges = (self.init_time-self.window/2,
-                      self.init_time+self.window/2)
         self.center_time = newtime or self.init_time
+        self.edges = (self.center_time-self.window/2,
+                      self.center_time+self.window/2)
         M = self.dsobj.read_period(
             *self.edges, *args, **kwargs)
 
-        self.data = self.dsobj.as_xarray_dataset(M)
+        self._allocate(self.dsobj.as_xarray_dataset(M))
             
     def move(self, period, *args, **kwargs):
         """Read period on the right, discard period on the left
@@ -1976,6 +2458,10 @@ class DatasetDeque:
         new data, appending this on the right, and discarding an equally
         long period on the left.
 
+        Only the new data are copied (into preallocated space after the
+        current window); `self.data` is replaced by a new view without
+        copying the retained data.
+
         Arguments:
 
             period [timedelta]: Duration by which to shift.
@@ -1988,20 +2474,15 @@ class DatasetDeque:
             raise ValueError("Shifting period ({!s}) exceeds window "
                 "length ({!s})!".format(period, self.window))
         self.center_time += period
-        ok = False
         try:
             Mnew = self.dsobj.read_period(
                 self.edges[1],
                 self.edges[1]+period,
                 *args, **kwargs)
-        except: # syntactically required
-            raise
-        else:
-            datanew = self.dsobj.as_xarray_dataset(Mnew)
-            ok = True
         finally:
             self.edges = (self.edges[0] + period,
                           self.edges[1] + period)
+        datanew = self.dsobj.as_xarray_dataset(Mnew)
 
         # need to convert to ms or it will become int and indexing will
         # fail, see https://github.com/numpy/numpy/issues/8546
@@ -2011,25 +2492,156 @@ class DatasetDeque:
         # is off by X hours, EVERYTHING will be off by X hours if I simply
         # reset it based on the first time in self.data!  Therefore the
         # 'min' function.
-#        newst = self.data["time"][0].values.astype("M8[ms]") + numpy.timedelta64(period)
         newst = min(numpy.datetime64(self.edges[0]), self.data["time"][0].values.astype("M8[ms]") + numpy.timedelta64(period))
-        # BUG: need workaround for https://github.com/pydata/xarray/issues/1297
-        all_encodings = {k: v.encoding for (k, v) in self.data.data_vars.items()}
-        self.data = xarray.concat(
-            (self.data.sel(time=slice(newst, None)),
-             datanew),
-            dim="time")
-        for (k, v) in self.data.data_vars.items():
-            v.encoding = all_encodings[k]
+        self._drop_before(newst)
+        self._append(datanew)
 
     def resize(self, window):
         """Resize window
+
+        Only the periods by which the window grows are read.
         """
 
+        old_edges = self.edges
         self.window = window
         self.edges = (self.center_time-window/2, self.center_time+window/2)
-        self.data = self.dsobj.as_xarray_dataset(
-            self.dsobj.read_period(*self.edges))
+        if self.edges[0] >= old_edges[1] or self.edges[1] <= old_edges[0]:
+            # nothing to keep
+            self.reset(newtime=self.center_time)
+            return
+
+        self._drop_before(numpy.datetime64(self.edges[0]))
+        self._drop_after(numpy.datetime64(self.edges[1]))
+        if self.edges[0] < old_edges[0]:
+            self._prepend(self._read_delta(self.edges[0], old_edges[0]))
+        if self.edges[1] > old_edges[1]:
+            self._append(self._read_delta(old_edges[1], self.edges[1]))
+        self._update_view()
+
+    def _read_delta(self, start, end):
+        """Read [start, end) for resize, None if there are no data"""
+        try:
+            M = self.dsobj.read_period(start, end)
+        except DataFileError as exc:
+            logger.debug("No data between {:%Y-%m-%d %H:%M:%S} and "
+                "{:%Y-%m-%d %H:%M:%S}: {!s}".format(start, end, exc))
+            return None
+        data = self.dsobj.as_xarray_dataset(M)
+        times = data["time"].values
+        return data.isel(time=(times >= numpy.datetime64(start)) &
+                              (times < numpy.datetime64(end)))
+
+    @staticmethod
+    def _along_time(var, start, stop):
+        """Index to select start:stop along the time axis of var"""
+        return ((slice(None),) * var.dims.index("time")
+                + (slice(start, stop),))
+
+    def _allocate(self, data, capacity=None, offset=0):
+        """Copy data into new buffers with room for more data"""
+        n = data.sizes["time"]
+        if capacity is None:
+            capacity = max(2 * n, 1)
+        self._template = data.isel(time=slice(0, 0))
+        self._capacity = capacity
+        self._buffers = {}
+        for (k, v) in data.variables.items():
+            if "time" in v.dims:
+                shape = list(v.shape)
+                shape[v.dims.index("time")] = capacity
+                self._buffers[k] = numpy.empty(shape, dtype=v.dtype)
+                self._buffers[k][
+                    self._along_time(v, offset, offset+n)] = v.values
+        self._head = self._low = offset
+        self._tail = self._high = offset + n
+        self._update_view()
+
+    def _fits(self, data):
+        """Can data be written into the current buffers?"""
+        if data.variables.keys() != self._template.variables.keys():
+            return False
+        for (k, v) in data.variables.items():
+            old = self._template.variables[k]
+            if (v.dims != old.dims or
+                    ("time" in v.dims and v.dtype != old.dtype) or
+                    any(v.sizes[d] != old.sizes[d]
+                        for d in v.dims if d != "time")):
+                return False
+        return True
+
+    def _append(self, data):
+        """Append data on the right, copying only data"""
+        if data is None or data.sizes["time"] == 0:
+            self._update_view()
+            return
+        if not self._fits(data):
+            logger.debug("Structure of new data has changed, reallocating")
+            self._allocate(xarray.concat((self.data, data), dim="time"))
+            return
+
+        n = data.sizes["time"]
+        if self._tail < self._high or self._tail + n > self._capacity:
+            self._allocate(self.data,
+                capacity=2 * (self._tail - self._head + n))
+        for (k, buf) in self._buffers.items():
+            v = data.variables[k]
+            buf[self._along_time(v, self._tail, self._tail+n)] = v.values
+        self._tail += n
+        self._high = self._tail
+        self._update_view()
+
+    def _prepend(self, data):
+        """Prepend data on the left, copying only data"""
+        if data is None or data.sizes["time"] == 0:
+            return
+        if not self._fits(data):
+            logger.debug("Structure of new data has changed, reallocating")
+            self._allocate(xarray.concat((data, self.data), dim="time"))
+            return
+
+        n = data.sizes["time"]
+        if self._head > self._low or self._head < n:
+            size = self._tail - self._head
+            self._allocate(self.data, capacity=2 * (size + n), offset=n)
+        for (k, buf) in self._buffers.items():
+            v = data.variables[k]
+            buf[self._along_time(v, self._head-n, self._head)] = v.values
+        self._head -= n
+        self._low = self._head
+        self._update_view()
+
+    def _drop_before(self, time):
+        """Discard data before time on the left"""
+        times = self._buffers["time"][self._head:self._tail]
+        self._head += int(numpy.searchsorted(times, time, side="left"))
+        self._update_view()
+
+    def _drop_after(self, time):
+        """Discard data from time on the right"""
+        times = self._buffers["time"][self._head:self._tail]
+        self._tail = self._head + int(
+            numpy.searchsorted(times, time, side="left"))
+        self._update_view()
+
+    def _update_view(self):
+        """Set self.data to a view of the buffers from _head to _tail"""
+        if self.data is not None:
+            # keep encodings that were set on the previous view
+            for (k, v) in self.data.variables.items():
+                if k in self._template.variables:
+                    self._template.variables[k].encoding = v.encoding
+        variables = {}
+        for (k, v) in self._template.variables.items():
+            if k in self._buffers:
+                v = xarray.Variable(v.dims,
+                    self._buffers[k][
+                        self._along_time(v, self._head, self._tail)],
+                    v.attrs, v.encoding)
+            variables[k] = v
+        self.data = xarray.Dataset(
+            {k: variables[k] for k in self._template.data_vars},
+            coords={k: variables[k] for k in self._template.coords},
+            attrs=self._template.attrs)
 
     def __repr__(self):
         return "<{:s} {:s} centred at {:%Y-%m-%d %H:%M}>".format(
@@ -0,0 +1,328 @@
+"""Persistent index of granules and their time coverage
+
+Determining the starting and ending time of a granule may require opening
+it, and finding the granules of a period requires listing many directories.
+:class:`GranuleIndex` stores the times of granules in a SQLite database in
+WAL mode, which can be read and written by many processes at the same time.
+It also remembers for which dates and locator arguments (e.g. satellite
+names) all granules have been indexed, so that
+:meth:`~typhon.datasets.dataset.MultiFileDataset.find_granules` can answer
+those queries with a range query on the index.
+"""
+
+from contextlib import closing
+import datetime
+import json
+import pathlib
+import sqlite3
+
+__all__ = [
+    "GranuleIndex",
+    "locator_key",
+]
+
+# Datetimes are stored as integers (microseconds since datetime.min), dates
+# as ordinals:
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def _to_int(time):
+    if not isinstance(time, datetime.datetime):
+        time = datetime.datetime.combine(time, datetime.time())
+    return (time - datetime.datetime.min) // _MICROSECOND
+
+
+def _from_int(value):
+    return datetime.datetime.min + value * _MICROSECOND
+
+
+def locator_key(locator_args):
+    """Convert locator arguments to a string usable as key
+
+    Arguments:
+
+        locator_args (Mapping): Extra arguments for
+            :meth:`~typhon.datasets.dataset.MultiFileDataset.find_granules`,
+            such as the satellite name.
+
+    Returns:
+
+        str: JSON representation independent of the order of the arguments.
+    """
+    return json.dumps(sorted(
+        (str(key), str(value)) for key, value in locator_args.items()))
+
+
+class GranuleIndex:
+    """Index of granules with their starting and ending times
+
+    The index consists of granules that were found for a set of locator
+    arguments (see :func:`locator_key`) and of the date ranges for which
+    they have been completely indexed (the *coverage*). Times that were
+    determined independently of a search (e.g. by
+    :meth:`~typhon.datasets.dataset.MultiFileDataset.get_times_for_granule`)
+    are stored with an empty locator key.
+
+    Each operation opens its own connection, hence objects of this class can
+    be pickled and passed to other processes.
+
+    Example:
+
+    .. code-block:: python
+
+        index = GranuleIndex("/data/hirs/granules.sqlite")
+        index.set_many([(path, start, end) for ...], locator_key(extra))
+        index.add_coverage(first_date, last_date, locator_key(extra))
+
+        if index.covers(first_date, last_date, locator_key(extra)):
+            for (start, end, path) in index.query(start, end,
+                                                  locator_key(extra)):
+                ...
+    """
+
+    def __init__(self, filename):
+        """Open or create a granule index
+
+        Arguments:
+
+            filename (str or pathlib.Path): Path to the SQLite database.  It
+                will be created if it does not exist yet.
+
+        Raises:
+
+            sqlite3.DatabaseError: If the file exists but is not a SQLite
+                database (e.g. a shelve written by an older version).
+        """
+        self.filename = str(filename)
+
+        with closing(self._connect()) as connection, connection:
+            # Readers do not block the writer (and vice versa) in WAL mode:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS granules (
+                    locator TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    start INTEGER NOT NULL,
+                    end INTEGER NOT NULL,
+                    PRIMARY KEY (path, locator)
+                );
+                CREATE INDEX IF NOT EXISTS granules_start
+                    ON granules (locator, start);
+                CREATE TABLE IF NOT EXISTS coverage (
+                    locator TEXT NOT NULL,
+                    first INTEGER NOT NULL,
+                    last INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS coverage_locator
+                    ON coverage (locator);
+                CREATE TABLE IF NOT EXISTS durations (
+                    locator TEXT PRIMARY KEY,
+                    longest INTEGER NOT NULL
+                );
+            """)
+
+    def __len__(self):
+        with closing(self._connect()) as connection:
+            return connection.execute(
+                "SELECT COUNT(DISTINCT path) FROM granules").fetchone()[0]
+
+    def __repr__(self):
+        return f"GranuleIndex('{self.filename}')"
+
+    def _connect(self):
+        return sqlite3.connect(self.filename, timeout=60)
+
+    def get(self, path):
+        """Get the stored times of a granule
+
+        Arguments:
+
+            path (str or pathlib.Path): Path to the granule.
+
+        Returns:
+
+            (datetime, datetime) or None if the granule is unknown.
+        """
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT start, end FROM granules WHERE path = ? LIMIT 1",
+                (str(path),)).fetchone()
+        if row is None:
+            return None
+        return (_from_int(row[0]), _from_int(row[1]))
+
+    def set(self, path, start, end, locator=""):
+        """Store the times of a single granule
+
+        Arguments:
+
+            path (str or pathlib.Path): Path to the granule.
+            start (datetime): Starting time.
+            end (datetime): Ending time.
+            locator (str): Key of the locator arguments.
+
+        Returns:
+
+            None
+        """
+        self.set_many([(path, start, end)], locator)
+
+    def set_many(self, granules, locator=""):
+        """Store the times of many granules in one transaction
+
+        Arguments:
+
+            granules (Iterable): Tuples of (path, start, end).
+            locator (str): Key of the locator arguments, see
+                :func:`locator_key`.
+
+        Returns:
+
+            None
+        """
+        rows = [(locator, str(path), _to_int(start), _to_int(end))
+                for (path, start, end) in granules]
+        if not rows:
+            return
+        longest = max(end - start for (_, _, start, end) in rows)
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO granules (locator, path, start, end) "
+                "VALUES (?, ?, ?, ?)", rows)
+            # The longest granule bounds the range scan in query():
+            connection.execute(
+                "INSERT INTO durations (locator, longest) VALUES (?, ?) "
+                "ON CONFLICT (locator) "
+                "DO UPDATE SET longest = MAX(longest, excluded.longest)",
+                (locator, longest))
+
+    def query(self, start, end, locator=""):
+        """Find all granules overlapping with a period
+
+        Arguments:
+
+            start (datetime): Start of the period.
+            end (datetime): End of the period (inclusive).
+            locator (str): Key of the locator arguments.
+
+        Yields:
+
+            Tuples of (start, end, pathlib.Path) sorted by starting time.
+        """
+        start = _to_int(start)
+        end = _to_int(end)
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT longest FROM durations WHERE locator = ?",
+                (locator,)).fetchone()
+            longest = 0 if row is None else row[0]
+
+            # Overlapping granules cannot start earlier than *start - longest
+            # duration*, which makes this a range query on the start index:
+            cursor = connection.execute(
+                "SELECT start, end, path FROM granules "
+                "WHERE locator = ? AND start BETWEEN ? AND ? AND end >= ? "
+                "ORDER BY start, end",
+                (locator, start - longest, end, start))
+            for (g_start, g_end, path) in cursor:
+                yield (_from_int(g_start), _from_int(g_end),
+                       pathlib.Path(path))
+
+    def covers(self, first, last, locator=""):
+        """Have all granules between two dates been indexed?
+
+        Arguments:
+
+            first (datetime.date): First date.
+            last (datetime.date): Last date (inclusive).
+            locator (str): Key of the locator arguments.
+
+        Returns:
+
+            bool
+        """
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT COUNT(*) FROM coverage "
+                "WHERE locator = ? AND first <= ? AND last >= ?",
+                (locator, first.toordinal(), last.toordinal())).fetchone()
+        return row[0] > 0
+
+    def add_coverage(self, first, last, locator=""):
+        """Mark all granules between two dates as indexed
+
+        Overlapping or adjacent date ranges are merged.  Dates from today
+        (UTC) on are never marked, since new granules may still arrive for
+        them; they are searched in the directories every time.
+
+        Arguments:
+
+            first (datetime.date): First date.
+            last (datetime.date): Last date (inclusive).
+            locator (str): Key of the locator arguments.
+
+        Returns:
+
+            None
+        """
+        today = datetime.datetime.utcnow().date()
+        first, last = first.toordinal(), min(last.toordinal(),
+                                             today.toordinal() - 1)
+        if first > last:
+            return
+        with closing(self._connect()) as connection, connection:
+            overlapping = connection.execute(
+                "SELECT first, last FROM coverage "
+                "WHERE locator = ? AND first <= ? AND last >= ?",
+                (locator, last + 1, first - 1)).fetchall()
+            for (other_first, other_last) in overlapping:
+                first = min(first, other_first)
+                last = max(last, other_last)
+            connection.execute(
+                "DELETE FROM coverage "
+                "WHERE locator = ? AND first >= ? AND last <= ?",
+                (locator, first, last))
+            connection.execute(
+                "INSERT INTO coverage (locator, first, last) "
+                "VALUES (?, ?, ?)", (locator, first, last))
+
+    def reset(self, first, last, locator=""):
+        """Remove the granules between two dates from the index
+
+        The granules starting on these dates are removed and the dates are
+        not marked as indexed anymore. The next search for this period will
+        list the directories again.
+
+        Arguments:
+
+            first (datetime.date): First date.
+            last (datetime.date): Last date (inclusive).
+            locator (str): Key of the locator arguments.
+
+        Returns:
+
+            None
+        """
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "DELETE FROM granules "
+                "WHERE locator = ? AND start >= ? AND start < ?",
+                (locator, _to_int(first),
+                 _to_int(last + datetime.timedelta(days=1))))
+
+            first, last = first.toordinal(), last.toordinal()
+            overlapping = connection.execute(
+                "SELECT rowid, first, last FROM coverage "
+                "WHERE locator = ? AND first <= ? AND last >= ?",
+                (locator, last, first)).fetchall()
+            for (rowid, other_first, other_last) in overlapping:
+                connection.execute(
+                    "DELETE FROM coverage WHERE rowid = ?", (rowid,))
+                # Keep the parts outside of the removed range:
+                for (part_first, part_last) in (
+                        (other_first, first - 1), (last + 1, other_last)):
+                    if part_first <= part_last:
+                        connection.execute(
+                            "INSERT INTO coverage (locator, first, last) "
+                            "VALUES (?, ?, ?)",
+                            (locator, part_first, part_last))
@@ -99,6 +99,34 @@ class ATOVS:
                 (scanlines[prefix + "scnlindy"]-1).astype("m8[D]") +
                  scanlines[prefix + "scnlintime"].astype("m8[ms]"))
 
+class _ScaledRecords:
+    """Apply HIRS scale factors lazily, one field at a time
+
+    Wraps raw (possibly memory-mapped) scanline records and mimics the
+    small part of the structured array interface that the get_* methods of
+    HIRS use.  A field is only scaled (and thus copied) when it is accessed
+    for the first time.  Fields without scale factor are returned as views
+    of the raw records.
+    """
+
+    def __init__(self, records, dtype, scale_factors, scale_base):
+        self.records = records
+        self.dtype = dtype
+        self.shape = records.shape
+        self.scale_factors = scale_factors
+        self.scale_base = scale_base
+        self._fields = {}
+
+    def __getitem__(self, name):
+        if name not in self._fields:
+            field = self.records[name]
+            if name in self.scale_factors:
+                field = (field / numpy.power(
+                    self.scale_base, self.scale_factors[name])).astype(
+                        self.dtype[name].base)
+            self._fields[name] = field
+        return self._fields[name]
+
 class HIRS(dataset.MultiSatelliteDataset, Radiometer, dataset.MultiFileDataset):
     """High-resolution Infra-Red Sounder.
 
@@ -220,26 +248,8 @@ class HIRS(dataset.MultiSatelliteDataset, Radiometer, dataset.MultiFileDataset):
                     apply_scale_factors=True, 
                     apply_calibration=True,
                     radiance_units="si"):
-        if path.endswith(".gz"):
-            opener = gzip.open
-        else:
-            opener = open
-        with opener(str(path), 'rb') as f:
-            self.seekhead(f)
-            (header_dtype, line_dtype) = self.get_dtypes(f)
-            header_bytes = f.read(header_dtype.itemsize)
-            header = numpy.frombuffer(header_bytes, header_dtype)
-            n_lines = header["hrs_h_scnlin"][0]
-            scanlines_bytes = f.read()
-            try:
-                scanlines = numpy.frombuffer(scanlines_bytes, line_dtype)
-            except ValueError as v:
-                raise dataset.InvalidFileError("Can not read "
-                    "whole number of records.  Expected {:d} scanlines, "
-                    "but found {:d} lines with a remainder of {:d} "
-                    "bytes.  File appears truncated.".format(
-                        n_lines, *divmod(len(scanlines_bytes),
-                                         line_dtype.itemsize))) from v
+        (header, scanlines) = self._read_records(path)
+        n_lines = header["hrs_h_scnlin"][0]
         if scanlines.shape[0] != n_lines:
             raise dataset.InvalidFileError(
                 "Problem reading {!s}.  Header promises {:d} scanlines, but I found only {:d} — "
@@ -251,129 +261,227 @@ class HIRS(dataset.MultiSatelliteDataset, Radiometer, dataset.MultiFileDataset):
                     path, n_lines))
         n_lines = scanlines.shape[0]
 
+        if fields != "all":
+            # Only the requested fields are scaled, calibrated and copied
+            # out of the raw records
+            return self._read_fields(path, header, scanlines, fields,
+                apply_scale_factors, apply_calibration, radiance_units)
+
+        if apply_calibration and not apply_scale_factors:
+            raise ValueError("Can't calibrate if not also applying"
+                             " scale factors!")
         if apply_scale_factors:
             (header, scanlines) = self._apply_scale_factors(header, scanlines)
-        if apply_calibration:
-            if not apply_scale_factors:
-                raise ValueError("Can't calibrate if not also applying"
-                                 " scale factors!")
-            (lat, lon) = self.get_pos(scanlines)
-            if not (1 < lat.ptp() <= 180) or not (1 < lon.ptp() <= 360):
-                raise dataset.InvalidDataError(
-                    "Range of latitude {:.1f}°, longitude {:.1f}, suspect!".format(
-                        lat.ptp(), lon.ptp()))
-            other = self.get_other(scanlines)
+        (header, derived) = self._derive_fields(path, header, scanlines,
+            apply_calibration, radiance_units)
+
+        # Copy over all fields... should be able to use
+        # numpy.lib.recfunctions.append_fields but incredibly slow!
+        empty = numpy.ma.empty if apply_calibration else numpy.empty
+        scanlines_new = empty(shape=scanlines.shape,
+            dtype=(scanlines.dtype.descr +
+                [(f, dt) for (f, (_, dt)) in derived.items()]))
+        for f in scanlines.dtype.names:
+            scanlines_new[f] = scanlines[f]
+        for (f, (v, _)) in derived.items():
+            scanlines_new[f] = v
+        scanlines = scanlines_new
+
+        # TODO:
+        # - Add other meta-information from TIP
+        extra = {"header": header}
+        return (scanlines, extra)
+
+    def _read_records(self, path):
+        """Read header and raw scanline records from a granule
 
+        Uncompressed granules are memory-mapped, i.e. the scanline records
+        are not read into memory before they are accessed.  Gzipped
+        granules are decompressed into memory.
+
+        Returns a tuple of the header and the scanline records, both as
+        structured ndarrays with the native dtypes of the file.
+        """
+        if path.endswith(".gz"):
+            opener = gzip.open
+        else:
+            opener = open
+        with opener(str(path), 'rb') as f:
+            self.seekhead(f)
+            (header_dtype, line_dtype) = self.get_dtypes(f)
+            header_bytes = f.read(header_dtype.itemsize)
+            header = numpy.frombuffer(header_bytes, header_dtype)
+            n_lines = header["hrs_h_scnlin"][0]
+            offset = f.tell()
+            if opener is gzip.open:
+                scanlines_bytes = f.read()
+                n_bytes = len(scanlines_bytes)
+            else:
+                n_bytes = f.seek(0, io.SEEK_END) - offset
+        (n_records, remainder) = divmod(n_bytes, line_dtype.itemsize)
+        if remainder:
+            raise dataset.InvalidFileError("Can not read "
+                "whole number of records.  Expected {:d} scanlines, "
+                "but found {:d} lines with a remainder of {:d} "
+                "bytes.  File appears truncated.".format(
+                    n_lines, n_records, remainder))
+        if opener is gzip.open:
+            scanlines = numpy.frombuffer(scanlines_bytes, line_dtype)
+        elif n_records == 0:
+            # numpy cannot map an empty region
+            scanlines = numpy.empty(shape=(0,), dtype=line_dtype)
+        else:
+            scanlines = numpy.memmap(str(path), dtype=line_dtype,
+                mode="r", offset=offset, shape=(n_records,))
+        return (header, scanlines)
+
+    def _read_fields(self, path, header, scanlines, fields,
+                     apply_scale_factors, apply_calibration,
+                     radiance_units):
+        """Read only selected fields from raw scanline records
+
+        Used internally by _read when fields is not "all".  Raw fields
+        are scaled on access and derived fields (radiance, bt, lat, lon,
+        temperatures, ...) are only calculated when requested, so that
+        the returned array holds the requested fields only.  Latitude,
+        longitude, and time are always checked for validity.
+        """
+        fields = list(fields)
+        if apply_calibration and not apply_scale_factors:
+            raise ValueError("Can't calibrate if not also applying"
+                             " scale factors!")
+        if apply_scale_factors:
+            (header, scaled) = self._apply_scale_factors(
+                header, scanlines[:0])
+            scanlines = _ScaledRecords(scanlines, scaled.dtype,
+                _tovs_defs.HIRS_scale_factors[self.version],
+                _tovs_defs.HIRS_scale_bases[self.version])
+        n_lines = scanlines.shape[0]
+        wanted = set(fields)
+
+        (header, derived) = self._derive_fields(path, header, scanlines,
+            apply_calibration, radiance_units, wanted)
+
+        dtype = []
+        for f in fields:
+            if f in derived:
+                dtype.append((f, derived[f][1]))
+            elif f in scanlines.dtype.names:
+                dtype.append((f, scanlines.dtype[f]))
+            else:
+                raise ValueError("no field of name {:s}".format(f))
+        empty = numpy.ma.empty if apply_calibration else numpy.empty
+        M = empty(shape=(n_lines,), dtype=dtype)
+        for f in fields:
+            M[f] = derived[f][0] if f in derived else scanlines[f]
+        return (M, {"header": header})
+
+    def _derive_fields(self, path, header, scanlines, apply_calibration,
+                       radiance_units, wanted=None):
+        """Calculate the fields that are derived from the scanline records
+
+        Used internally by _read (for all fields) and by _read_fields (for
+        the fields in wanted only).  Without calibration, only the time is
+        derived.  With calibration, latitude, longitude, and time are
+        always calculated and checked for validity.
+
+        Returns a tuple of the header (with dataname if calibrating) and a
+        dictionary name → (values, dtype) of the derived fields.
+        """
+        if apply_calibration and radiance_units not in {"si", "classic"}:
+            raise ValueError("Invalid value for radiance_units. "
+                "Expected 'si' or 'classic'.  Got "
+                "{:s}".format(radiance_units))
+        n_lines = scanlines.shape[0]
+        time = self._get_time(scanlines)
+        if not apply_calibration:
+            return (header, {"time": (time, numpy.dtype("M8[ms]"))})
+
+        def is_wanted(*names):
+            return wanted is None or bool(wanted & set(names))
+
+        if time.ptp() > self.max_valid_time_ptp:
+            raise dataset.InvalidDataError("Time span appears to be "
+                "{!s}.  That can't be right!".format(
+                    time.ptp().astype(datetime.timedelta)))
+        (lat, lon) = self.get_pos(scanlines)
+        if not (1 < lat.ptp() <= 180) or not (1 < lon.ptp() <= 360):
+            raise dataset.InvalidDataError(
+                "Range of latitude {:.1f}°, longitude {:.1f}, suspect!".format(
+                    lat.ptp(), lon.ptp()))
+
+        # name → (values, dtype) of the derived fields we calculate
+        derived = {}
+        temp_wanted = (wanted is None
+            or any(f.startswith("temp_") for f in wanted))
+        if is_wanted("radiance", "counts", "bt", "calcof_sorted"):
             cc = self.get_cc(scanlines)
             cc = cc[:, numpy.argsort(self.channel_order), ...]
+        if is_wanted("radiance", "counts", "bt") or temp_wanted:
             elem = scanlines["hrs_elem"].reshape(n_lines,
                         self.n_minorframes, self.n_wordperframe)
+        if is_wanted("radiance", "counts", "bt"):
             # x & ~(1<<12)   ==   x - 1<<12     ==    x - 4096    if this
             # bit is set
             counts = elem[:, :self.n_perline, self.count_start:self.count_end]
             counts = counts - self.counts_offset
             counts = counts[:, :, numpy.argsort(self.channel_order)]
+        if is_wanted("radiance", "bt"):
             rad_wn = self.calibrate(cc, counts)
-
+        if is_wanted("radiance"):
+            unit = rad_u["si"] if radiance_units == "si" else rad_u["ir"]
+            derived["radiance"] = (rad_wn.to(unit, "radiance"),
+                numpy.dtype(("f4", (self.n_perline, self.n_channels,))))
+        if is_wanted("radiance", "counts", "bt"):
+            derived["counts"] = (counts, numpy.dtype(
+                ("i2", (self.n_perline, self.n_channels,))))
+        if is_wanted("bt"):
             # Convert radiance to BT
             (wn, c1, c2) = self.get_wn_c1_c2(header)
 
             # convert wn to SI units
             wn = wn * (1 / ureg.cm)
             wn = wn.to(1 / ureg.m)
-            bt = self.rad2bt(rad_wn[:, :, :self.n_calibchannels], wn, c1, c2)
-
+            derived["bt"] = (
+                self.rad2bt(rad_wn[:, :, :self.n_calibchannels], wn, c1, c2),
+                numpy.dtype(("f4", (self.n_perline, self.n_calibchannels,))))
+        derived["time"] = (time, numpy.dtype("M8[ms]"))
+        derived["lat"] = (lat, numpy.dtype(("f8", (self.n_perline,))))
+        derived["lon"] = (lon, numpy.dtype(("f8", (self.n_perline,))))
+        if is_wanted("radiance", "counts", "bt", "calcof_sorted"):
+            derived["calcof_sorted"] = (cc, numpy.dtype(("f8", cc.shape[1:])))
+        if temp_wanted:
             # extract more info from TIP
             temp = self.get_temp(header, elem,
                 scanlines["hrs_anwrd"]
                     if "hrs_anwrd" in scanlines.dtype.names
                     else None)
-
-            # Copy over all fields... should be able to use
-            # numpy.lib.recfunctions.append_fields but incredibly slow!
-            scanlines_new = numpy.ma.empty(shape=scanlines.shape,
-                dtype=(scanlines.dtype.descr +
-                    [("radiance", "f4", (self.n_perline, self.n_channels,)),
-                     ("counts", "i2", (self.n_perline, self.n_channels,)),
-                     ("bt", "f4", (self.n_perline, self.n_calibchannels,)),
-                     ("time", "M8[ms]"),
-                     ("lat", "f8", (self.n_perline,)),
-                     ("lon", "f8", (self.n_perline,)),
-                     ("calcof_sorted", "f8", cc.shape[1:])] +
-                    [("temp_"+k, "f4", temp[k].squeeze().shape[1:])
-                        for k in temp.keys()] +
-                    other.dtype.descr))
-            for f in scanlines.dtype.names:
-                scanlines_new[f] = scanlines[f]
-            for f in temp.keys():
-                scanlines_new["temp_" + f] = temp[f].squeeze()
+            for (k, v) in temp.items():
+                v = v.squeeze()
+                derived["temp_" + k] = (v, numpy.dtype(("f4", v.shape[1:])))
+        if wanted is None or wanted - set(derived) - set(scanlines.dtype.names):
+            other = self.get_other(scanlines)
             for f in other.dtype.names:
-                scanlines_new[f] = other[f]
-            if radiance_units == "si":
-                scanlines_new["radiance"] = rad_wn.to(rad_u["si"],
-                    "radiance")
-            elif radiance_units == "classic":
-                scanlines_new["radiance"] = rad_wn.to(rad_u["ir"],
-                    "radiance")
-            else:
-                raise ValueError("Invalid value for radiance_units. "
-                    "Expected 'si' or 'classic'.  Got "
-                    "{:s}".format(radiance_units))
-            scanlines_new["counts"] = counts
-            scanlines_new["bt"] = bt
-            scanlines_new["lat"] = lat
-            scanlines_new["lon"] = lon
-            time = self._get_time(scanlines)
-            if time.ptp() > self.max_valid_time_ptp:
-                raise dataset.InvalidDataError("Time span appears to be "
-                    "{!s}.  That can't be right!".format(
-                        time.ptp().astype(datetime.timedelta)))
-            scanlines_new["time"] = self._get_time(scanlines)
-            scanlines_new["calcof_sorted"] = cc
-            scanlines = scanlines_new
-
-            header_new = numpy.empty(shape=header.shape,
-                dtype=(header.dtype.descr +
-                    [("dataname", "<U42")]))
-            for f in header.dtype.names:
-                header_new[f] = header[f]
-            try:
-                header_new["dataname"] = self.get_dataname(header)
-            except ValueError as exc:
-                warnings.warn("Could not read dataname from header: " +
-                    exc.args[0])
-                header_new["dataname"] = pathlib.Path(path).stem
-            header = header_new
-        else: # i.e. not calibrating
-            # FIXME: this violates DRY a bit, as those lines also occur
-            # in the If:-block, but hard to do incrementally.  However, I
-            # just rely on times being available too much.
-            scanlines_new = numpy.empty(shape=scanlines.shape,
-                dtype=(scanlines.dtype.descr +
-                    [("time", "M8[ms]")]))
-            scanlines_new["time"] = self._get_time(scanlines)
-            for f in scanlines.dtype.names:
-                scanlines_new[f] = scanlines[f]
-            scanlines = scanlines_new
+                derived[f] = (other[f], other.dtype[f])
+        header = self._add_dataname(header, path)
+        return (header, derived)
 
-        if fields != "all":
-            # I'd like to use catch_warnings, but this triggers
-            # http://bugs.python.org/issue29672 thus flooding my screen
-            # for any *other* warning wherever this is called in a loop,
-            # which it is.  Commenting out again :(
-#            with warnings.catch_warnings():
-                # selecting multiple fields from a structured masked array
-                # leads to a FutureWarning, see
-                # https://github.com/numpy/numpy/issues/8383 .
-                # I believe this is a false alert.
-#                warnings.filterwarnings("ignore", category=FutureWarning)
-            scanlines = scanlines[fields]
+    def _add_dataname(self, header, path):
+        """Return a copy of header with an additional dataname field
+        """
+        header_new = numpy.empty(shape=header.shape,
+            dtype=(header.dtype.descr +
+                [("dataname", "<U42")]))
+        for f in header.dtype.names:
+            header_new[f] = header[f]
+        try:
+            header_new["dataname"] = self.get_dataname(header)
+        except ValueError as exc:
+            warnings.warn("Could not read dataname from header: " +
+                exc.args[0])
+            header_new["dataname"] = pathlib.Path(path).stem
+        return header_new
 
-        # TODO:
-        # - Add other meta-information from TIP
-        extra = {"header": header}
-        return (scanlines, extra)
-       
     def _add_pseudo_fields(self, M, pseudo_fields, extra, f):
         if isinstance(M, tuple):
             return (M[0], super()._add_pseudo_fields(M[1], pseudo_fields,
@@ -3,8 +3,11 @@
 """This module contains convenience functions for general file handling.
 """
 
+from .catalogue import *
 from .fileset import *
 from .handlers import *
+from .transport import *
 from .utils import *
+from .writer import *
 
 __all__ = [s for s in dir() if not s.startswith('_')]
\ No newline at end of file
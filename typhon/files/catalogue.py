@@ -0,0 +1,462 @@
+"""
+This module contains a persistent file catalogue for filesets.
+
+Walking through directory trees with millions of files and parsing every
+filename is expensive. The :class:`FileCatalogue` stores the path, time
+coverage and placeholder fillings of all files of a
+:class:`~typhon.files.fileset.FileSet` in a SQLite database. It can be updated
+incrementally (only directories that have changed since the last update are
+searched again) and answers time range queries via an index lookup.
+
+Retrieving the time coverage of a file via its file handler (e.g. by
+opening it) is even more expensive. The :class:`FileInfoStore` keeps these
+results in a SQLite database that can be shared by many processes.
+"""
+
+from contextlib import closing
+from datetime import datetime, timedelta
+import json
+import sqlite3
+
+from .handlers import FileInfo
+
+__all__ = [
+    "FileCatalogue",
+    "FileInfoStore",
+]
+
+
+# Datetimes are stored as integers (microseconds since datetime.min). This
+# allows fast range queries with a simple B-tree index:
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _to_int(time):
+    return (time - datetime.min) // _MICROSECOND
+
+
+def _from_int(value):
+    return datetime.min + value * _MICROSECOND
+
+
+def _to_int_or_none(time):
+    return None if time is None else _to_int(time)
+
+
+def _from_int_or_none(value):
+    return None if value is None else _from_int(value)
+
+
+class FileCatalogue:
+    """Persistent index of the files of a fileset
+
+    You normally do not need to use this class directly, simply pass a
+    filename to the `catalogue` parameter of
+    :class:`~typhon.files.fileset.FileSet`.
+
+    The catalogue remembers the modification time of each directory. When
+    updating it, only directories whose modification time has changed are
+    listed again. Note that the modification time of a directory only changes
+    if files are added, removed or renamed. If you overwrite the content of
+    a file (and the fileset retrieves the time coverage via the file
+    handler), you should reset the catalogue.
+
+    Examples:
+
+    .. code-block:: python
+
+        from typhon.files import FileSet
+
+        files = FileSet(
+            "/dir/{year}/{doy}/{hour}{minute}{second}.nc",
+            catalogue="/dir/catalogue.sqlite",
+        )
+
+        # The first call builds the catalogue, all further calls are answered
+        # from it:
+        for file in files.find("2017-01-01", "2017-01-02"):
+            print(file)
+
+        # Pick up new files:
+        files.update_catalogue()
+    """
+
+    def __init__(self, filename, template=None):
+        """Initialize a FileCatalogue object
+
+        Args:
+            filename: Path to the SQLite database. It will be created if it
+                does not exist yet.
+            template: The path (with placeholders) of the fileset this
+                catalogue belongs to. If the catalogue was created for a
+                different path, it is reset.
+        """
+        self.filename = filename
+        self.template = template
+
+        with closing(self._connect()) as connection, connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    dir TEXT NOT NULL,
+                    start INTEGER NOT NULL,
+                    end INTEGER NOT NULL,
+                    attr TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS files_start ON files (start);
+                CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+                CREATE TABLE IF NOT EXISTS dirs (
+                    path TEXT PRIMARY KEY,
+                    parent TEXT,
+                    mtime TEXT
+                );
+                CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+
+            stored_template = self._get_meta(connection, "template")
+            if template is not None and stored_template != template:
+                self._clear(connection)
+                self._set_meta(connection, "template", template)
+
+    def __len__(self):
+        with closing(self._connect()) as connection:
+            return connection.execute(
+                "SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def __repr__(self):
+        return f"FileCatalogue('{self.filename}')"
+
+    def _connect(self):
+        # We open a new connection for each operation. Connections cannot be
+        # pickled and FileSet objects are passed to other processes.
+        return sqlite3.connect(self.filename, timeout=60)
+
+    @staticmethod
+    def _get_meta(connection, key):
+        row = connection.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    @staticmethod
+    def _set_meta(connection, key, value):
+        connection.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (key, value)
+        )
+
+    @staticmethod
+    def _set_dir_mtime(connection, directory, mtime):
+        # Keep the parent of already known directories:
+        connection.execute(
+            "INSERT OR IGNORE INTO dirs (path, parent, mtime) "
+            "VALUES (?, NULL, ?)", (directory, mtime)
+        )
+        connection.execute(
+            "UPDATE dirs SET mtime = ? WHERE path = ?", (mtime, directory)
+        )
+
+    @staticmethod
+    def _clear(connection):
+        connection.execute("DELETE FROM files")
+        connection.execute("DELETE FROM dirs")
+        connection.execute("DELETE FROM meta")
+
+    @property
+    def is_empty(self):
+        """True if the catalogue has never been built."""
+        with closing(self._connect()) as connection:
+            return connection.execute(
+                "SELECT COUNT(*) FROM dirs").fetchone()[0] == 0
+
+    def reset(self):
+        """Remove all entries from the catalogue
+
+        Returns:
+            None
+        """
+        with closing(self._connect()) as connection, connection:
+            self._clear(connection)
+            if self.template is not None:
+                self._set_meta(connection, "template", self.template)
+
+    def get_mtime(self, directory):
+        """Get the stored modification time of a directory
+
+        Args:
+            directory: Path to the directory.
+
+        Returns:
+            The modification time as string or None if the directory is
+            unknown.
+        """
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT mtime FROM dirs WHERE path = ?", (directory,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def get_subdirs(self, directory):
+        """Get all known direct sub directories of a directory
+
+        Args:
+            directory: Path to the directory.
+
+        Returns:
+            A list of paths.
+        """
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT path FROM dirs WHERE parent = ? ORDER BY path",
+                (directory,)
+            ).fetchall()
+
+        return [path for path, in rows]
+
+    def set_subdirs(self, directory, mtime, subdirs):
+        """Update the sub directories of a directory
+
+        Sub directories that are not in `subdirs` any longer are removed from
+        the catalogue (including all their files).
+
+        Args:
+            directory: Path to the directory.
+            mtime: The current modification time of the directory.
+            subdirs: A list with paths of the direct sub directories. Each
+                path must end with a separator.
+
+        Returns:
+            None
+        """
+        removed = set(self.get_subdirs(directory)) - set(subdirs)
+        with closing(self._connect()) as connection, connection:
+            for subdir in removed:
+                for table in ("files", "dirs"):
+                    connection.execute(
+                        f"DELETE FROM {table} WHERE substr(path, 1, ?) = ?",
+                        (len(subdir), subdir)
+                    )
+            connection.executemany(
+                "INSERT OR IGNORE INTO dirs (path, parent, mtime) "
+                "VALUES (?, ?, NULL)",
+                ((subdir, directory) for subdir in subdirs)
+            )
+            self._set_dir_mtime(connection, directory, mtime)
+
+    def set_files(self, directory, mtime, files):
+        """Replace all files of a directory
+
+        Args:
+            directory: Path to the directory.
+            mtime: The current modification time of the directory.
+            files: An iterable of
+                :class:`~typhon.files.handlers.common.FileInfo` objects.
+
+        Returns:
+            None
+        """
+        rows = [
+            (file.path, directory, _to_int(file.times[0]),
+             _to_int(file.times[1]), json.dumps(file.attr))
+            for file in files
+        ]
+
+        with closing(self._connect()) as connection, connection:
+            connection.execute("DELETE FROM files WHERE dir = ?", (directory,))
+            connection.executemany(
+                "INSERT OR REPLACE INTO files (path, dir, start, end, attr) "
+                "VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._set_dir_mtime(connection, directory, mtime)
+
+            # The longest file duration bounds the range scan in query(). We
+            # only ever raise it (removed files may leave it too large, which
+            # costs a little but is never wrong):
+            if rows:
+                connection.execute(
+                    "INSERT INTO meta (key, value) VALUES ('max_duration', ?) "
+                    "ON CONFLICT (key) DO UPDATE SET value = MAX("
+                    "CAST(value AS INTEGER), CAST(excluded.value AS INTEGER))",
+                    (max(end - start for _, _, start, end, _ in rows),)
+                )
+
+    def query(self, start, end, fs=None):
+        """Find all files that overlap with a time period
+
+        Args:
+            start: Datetime object.
+            end: Datetime object. Both `start` and `end` are inclusive.
+            fs: The file system that will be set in the returned FileInfo
+                objects.
+
+        Yields:
+            :class:`~typhon.files.handlers.common.FileInfo` objects sorted by
+            their starting and ending times.
+        """
+        start = _to_int(start)
+        end = _to_int(end)
+
+        with closing(self._connect()) as connection:
+            max_duration = int(
+                self._get_meta(connection, "max_duration") or 0)
+
+            # Files that overlap with the period must start before its end
+            # and cannot start earlier than *start - longest duration*. This
+            # makes it a range query on the start index:
+            cursor = connection.execute(
+                "SELECT path, start, end, attr FROM files "
+                "WHERE start BETWEEN ? AND ? AND end >= ? "
+                "ORDER BY start, end",
+                (max(start - max_duration, 0), end, start)
+            )
+
+            for path, file_start, file_end, attr in cursor:
+                yield FileInfo(
+                    path, [_from_int(file_start), _from_int(file_end)],
+                    json.loads(attr), fs=fs,
+                )
+
+
+class FileInfoStore:
+    """Persistent store of file information retrieved by file handlers
+
+    You normally do not need to use this class directly, simply pass a
+    filename to the `info_store` parameter of
+    :class:`~typhon.files.fileset.FileSet`.
+
+    Each entry is stored together with the size and modification time of
+    its file. If the file has changed, the entry is ignored (and replaced by
+    the fileset). The store is a SQLite database in WAL mode, hence many
+    processes (e.g. the workers of :meth:`~typhon.files.fileset.FileSet.map`)
+    can read and update it at the same time.
+
+    Examples:
+
+    .. code-block:: python
+
+        from typhon.files import FileSet
+
+        files = FileSet(
+            "/dir/{satname}/*.h5", handler=MHS_HDF(), info_via="handler",
+            info_store="/dir/infos.sqlite",
+        )
+
+        # The first call opens all files, all further calls (also in other
+        # scripts) only check their sizes and modification times:
+        for file in files.find("2017-01-01", "2017-01-02"):
+            print(file)
+    """
+
+    def __init__(self, filename):
+        """Initialize a FileInfoStore object
+
+        Args:
+            filename: Path to the SQLite database. It will be created if it
+                does not exist yet.
+        """
+        self.filename = filename
+
+        with closing(self._connect()) as connection, connection:
+            # Readers do not block the writer (and vice versa) in WAL mode:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS infos (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER,
+                    mtime TEXT,
+                    start INTEGER,
+                    end INTEGER,
+                    attr TEXT NOT NULL
+                )
+            """)
+
+    def __len__(self):
+        with closing(self._connect()) as connection:
+            return connection.execute(
+                "SELECT COUNT(*) FROM infos").fetchone()[0]
+
+    def __repr__(self):
+        return f"FileInfoStore('{self.filename}')"
+
+    def _connect(self):
+        # See FileCatalogue._connect
+        return sqlite3.connect(self.filename, timeout=60)
+
+    @staticmethod
+    def _stat(file_info):
+        """Get the size and the modification time (as string) of a file"""
+        info = file_info.file_system.info(file_info.path)
+
+        # Not all file systems provide the same fields:
+        mtime = info.get("mtime", info.get("LastModified", None))
+        return info.get("size", None), None if mtime is None else str(mtime)
+
+    def get(self, file_info):
+        """Get the stored information of a file
+
+        Args:
+            file_info: A :class:`~typhon.files.handlers.common.FileInfo`
+                object of the file.
+
+        Returns:
+            A :class:`~typhon.files.handlers.common.FileInfo` object or None
+            if the file is unknown or has changed since it was stored.
+        """
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT size, mtime, start, end, attr FROM infos "
+                "WHERE path = ?", (file_info.path,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        size, mtime, start, end, attr = row
+        try:
+            if (size, mtime) != self._stat(file_info):
+                return None
+        except FileNotFoundError:
+            return None
+
+        return FileInfo(
+            file_info.path, [_from_int_or_none(start), _from_int_or_none(end)],
+            json.loads(attr), fs=file_info.file_system,
+        )
+
+    def set(self, file_info, info=None):
+        """Store the information of a file
+
+        Args:
+            file_info: A :class:`~typhon.files.handlers.common.FileInfo`
+                object of the file.
+            info: A :class:`~typhon.files.handlers.common.FileInfo` object
+                with the times and attributes that should be stored. Default
+                is `file_info`.
+
+        Returns:
+            None
+        """
+        if info is None:
+            info = file_info
+
+        size, mtime = self._stat(file_info)
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO infos "
+                "(path, size, mtime, start, end, attr) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (file_info.path, size, mtime, _to_int_or_none(info.times[0]),
+                 _to_int_or_none(info.times[1]), json.dumps(info.attr))
+            )
+
+    def reset(self):
+        """Remove all entries from the store
+
+        Returns:
+            None
+        """
+        with closing(self._connect()) as connection, connection:
+            connection.execute("DELETE FROM infos")
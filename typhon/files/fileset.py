@@ -12,7 +12,8 @@ import gc
 from itertools import tee
 import json
 import logging
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import (
+    FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait)
 import os.path
 import posixpath
 import re
@@ -23,13 +24,17 @@ import warnings
 
 import numpy as np
 import pandas as pd
+from fsspec.implementations.cached import CachingFileSystem
 from fsspec.implementations.local import LocalFileSystem
 
 import typhon.files
-from typhon.trees import IntervalTree
+from typhon.trees import IntervalTree, overlapping_intervals
 from typhon.utils import unique
 from typhon.utils.timeutils import set_time_resolution, to_datetime, to_timedelta
 
+from .catalogue import FileCatalogue, FileInfoStore
+from .transport import SharedResult
+from .writer import BackgroundWriter
 from .handlers import expects_file_info, FileInfo
 from .handlers import CSV, NetCDF4
 
@@ -126,6 +131,50 @@ class AlignError(Exception):
         Exception.__init__(self, msg)
 
 
+def _unshare(result):
+    """Unwrap the results of FileSet._call_map_function_shared"""
+    if isinstance(result, SharedResult):
+        return result.load()
+    return result
+
+
+class _PendingWrite:
+    """Return value of FileSet._call_map_function that still has to be written
+
+    The parent process writes *data* to *filename* in background and passes
+    *result* on to the caller.
+    """
+    def __init__(self, data, filename, result):
+        self.data = data
+        self.filename = filename
+        self.result = result
+
+    @property
+    def nbytes(self):
+        return _nbytes(self.data)
+
+
+def _discard(futures):
+    """Cancel futures of FileSet._call_map_function_shared and remove the
+    shared files of the results that will not be loaded"""
+    for future in futures:
+        future.cancel()
+    for future in futures:
+        if future.cancelled() or future.exception() is not None:
+            continue
+        if isinstance(future.result(), SharedResult):
+            future.result().discard()
+
+
+def _nbytes(obj):
+    """Estimate the memory size of results of FileSet.imap"""
+    if isinstance(obj, (tuple, list)):
+        return sum(_nbytes(item) for item in obj)
+    if isinstance(obj, _PendingWrite):
+        return obj.nbytes
+    return int(getattr(obj, "nbytes", 0))
+
+
 class FileSet:
     """Provide methods to handle a set of multiple files
 
@@ -274,7 +323,8 @@ class FileSet:
             placeholder=None, max_threads=None, max_processes=None,
             worker_type=None, read_args=None, write_args=None,
             post_reader=None, compress=True, decompress=True, temp_dir=None,
-            fs=None
+            fs=None, catalogue=None, compress_workers=1,
+            listing_workers=None, block_cache=None, info_store=None,
     ):
         """Initialize a FileSet object.
 
@@ -315,7 +365,7 @@ class FileSet:
                 are close) are significantly faster. Specify a name to a file
                 here (which need not exist) if you wish to save the information
                 data to a file. When restarting your script, this cache is
-                used.
+                used. See also `info_store`.
             time_coverage: If this fileset consists of multiple files, this
                 parameter is the relative time coverage (i.e. a timedelta, e.g.
                 "1 hour") of each file. If the ending time of a file cannot be
@@ -365,11 +415,45 @@ class FileSet:
                 value is true.
             decompress: If true and `path` ends with a compression
                 suffix (such as *.zip*, *.gz*, *.b2z*, etc.), files will be
-                decompressed before reading them. Default value is true.
+                decompressed before reading them. If the file handler
+                accepts file-like objects (see
+                :class:`~typhon.files.handlers.common.FileHandler`), it reads
+                directly from a decompressing stream. Otherwise, the file is
+                decompressed to `temp_dir` first. Default value is true.
             fs: Instance of implementation of fsspec.spec.AbstractFileSystem.
                 By passing a remote filesystem implementation this allows for
                 searching for and opening files on remote file systems such as
                 Amazon S3 using s3fs.S3FileSystem.
+            catalogue: Path to a SQLite file (which need not exist) or a
+                :class:`~typhon.files.catalogue.FileCatalogue` object. If
+                given, the paths and time coverages of all files are stored in
+                this catalogue and :meth:`find` (and therefore also
+                :meth:`find_closest` and :meth:`match`) looks them up there
+                instead of searching the file system. The catalogue is built
+                during the first search, use :meth:`update_catalogue` to add
+                new files later. Only directories that have been modified since
+                the last update are searched again.
+            compress_workers: Number of threads used to compress newly
+                written files (see :func:`~typhon.files.utils.compress_as`).
+                Default is 1.
+            listing_workers: Number of threads that list directories in
+                parallel while searching for files. Default is 1 for the
+                local file system and 16 for other file systems (where each
+                listing is a request to a server).
+            block_cache: Only for remote file systems. Path to a directory
+                where the blocks read from remote files are stored, so that
+                reading them again does not need any requests. The handlers
+                read only the needed byte ranges where possible (e.g.
+                :class:`~typhon.files.handlers.common.HDF5`).
+            info_store: Path to a SQLite file (which need not exist) or a
+                :class:`~typhon.files.catalogue.FileInfoStore` object. If
+                given, the information retrieved via the file handler (see
+                `info_via`) is stored there together with the size and
+                modification time of each file. It is reused as long as the
+                file does not change, also by other processes and later
+                scripts. The information is validated once per FileSet
+                object and then kept in its in-memory cache (use
+                :meth:`reset_cache` to validate it again).
 
         You can use regular expressions or placeholders in `path` to
         generalize the files path. Placeholders are going to be captured and
@@ -433,6 +517,10 @@ class FileSet:
         # Filesystem support for searching remotely or in archives
         self.file_system = fs or LocalFileSystem()
         self.has_root = isinstance(self.file_system, LocalFileSystem)
+        if block_cache is not None and not self.has_root:
+            self.file_system = CachingFileSystem(
+                fs=self.file_system, cache_storage=block_cache)
+        self.listing_workers = listing_workers
 
         # The path parameters (will be set and documented in the path setter
         # method):
@@ -445,6 +533,7 @@ class FileSet:
         self._sub_dir = ""
         self._sub_dir_chunks = []
         self._sub_dir_time_resolution = None
+        self.catalogue = None
         self.path = path
 
         # Add user-defined placeholders:
@@ -497,9 +586,18 @@ class FileSet:
         self.post_reader = post_reader
 
         self.compress = compress
+        self.compress_workers = compress_workers
         self.decompress = decompress
         self.temp_dir = temp_dir
 
+        if isinstance(catalogue, str):
+            catalogue = FileCatalogue(catalogue, template=self.path)
+        self.catalogue = catalogue
+
+        if isinstance(info_store, str):
+            info_store = FileInfoStore(info_store)
+        self.info_store = info_store
+
         self._time_coverage = None
         self.time_coverage = time_coverage
 
@@ -524,14 +622,11 @@ class FileSet:
                 atexit.register(FileSet.save_cache,
                                 self, self.info_cache_filename)
 
-        # Writing processes can be moved to background threads. But we do want
-        # to have too many backgrounds threads running at the same time, so we
-        # create FIFO queue. The queue limits the number of parallel threads
-        # to a maximum. The users can also make sure that all writing threads
-        # are finished before they move on in the code.
-        # TODO: We cannot use queues as attributes for FileSet because they
-        # TODO: cannot be pickled.
-        # self._write_queue = Queue(max_threads)
+        # Writing processes can be moved to background threads. The writer
+        # limits the number of parallel threads and the amount of data waiting
+        # to be written. It is created when it is needed for the first time
+        # (see write) and can be pickled together with the fileset.
+        self.writer = None
 
         # Dictionary for holding links to other filesets:
         self._link = {}
@@ -791,8 +886,10 @@ class FileSet:
 
         This parallelizes the reading of the files by using threads. This
         should give a speed up if the file handler's read function internally
-        uses CPython code that releases the GIL. Note that this method is
-        faster than :meth:`icollect` but also more memory consuming.
+        uses CPython code that releases the GIL. For CPU-heavy reading
+        functions written in pure Python, pass `worker_type="process"`. Note
+        that this method is faster than :meth:`icollect` but also more memory
+        consuming.
 
         Use this if you need all files at once but if want to use a for-loop
         consider using :meth:`icollect` instead.
@@ -839,11 +936,11 @@ class FileSet:
         # Actually, this method is nothing else than a customized alias for the
         # map method:
         map_args = {
+            "worker_type": "thread",
             **kwargs,
             "files": files,
             "start": start,
             "end": end,
-            "worker_type": "thread",
             "on_content": True,
             "return_info": True,
         }
@@ -851,12 +948,11 @@ class FileSet:
         if "func" not in map_args:
             map_args["func"] = self._pseudo_passer
 
-        # If we used map with processes, it would need to pickle the data
-        # coming from all workers. This would be very inefficient. Threads
-        # are better because sharing data does not cost much and a file
-        # reading function is typically IO-bound. However, if the reading
-        # function consists mainly of pure python code that does not
-        # release the GIL, this will slow down the performance.
+        # Per default, we use threads because sharing data does not cost
+        # much and a file reading function is typically IO-bound. However, if
+        # the reading function consists mainly of pure python code that does
+        # not release the GIL, processes are faster. Their results are
+        # passed via shared memory (see the parameter shared_memory of map).
         results = self.map(**map_args)
 
         # Tell the python interpreter explicitly to free up memory to improve
@@ -880,11 +976,11 @@ class FileSet:
         """Load all files between two dates sorted by their starting time
 
         Does the same as :meth:`collect` but works as a generator. Instead of
-        loading all files at the same time, it loads them in chunks (the chunk
-        size is defined by `max_workers`). Hence, this method is less memory
-        space consuming but slower than :meth:`collect`. Simple hint: use this
-        in for-loops but if you need all files at once, use :meth:`collect`
-        instead.
+        loading all files at the same time, it loads only a few files ahead
+        (see the parameters `prefetch` and `max_inflight_bytes` of
+        :meth:`imap`). Hence, this method is less memory space consuming but
+        slower than :meth:`collect`. Simple hint: use this in for-loops but if
+        you need all files at once, use :meth:`collect` instead.
 
         Args:
             start: The same as in :meth:`find`.
@@ -898,7 +994,8 @@ class FileSet:
 
         Yields:
             A tuple of the FileInfo object of a file and its content. These
-            tuples are yielded sorted by its file starting time.
+            tuples are yielded sorted by its file starting time (unless you
+            pass `ordered=False`).
 
         Examples:
 
@@ -918,11 +1015,11 @@ class FileSet:
         # Actually, this method is nothing else than a customized alias for the
         # imap method:
         map_args = {
+            "worker_type": "thread",
             **kwargs,
             "files": files,
             "start": start,
             "end": end,
-            "worker_type": "thread",
             "on_content": True,
         }
 
@@ -1022,7 +1119,10 @@ class FileSet:
         if periods is None or not periods:
             self._exclude_times = None
         else:
-            self._exclude_times = IntervalTree(periods)
+            self._exclude_times = np.array([
+                [to_datetime(start), to_datetime(end)]
+                for start, end in periods
+            ], dtype="M8[us]")
 
     def exclude_files(self, filenames):
         self._exclude_files = set(filenames)
@@ -1042,7 +1142,10 @@ class FileSet:
         if self._exclude_times is None:
             return False
 
-        return file.times in self._exclude_times
+        excluded, _ = overlapping_intervals(
+            self._to_time_array([file]), self._exclude_times
+        )
+        return bool(excluded.size)
 
     def find(
             self, start=None, end=None, sort=True, only_path=False,
@@ -1192,14 +1295,33 @@ class FileSet:
             logger.info(f"Loaded filters:\nWhitelist: {white_list}"
                   f"\nBlacklist: {black_list}")
 
-        # Find all files by iterating over all searching paths and check
-        # whether they match the path regex and the time period.
-        file_finder = (
-            file_info
-            for path, _ in self._get_search_dirs(dir_start, end, white_list)
-            for file_info in self._get_matching_files(path, regex, start, end,)
-            if not black_list or self._check_file(black_list, file_info.attr)
-        )
+        if self.catalogue is not None:
+            # We do not have to walk through the file system but can look up
+            # the files in the catalogue:
+            file_finder = (
+                file_info
+                for file_info in self._find_in_catalogue(
+                    start, end, white_list)
+                if not black_list or self._check_file(black_list,
+                                                      file_info.attr)
+            )
+        else:
+            # Find all files by iterating over all searching paths and check
+            # whether they match the path regex and the time period.
+            search_dirs = [
+                path for path, _ in self._get_search_dirs(
+                    dir_start, end, white_list)
+            ]
+            file_finder = (
+                file_info
+                for path, filenames in zip(
+                    search_dirs,
+                    self._map_listing(self._list_files, search_dirs))
+                for file_info in self._get_matching_files(
+                    path, regex, start, end, filenames)
+                if not black_list or self._check_file(black_list,
+                                                      file_info.attr)
+            )
 
         # Even if no files were found, the user does not want to know.
         if not no_files_error:
@@ -1278,21 +1400,55 @@ class FileSet:
             regex = self._fill_placeholders(
                 subdir_chunk, extra_placeholder=white_list, compile=True
             )
+            # All directories of one level are listed in parallel:
             search_dirs = [
                 (new_dir, attr)
-                for search_dir in search_dirs
-                for new_dir, attr in self._get_matching_dirs(search_dir, regex)
+                for matching_dirs in self._map_listing(
+                    lambda search_dir: list(
+                        self._get_matching_dirs(search_dir, regex)),
+                    search_dirs)
+                for new_dir, attr in matching_dirs
                 if self._check_placeholders(attr, start_check, end_check)
             ]
 
         return search_dirs
 
+    def _map_listing(self, func, items):
+        """Apply a listing function to items, in parallel if possible
+
+        Listing directories on remote file systems is mostly waiting for the
+        server, hence we use threads (see the parameter `listing_workers` of
+        :class:`FileSet`).
+
+        Yields:
+            The results of *func* in the order of *items*.
+        """
+        if self.listing_workers is None:
+            workers = 1 if self.has_root else 16
+        else:
+            workers = self.listing_workers
+
+        if workers <= 1 or len(items) <= 1:
+            yield from map(func, items)
+            return
+
+        with ThreadPoolExecutor(min(workers, len(items))) as pool:
+            yield from pool.map(func, items)
+
+    def _list_files(self, path):
+        return self.file_system.glob(posixpath.join(path, "*"))
+
     def _get_matching_dirs(self, dir_with_attrs, regex):
         base_dir, dir_attr = dir_with_attrs
-        for new_dir in self.file_system.glob(posixpath.join(base_dir + "*", "")):
+        # The details contain the type of each entry, so we do not need to
+        # ask the file system for each entry again:
+        entries = self.file_system.glob(
+            posixpath.join(base_dir + "*", ""), detail=True)
+        for new_dir, entry in entries.items():
             # some/all (?) file_system implementations do not end directories
             # in a /, glob.glob does
-            if not (new_dir.endswith(os.sep) or new_dir.endswith("/")) and self.file_system.isdir(new_dir):
+            if not (new_dir.endswith(os.sep) or new_dir.endswith("/")) \
+                    and entry.get("type") == "directory":
                 new_dir += "/"  # always / with AbstractFileSystem, not os.sep
             # The glob function yields full paths, but we want only to check
             # the new pattern that was added:
@@ -1319,7 +1475,7 @@ class FileSet:
 
         return True
 
-    def _get_matching_files(self, path, regex, start, end,):
+    def _get_matching_files(self, path, regex, start, end, filenames=None):
         """Yield files that matches the search conditions.
 
         Args:
@@ -1329,22 +1485,154 @@ class FileSet:
             start: Datetime that defines the start of a time interval.
             end: Datetime that defines the end of a time interval. The time
                 coverage of the file should overlap with this interval.
+            filenames: The content of the directory if it has been listed
+                already.
 
         Yields:
             A FileInfo object with the file path and time coverage
         """
+        if filenames is None:
+            filenames = self._list_files(path)
 
-        for filename in self.file_system.glob(posixpath.join(path, "*")):
-            if regex.match(filename):
-                file_info = self.get_info(
-                        FileInfo(filename, fs=self.file_system))
+        files = [
+            self.get_info(FileInfo(filename, fs=self.file_system))
+            for filename in filenames
+            if regex.match(filename)
+        ]
 
-                # Test whether the file is overlapping the interval between
-                # start and end date.
-                if IntervalTree.interval_overlaps(
-                        file_info.times, (start, end))\
-                        and not self.is_excluded(file_info):
-                    yield file_info
+        if not files:
+            return
+
+        # Test for all files of this directory at once whether they are
+        # overlapping the interval between start and end date and whether
+        # they have been excluded.
+        times = self._to_time_array(files)
+        overlapping, _ = overlapping_intervals(
+            times, np.array([[start, end]], dtype="M8[us]")
+        )
+
+        if self._exclude_times is None:
+            excluded = set()
+        else:
+            excluded, _ = overlapping_intervals(times, self._exclude_times)
+            excluded = set(excluded.tolist())
+
+        for index in overlapping:
+            file_info = files[index]
+            if index not in excluded \
+                    and file_info.path not in self._exclude_files:
+                yield file_info
+
+    def _find_in_catalogue(self, start, end, white_list):
+        """Yield files from the catalogue that match the search conditions.
+
+        Args:
+            start: Datetime that defines the start of a time interval.
+            end: Datetime that defines the end of a time interval. The time
+                coverage of the file should overlap with this interval.
+            white_list: A dictionary that limits placeholders to certain
+                values.
+
+        Yields:
+            A FileInfo object with the file path and time coverage
+        """
+        if self.catalogue.is_empty:
+            self.update_catalogue()
+
+        white_list = {
+            placeholder: re.compile(f"^{value}$")
+            for placeholder, value in white_list.items()
+        }
+
+        for file_info in self.catalogue.query(start, end, self.file_system):
+            if any(
+                    not regex.match(file_info.attr.get(placeholder, ""))
+                    for placeholder, regex in white_list.items()):
+                continue
+
+            if not self.is_excluded(file_info):
+                yield file_info
+
+    def update_catalogue(self):
+        """Update the file catalogue of this fileset
+
+        Only directories which have been modified since the last update are
+        searched for new or removed files. See also the parameter `catalogue`
+        of :class:`FileSet`.
+
+        Returns:
+            None
+        """
+        if self.catalogue is None:
+            raise ValueError(
+                f"The fileset '{self.name}' has no catalogue! Set one via the"
+                f" parameter `catalogue`.")
+
+        if self.single_file:
+            return
+
+        if self._sub_dir:
+            self._update_catalogue_dir(self._base_dir, 0)
+        else:
+            self._update_catalogue_dir(posixpath.join(self._base_dir, ""), 0)
+
+    def _update_catalogue_dir(self, directory, level):
+        mtime = self._get_dir_mtime(directory)
+        changed = mtime is None or mtime != self.catalogue.get_mtime(directory)
+
+        # This is a directory that contains the files:
+        if level == len(self._sub_dir_chunks):
+            if changed:
+                regex = re.compile(self._filled_path)
+                files = [
+                    self.get_info(FileInfo(filename, fs=self.file_system))
+                    for filename in self.file_system.glob(
+                        posixpath.join(directory, "*"))
+                    if regex.match(filename)
+                ]
+                self.catalogue.set_files(directory, mtime, files)
+            return
+
+        if changed:
+            subdir_chunk = self._sub_dir_chunks[level]
+            if not any(True for ch in subdir_chunk
+                       if ch in self._special_chars):
+                subdirs = [
+                    new_dir
+                    for new_dir in [posixpath.join(directory, subdir_chunk, "")]
+                    if self.file_system.isdir(new_dir)
+                ]
+            else:
+                regex = self._fill_placeholders(subdir_chunk, compile=True)
+                subdirs = [
+                    new_dir
+                    for new_dir, _ in self._get_matching_dirs(
+                        (directory, {}), regex)
+                    # Skip files that happen to match the pattern:
+                    if new_dir.endswith("/")
+                ]
+            self.catalogue.set_subdirs(directory, mtime, subdirs)
+        else:
+            subdirs = self.catalogue.get_subdirs(directory)
+
+        for subdir in subdirs:
+            self._update_catalogue_dir(subdir, level + 1)
+
+    def _get_dir_mtime(self, directory):
+        """Get the modification time of a directory as string (or None)"""
+        # The base directory might end with a part of a directory name
+        # (e.g. /dir/prefix_{year}/), then the parent directory is relevant:
+        if not directory.endswith("/"):
+            directory = posixpath.dirname(directory)
+
+        try:
+            info = self.file_system.info(directory)
+        except FileNotFoundError:
+            return None
+
+        # Not all file systems provide the same fields:
+        mtime = info.get("mtime", info.get("LastModified", None))
+        return None if mtime is None else str(mtime)
 
     @staticmethod
     def _check_file(black_list, placeholders):
@@ -1605,8 +1893,15 @@ class FileSet:
         Returns:
             A :meth:`~typhon.files.handlers.common.FileInfo` object.
         """
+        if retrieve_via is None:
+            retrieve_via = self.info_via
+
+        use_store = self.info_store is not None \
+            and retrieve_via in ("handler", "both")
+
         # We want to save time in this routine, therefore we first check
-        # whether we cached this file already.
+        # whether we cached this file already. The information from the info
+        # store has been validated when it was put into the in-memory cache.
 
         if file_info.path in self.info_cache:
             return self.info_cache[file_info.path]
@@ -1617,9 +1912,6 @@ class FileSet:
         if self.single_file:
             info.times = self.time_coverage
 
-        if retrieve_via is None:
-            retrieve_via = self.info_via
-
         # Parsing the filename
         if retrieve_via in ("filename", "both"):
             filled_placeholder = self.parse_filename(info.path)
@@ -1635,12 +1927,15 @@ class FileSet:
 
         # Using the handler for getting more information
         if retrieve_via in ("handler", "both"):
-            with typhon.files.decompress(info.path, tmpdir=self.temp_dir) as \
-                    decompressed_path:
-                decompressed_file = info.copy()
-                decompressed_file.path = decompressed_path
-                handler_info = self.handler.get_info(decompressed_file)
-                info.update(handler_info)
+            handler_info = None
+            if use_store:
+                handler_info = self.info_store.get(info)
+
+            if handler_info is None:
+                handler_info = self._get_handler_info(info)
+                if use_store:
+                    self.info_store.set(info, handler_info)
+            info.update(handler_info)
 
         if info.times[0] is None:
             if info.times[1] is None:
@@ -1668,6 +1963,19 @@ class FileSet:
         self.info_cache[info.path] = info
         return info
 
+    def _get_handler_info(self, info):
+        """Get the information about a file from the file handler"""
+        if self._streams_decompression(info):
+            with typhon.files.open_decompressed(
+                    info.path, fs=info.file_system) as file:
+                return self.handler.get_info(file)
+
+        with typhon.files.decompress(
+                info.path, tmpdir=self.temp_dir) as decompressed_path:
+            decompressed_file = info.copy()
+            decompressed_file.path = decompressed_path
+            return self.handler.get_info(decompressed_file)
+
     def dislink(self, name_or_fileset):
         """Remove the link between this and another fileset
 
@@ -1735,6 +2043,20 @@ class FileSet:
                     f"'{filename}':\n{err}."
                 )
 
+    def flush(self):
+        """Wait until all files written in background have been written
+
+        See :meth:`write` for details.
+
+        Returns:
+            None
+
+        Raises:
+            The first error that occurred while writing in background.
+        """
+        if self.writer is not None:
+            self.writer.join()
+
     def make_dirs(self, filename):
         self.file_system.makedirs(
             posixpath.dirname(filename),
@@ -1745,7 +2067,8 @@ class FileSet:
             self, func, args=None, kwargs=None, files=None, on_content=False,
             pass_info=None, read_args=None, output=None,
             max_workers=None, worker_type=None,
-            return_info=False, error_to_warning=False, **find_kwargs
+            return_info=False, error_to_warning=False, shared_memory=True,
+            write_in_background=False, **find_kwargs
     ):
         """Apply a function on files of this fileset with parallel workers
 
@@ -1784,7 +2107,8 @@ class FileSet:
                 information). Will be ignored if `on_content` is False.
             output: Set this to a path containing placeholders or a FileSet
                 object and the return value of `func` will be copied there if
-                it is not None.
+                it is not None. Each worker writes the files of its results
+                itself.
             max_workers: Max. number of parallel workers to use. When
                 lacking performance, you should change this number.
             worker_type: The type of the workers that will be used to
@@ -1806,6 +2130,22 @@ class FileSet:
                 reading of a file, this method is aborted. However, if you set
                 this to *true*, only a warning is given and None is returned.
                 This parameter will be ignored if `on_content=True`.
+            shared_memory: If true (default) and `worker_type` is *process*,
+                big numpy arrays in the return values (also inside
+                xarray.Dataset objects) are not sent through a pipe but via
+                memory-mapped files (see
+                :class:`~typhon.files.transport.SharedResult`). This avoids
+                copying them several times.
+            write_in_background: Only if `output` is set. If true, the
+                workers do not write the files themselves but send the
+                results to this process. It writes them in a background
+                thread by the :class:`~typhon.files.writer.BackgroundWriter`
+                of the output fileset (see :meth:`write`) while the workers
+                process the next files. The amount of data waiting to be
+                written is limited by the writer. Note that the netCDF
+                library is not thread-safe, do not combine this with
+                `worker_type="thread"` if the workers read netCDF files.
+                Default is false.
             **find_kwargs: Additional keyword arguments that are allowed
                 for :meth:`find` such as `start` or `end`.
 
@@ -1863,21 +2203,37 @@ class FileSet:
                 )
         """
 
-        pool_class, pool_args, worker_args = \
+        if output is not None and write_in_background:
+            # Submit the files successively, so that the results waiting to be
+            # written do not pile up in memory:
+            return list(self.imap(
+                func, args, kwargs, files, on_content, pass_info, read_args,
+                output, max_workers, worker_type,
+                return_info, error_to_warning, shared_memory,
+                write_in_background, **find_kwargs
+            ))
+
+        pool_class, pool_args, worker_args, call, _ = \
             self._configure_pool_and_worker_args(
                 func, args, kwargs, files, on_content, pass_info, read_args,
                 output, max_workers, worker_type,
                 #worker_initializer, worker_initargs,
-                return_info, error_to_warning, **find_kwargs
+                return_info, error_to_warning, shared_memory,
+                write_in_background, **find_kwargs
             )
 
         with pool_class(**pool_args) as pool:
             # Process all found files with the arguments:
-            return list(pool.map(
-                self._call_map_function, worker_args,
-            ))
+            futures = [
+                pool.submit(call, func_args) for func_args in worker_args]
+            try:
+                return [_unshare(future.result()) for future in futures]
+            finally:
+                # Do not leave shared files behind if something failed:
+                _discard(futures)
 
-    def imap(self, *args, **kwargs):
+    def imap(self, *args, ordered=True, prefetch=None,
+             max_inflight_bytes=None, **kwargs):
         """Apply a function on files and return the result immediately
 
         This method does exact the same as :meth:`map` but works as a generator
@@ -1885,6 +2241,21 @@ class FileSet:
 
         Args:
             *args: The same positional arguments as for :meth:`map`.
+            ordered: If true (default), the results are yielded in the same
+                order as the files. Otherwise, they are yielded as soon as
+                they are ready. Then, one slow file does not stall the
+                processing of all following files.
+            prefetch: Number of files that are processed ahead, i.e.
+                submitted to the workers but not yielded yet. Default is
+                `max_workers`.
+            max_inflight_bytes: Limit the memory used by results that were
+                not yielded yet. The size of a result is the `nbytes`
+                attribute of the returned objects (e.g. of xarray.Dataset
+                objects). Files that are still being processed count with the
+                average size of the results so far (until the first result is
+                known, only one file is processed). No new files are
+                submitted while the limit is exceeded (but at least one file
+                is always processed). Default is no limit.
             **kwargs: The same keyword arguments as for :meth:`map`.
 
         Yields:
@@ -1893,41 +2264,104 @@ class FileSet:
             second element is not the return value but a boolean values
             indicating whether the return value was not None.
 
-        """
+        Examples:
 
-        pool_class, pool_args, worker_args = \
-            self._configure_pool_and_worker_args(*args, **kwargs)
+        .. code-block:: python
 
-        worker_queue = deque()
+            # Read 10 files ahead but keep at most 4 GB in memory and process
+            # the files in the order in which they are read:
+            for info, data in fileset.icollect(
+                    "2018-01-01", "2018-02-01", return_info=True,
+                    max_workers=4, prefetch=10, max_inflight_bytes=4e9,
+                    ordered=False):
+                ...
+        """
 
-        with pool_class(**pool_args) as pool:
-            workers = pool_args["max_workers"]
-            if workers is None:
-                workers = 1
+        pool_class, pool_args, worker_args, call, output = \
+            self._configure_pool_and_worker_args(*args, **kwargs)
 
-            for func_args in worker_args:
-                wait = len(worker_queue) >= workers
+        if prefetch is None:
+            prefetch = pool_args["max_workers"]
+            if prefetch is None:
+                prefetch = 1
 
-                if wait:
-                    yield worker_queue.popleft().result()
+        worker_args = iter(worker_args)
+        worker_queue = deque()
 
-                worker_queue.append(
-                    pool.submit(
-                        self._call_map_function,
-                        func_args,
-                    )
-                )
+        # The sizes of the finished but not yet yielded results:
+        sizes = {}
+        # The sum and number of all result sizes seen so far:
+        size_sum, size_count = 0, 0
+
+        def measure(future):
+            nonlocal size_sum, size_count
+            sizes[future] = 0 if future.exception() is not None \
+                else _nbytes(future.result())
+            size_sum += sizes[future]
+            size_count += 1
+
+        def inflight_bytes():
+            for future in worker_queue:
+                if future not in sizes and future.done():
+                    measure(future)
+            if not size_count:
+                # We cannot estimate anything before we know one result
+                return float("inf")
+            average = size_sum / size_count
+            # Including the file that we would submit next:
+            return average + sum(
+                sizes.get(future, average) for future in worker_queue)
+
+        def finish(result):
+            if isinstance(result, _PendingWrite):
+                # Blocks if the writer has too much data waiting already:
+                output.write(result.data, result.filename, in_background=True)
+                return result.result
+            return result
 
-            # Flush the rest:
-            while worker_queue:
-                yield worker_queue.popleft().result()
+        with pool_class(**pool_args) as pool:
+            try:
+                while True:
+                    # Submit new files until the queue is full or the results
+                    # would need too much memory:
+                    while len(worker_queue) < prefetch and (
+                            max_inflight_bytes is None or not worker_queue
+                            or inflight_bytes() <= max_inflight_bytes):
+                        func_args = next(worker_args, None)
+                        if func_args is None:
+                            break
+                        worker_queue.append(pool.submit(call, func_args))
+
+                    if not worker_queue:
+                        return
+
+                    if ordered:
+                        future = worker_queue.popleft()
+                    else:
+                        wait(worker_queue, return_when=FIRST_COMPLETED)
+                        future = next(
+                            future for future in worker_queue if future.done())
+                        worker_queue.remove(future)
+
+                    if max_inflight_bytes is not None and future not in sizes:
+                        measure(future)
+                    sizes.pop(future, None)
+                    yield finish(_unshare(future.result()))
+            finally:
+                # The consumer may have stopped early or an error occurred.
+                # Results that have not been yielded must not leave shared
+                # files behind:
+                _discard(worker_queue)
+                if output is not None:
+                    output.flush()
 
     def _configure_pool_and_worker_args(
             self, func, args=None, kwargs=None, files=None,
             on_content=False, pass_info=None, read_args=None, output=None,
             max_workers=None, worker_type=None,
             #worker_initializer=None, worker_initargs=None,
-            return_info=False, error_to_warning=False, **find_args
+            return_info=False, error_to_warning=False, shared_memory=True,
+            write_in_background=False, **find_args
     ):
         if func is None:
             raise ValueError("The parameter `func` must be given!")
@@ -1953,10 +2387,13 @@ class FileSet:
             else:
                 worker_type = "process"
 
+        call = self._call_map_function
         if worker_type == "process":
             pool_class = ProcessPoolExecutor
             if max_workers is None:
                 max_workers = self.max_processes
+            if shared_memory:
+                call = self._call_map_function_shared
         elif worker_type == "thread":
             pool_class = ThreadPoolExecutor
             if max_workers is None:
@@ -1981,11 +2418,19 @@ class FileSet:
 
         worker_args = (
             (self, file, func, args, kwargs, pass_info, output,
-             on_content, read_args, return_info, error_to_warning)
+             on_content, read_args, return_info, error_to_warning,
+             write_in_background)
             for file in files
         )
 
-        return pool_class, pool_args, worker_args
+        return pool_class, pool_args, worker_args, call, output
+
+    @staticmethod
+    def _call_map_function_shared(all_args):
+        """Call :meth:`_call_map_function` and wrap its return value in a
+        :class:`~typhon.files.transport.SharedResult` for the parent process
+        """
+        return SharedResult.dump(FileSet._call_map_function(all_args))
 
     @staticmethod
     def _call_map_function(all_args):
@@ -1994,16 +2439,20 @@ class FileSet:
 
         Args:
             all_args: A tuple containing following elements:
-                (FileSet object, file_info, function,
-                args, kwargs, output, on_content, read_args, return_info)
+                (FileSet object, file_info, function, args, kwargs,
+                pass_info, output, on_content, read_args, return_info,
+                error_to_warning, write_in_background)
 
         Returns:
             The return value of *function* called with the arguments *args* and
             *kwargs*. This arguments have been extended by file info (and file
-            content).
+            content). If *output* and *write_in_background* are set, a
+            :class:`_PendingWrite` object that the parent process has to
+            write.
         """
         fileset, file_info, func, args, kwargs, pass_info, output, \
-            on_content, read_args, return_info, error_to_warning = all_args
+            on_content, read_args, return_info, error_to_warning, \
+            write_in_background = all_args
 
         args = [] if args is None else list(args)
 
@@ -2065,7 +2514,13 @@ class FileSet:
                 (min(start_times), max(end_times)), fill=file_info[0].attr
             )
 
-        output.write(return_value, new_filename, in_background=False)
+        if write_in_background:
+            # The parent process writes the file in background, so this
+            # worker can process the next file already:
+            return _PendingWrite(
+                return_value, new_filename, _return(file_info, True))
+
+        output.write(return_value, new_filename)
 
         return _return(file_info, True)
 
@@ -2109,30 +2564,34 @@ class FileSet:
             other.find(start, end, filters=other_filters)
         )
 
-        # Convert the times (datetime objects) to seconds (integer)
-        times1 = np.asarray([
-            file.times
-            for file in files1
-        ]).astype("M8[s]").astype(int).tolist()
-        times2 = np.asarray([
-            file.times
-            for file in files2
-        ]).astype("M8[s]").astype(int)
+        times1 = self._to_time_array(files1)
+        times2 = self._to_time_array(files2)
 
         if max_interval is not None:
             # Expand the intervals of the secondary fileset to close-in-time
             # intervals.
-            times2[:, 0] -= int(max_interval.total_seconds())
-            times2[:, 1] += int(max_interval.total_seconds())
+            times2[:, 0] -= np.timedelta64(max_interval)
+            times2[:, 1] += np.timedelta64(max_interval)
 
-        # Search for all overlapping intervals:
-        tree = IntervalTree(times2)
-        results = tree.query(times1)
+        # Search for all overlapping intervals at once. The pairs are sorted
+        # by the index of the primary and then of the secondary file:
+        indices1, indices2 = overlapping_intervals(times1, times2)
+        if not indices1.size:
+            return
 
-        for i, overlapping_files in enumerate(results):
-            matches = [files2[oi] for oi in sorted(overlapping_files)]
-            if matches:
-                yield files1[i], matches
+        boundaries = np.flatnonzero(np.diff(indices1)) + 1
+        for primaries, secondaries in zip(
+                np.split(indices1, boundaries),
+                np.split(indices2, boundaries)):
+            yield files1[primaries[0]], [files2[i] for i in secondaries]
+
+    @staticmethod
+    def _to_time_array(files):
+        """Convert the time coverages of files to a Nx2 numpy.datetime64 array
+        """
+        return np.array(
+            [file.times for file in files], dtype="M8[us]"
+        ).reshape(-1, 2)
 
     def move(
             self, target=None, convert=None, copy=False, **kwargs,
@@ -2483,6 +2942,11 @@ class FileSet:
 
         self._path_extension = os.path.splitext(self.path)[0].lstrip(".")
 
+        # A catalogue only belongs to the path it was created for:
+        if self.catalogue is not None \
+                and self.catalogue.template != self.path:
+            self.catalogue = None
+
     @staticmethod
     def _get_superior_time_resolution(placeholders, ):
         """Get the superior time resolution of all placeholders.
@@ -2699,7 +3163,11 @@ class FileSet:
 
         read_args = {**self.read_args, **read_args}
 
-        if self.decompress:
+        if self.decompress and self._streams_decompression(file_info):
+            with typhon.files.open_decompressed(
+                    file_info.path, fs=file_info.file_system) as file:
+                data = self.handler.read(file, **read_args)
+        elif self.decompress:
             with typhon.files.decompress(file_info.path, tmpdir=self.temp_dir)\
                     as decompressed_path:
                 decompressed_file = file_info.copy()
@@ -2714,6 +3182,16 @@ class FileSet:
 
         return data
 
+    def _streams_decompression(self, file_info):
+        """Can we pass a decompressing file object directly to the handler?
+
+        Only for compressed files and handlers that can read from file-like
+        objects. All others get the path to a temporarily decompressed file.
+        """
+        fmt = os.path.splitext(file_info.path)[1].lstrip(".")
+        return typhon.files.is_compression_format(fmt) \
+            and getattr(self.handler, "accepts_file_objects", False)
+
     def _retrieve_time_coverage(self, filled_placeholder,):
         """Retrieve the time coverage from a dictionary of placeholders.
 
@@ -2920,8 +3398,13 @@ class FileSet:
             data: An object that can be stored by the used file handler class.
             file_info: A string, path-alike object or a
                 :class:`~typhon.files.handlers.common.FileInfo` object.
-            in_background: If true (default), this runs the writing process in
-                a background thread so it does not pause the main process.
+            in_background: If true, this runs the writing process in a
+                background thread so it does not pause the main process. The
+                threads are managed by the
+                :class:`~typhon.files.writer.BackgroundWriter` object in the
+                attribute `writer` of this fileset (a default one is created
+                if it is None). Use :meth:`flush` to wait until all files
+                have been written. Default is false.
             **write_args: Additional key word arguments for the *write* method
                 of the used file handler object.
 
@@ -2964,6 +3447,10 @@ class FileSet:
             # plot is saved...
             do_other_stuff(...)
 
+            # Make sure that the plot has been saved (this raises the error
+            # if saving failed):
+            plots.flush()
+
         """
         if isinstance(file_info, str):
             file_info = FileInfo(file_info)
@@ -2974,14 +3461,15 @@ class FileSet:
             )
 
         if in_background:
-            warnings.warn("in_background option is deprecated!")
+            if self.writer is None:
+                self.writer = BackgroundWriter()
 
-            # Run this function again but as a background thread in a queue:
-            #threading.Thread(
-            #    target=FileSet.write, args=(self, data, file_info),
-            #    kwargs=write_args.update(in_background=False),
-            #).start()
-            #return
+            # Run this function again but in a background thread:
+            self.writer.submit(
+                self.write, data, file_info, in_background=False,
+                **write_args
+            )
+            return
 
         write_args = {**self.write_args, **write_args}
 
@@ -2990,8 +3478,9 @@ class FileSet:
         self.make_dirs(file_info.path)
 
         if self.compress:
-            with typhon.files.compress(file_info.path, tmpdir=self.temp_dir) \
-                    as compressed_path:
+            with typhon.files.compress(
+                    file_info.path, tmpdir=self.temp_dir,
+                    workers=self.compress_workers) as compressed_path:
                 compressed_file = file_info.copy()
                 compressed_file.path = compressed_path
                 self.handler.write(data, compressed_file, **write_args)
@@ -1,4 +1,5 @@
 from collections import defaultdict
+from contextlib import contextmanager
 from copy import copy
 from datetime import datetime
 from functools import wraps
@@ -13,6 +14,7 @@ import pandas as pd
 import xarray as xr
 import numpy as np
 
+from fsspec.implementations.cached import CachingFileSystem
 from fsspec.implementations.local import LocalFileSystem
 
 # The HDF4 file handler needs pyhdf, this might be very tricky to install if
@@ -25,6 +27,14 @@ try:
 except ImportError:
     pass
 
+# Lazy reading needs dask, which is not a hard dependency either:
+dask_is_installed = False
+try:
+    import dask.array as da
+    dask_is_installed = True
+except ImportError:
+    pass
+
 # The HDF5 file handler needs h5py, this might be very tricky to install if
 # you cannot use anaconda. Hence, I do not want it to be a hard dependency:
 h5py_is_installed = False
@@ -34,6 +44,15 @@ try:
 except ImportError:
     pass
 
+# Remote netCDF4 files can be read partially with h5netcdf, which is not a
+# hard dependency either:
+h5netcdf_is_installed = False
+try:
+    import h5netcdf.legacyapi
+    h5netcdf_is_installed = True
+except ImportError:
+    pass
+
 __all__ = [
     'CSV',
     'FileHandler',
@@ -74,7 +93,8 @@ def expects_file_info(method, pos=None, key=None):
 
     This is a decorator function that can take parameters.
 
-    If the argument is already a FileInfo object, nothing happens.
+    If the argument is already a FileInfo object or a file-like object (i.e.
+    it has a *read* method), nothing happens.
 
     Args:
         method: Method object that should be decorated.
@@ -105,16 +125,40 @@ def expects_file_info(method, pos=None, key=None):
     def wrapper(*args, **kwargs):
         args = list(args)
         if args and pos is not None:
-            if not isinstance(args[pos], FileInfo):
+            if not _is_file_info_or_object(args[pos]):
                 args[pos] = FileInfo(args[pos])
         else:
-            if not isinstance(kwargs[key], FileInfo):
+            if not _is_file_info_or_object(kwargs[key]):
                 kwargs[key] = FileInfo(kwargs[key])
 
         return method(*args, **kwargs)
     return wrapper
 
 
+def _is_file_info_or_object(obj):
+    return isinstance(obj, FileInfo) or hasattr(obj, "read")
+
+
+def _unmap_selection(select, mapping):
+    """Translate the dimension names of a selection back to the old names
+
+    Several old names may be mapped to the same new name (e.g. the scan line
+    dimensions of different groups), the selection then applies to all of
+    them.
+    """
+    if not select:
+        return None
+    if not mapping:
+        return dict(select)
+
+    unmapped = {}
+    for dim, index in select.items():
+        old_names = [old for old, new in mapping.items() if new == dim]
+        for name in old_names or [dim]:
+            unmapped[name] = index
+    return unmapped
+
+
 def _xarray_rename_fields(dataset, mapping):
     if mapping is not None:
         # Maybe some variables should be renamed that are not in the
@@ -140,10 +184,21 @@ class FileHandler:
     functions or you can inherit from this class and override its methods. If
     you need a very specialised and reusable file handler class, you should
     consider following the second approach.
+
+    File handlers that set :attr:`accepts_file_objects` to true can read from
+    file-like objects. For compressed files, a
+    :class:`~typhon.files.fileset.FileSet` then passes them a file object
+    that decompresses the data on the fly instead of extracting the whole
+    file to a temporary directory first.
     """
 
+    # Can read() and get_info() handle file-like objects instead of FileInfo
+    # objects? Handlers that need a real path (e.g. netCDF4) cannot.
+    accepts_file_objects = False
+
     def __init__(
-            self, reader=None, info=None, writer=None, **kwargs):
+            self, reader=None, info=None, writer=None,
+            accepts_file_objects=None, **kwargs):
         """Initialize a filer handler object.
 
         Args:
@@ -157,12 +212,18 @@ class FileHandler:
             writer: Reference to a function that defines how to write the data
                 to a file. The function must accept the data object as first
                 and a :class:`FileInfo` object as second parameter.
+            accepts_file_objects: Set this to true if *reader* and *info*
+                can also handle readable binary file-like objects instead of
+                :class:`FileInfo` objects.
         """
 
         self.reader = reader
         self.info = info
         self.writer = writer
 
+        if accepts_file_objects is not None:
+            self.accepts_file_objects = accepts_file_objects
+
         # If you want to ravel / flat the data coming from this file handler
         # (e.g., this is necessary for collocation routines), you need the
         # dimension names that you can stack on top each other.
@@ -415,6 +476,8 @@ class CSV(FileHandler):
     A CSV file is file containing data separated by commas (or by any other
     delimiter).
     """
+    accepts_file_objects = True
+
     def __init__(self, info=None):
         """Initializes a CSV file handler class.
 
@@ -431,6 +494,7 @@ class CSV(FileHandler):
 
         Args:
             file_info: Path and name of the file as string or FileInfo object.
+                Can also be a file-like object.
             fields: Field that you want to extract from the file. If not given,
                 all fields are going to be extracted.
             **kwargs: Additional keyword arguments for the pandas function
@@ -441,8 +505,11 @@ class CSV(FileHandler):
             A xarray.Dataset object.
         """
 
-        with file_info.file_system.open(file_info.path, "rt") as fp:
-            data = pd.read_csv(fp, **kwargs).to_xarray()
+        if hasattr(file_info, "read"):
+            data = pd.read_csv(file_info, **kwargs).to_xarray()
+        else:
+            with file_info.file_system.open(file_info.path, "rt") as fp:
+                data = pd.read_csv(fp, **kwargs).to_xarray()
 
         if fields is None:
             return data
@@ -544,6 +611,86 @@ class HDF4(FileHandler):
         return data
 
 
+@contextmanager
+def _open_hdf5(filename, fs=None):
+    """Open a HDF5 file with h5py, also on remote file systems
+
+    h5py reads only the byte ranges that it needs from the file object. The
+    fetched blocks are cached by fsspec (in memory or on disk if the file
+    system is a :class:`fsspec.implementations.cached.CachingFileSystem`).
+    """
+    if fs is None or isinstance(fs, LocalFileSystem):
+        with h5py.File(filename, "r") as file:
+            yield file
+        return
+
+    kwargs = {}
+    if not isinstance(fs, CachingFileSystem):
+        kwargs["cache_type"] = "blockcache"
+    with fs.open(filename, "rb", **kwargs) as file_object, \
+            h5py.File(file_object, "r") as file:
+        yield file
+
+
+@contextmanager
+def _open_netcdf4(filename, fs=None):
+    """Open a netCDF4 file without scaling its variables
+
+    Files on remote file systems are opened with h5netcdf (if installed),
+    which reads only the byte ranges that it needs like :func:`_open_hdf5`.
+    The netCDF library cannot read from file objects, hence files that
+    h5netcdf cannot open (e.g. netCDF3 files) are fetched completely.
+    """
+    if fs is None or isinstance(fs, LocalFileSystem):
+        memory = None
+    else:
+        kwargs = {}
+        if not isinstance(fs, CachingFileSystem):
+            kwargs["cache_type"] = "blockcache"
+        with fs.open(filename, "rb", **kwargs) as file_object:
+            if h5netcdf_is_installed:
+                try:
+                    file = h5netcdf.legacyapi.Dataset(
+                        file_object, "r", phony_dims="sort")
+                except OSError:
+                    pass
+                else:
+                    with file:
+                        yield file
+                    return
+            file_object.seek(0)
+            memory = file_object.read()
+
+    with netCDF4.Dataset(filename, "r", memory=memory) as file:
+        # xarray decode_cf scales, don't do it twice!
+        file.set_auto_scale(False)
+        yield file
+
+
+def _attributes(obj):
+    """Get the attributes of a netCDF4 or h5netcdf group or variable"""
+    return {name: obj.getncattr(name) for name in obj.ncattrs()}
+
+
+class _HDF5Variable:
+    """Array-like proxy of a field in a HDF5 file
+
+    Opens the file for each access, hence it can be pickled and used by dask
+    after the file has been closed.
+    """
+    def __init__(self, filename, variable, fs=None):
+        self.filename = filename
+        self.fs = fs
+        self.name = variable.name
+        self.shape = variable.shape
+        self.dtype = variable.dtype
+        self.ndim = variable.ndim
+
+    def __getitem__(self, key):
+        with _open_hdf5(self.filename, self.fs) as file:
+            return file[self.name][key]
+
+
 class HDF5(FileHandler):
     """File handler for SEVIRI level 1.5 HDF files
     """
@@ -562,7 +709,8 @@ class HDF5(FileHandler):
         super().__init__(**kwargs)
 
     @expects_file_info()
-    def read(self, file_info, fields=None, mapping=None, **kwargs):
+    def read(self, file_info, fields=None, mapping=None, lazy=False,
+             chunks=None, **kwargs):
         """Read SEVIRI HDF5 files and load them to a xarray.Dataset
 
         Args:
@@ -570,6 +718,11 @@ class HDF5(FileHandler):
                 This can also be a tuple/list of file names or a path with
                 asterisk.
             fields: ...
+            lazy: If true, the fields are not loaded but returned as dask
+                arrays. They are read when they are computed (the file must
+                still exist then). Requires dask.
+            chunks: Only with `lazy`. Chunks for :func:`dask.array.from_array`.
+                By default, the chunks of each field in the file are used.
             **kwargs: Additional keyword arguments that are valid for
                 :class:`typhon.files.handlers.common.NetCDF4`.
 
@@ -577,7 +730,6 @@ class HDF5(FileHandler):
             A xrarray.Dataset object.
         """
 
-        self._ensure_local_filesystem(file_info)
         # Here, the user fields overwrite the standard fields:
         if fields is None:
             raise NotImplementedError(
@@ -585,11 +737,15 @@ class HDF5(FileHandler):
                 "names is not yet implemented!"
             )
 
+        if lazy and not dask_is_installed:
+            raise ImportError("Could not import dask, which is necessary for "
+                              "reading files lazily!")
+
         # keys are dimension size, values are dimension names
         dim_dict = {}
 
         # Load the dataset from the file:
-        with h5py.File(file_info.path, 'r') as file:
+        with _open_hdf5(file_info.path, file_info.file_system) as file:
             dataset = xr.Dataset()
 
             for field in fields:
@@ -605,15 +761,25 @@ class HDF5(FileHandler):
 
                     dims.append(dim_name)
 
+                if lazy:
+                    data = da.from_array(
+                        _HDF5Variable(
+                            file_info.path, file[field], file_info.file_system),
+                        chunks=chunks or file[field].chunks or "auto",
+                    )
+                else:
+                    data = file[field]
+
                 dataset[field] = xr.DataArray(
-                    file[field], dims=dims,
+                    data, dims=dims,
                     # Currently, some attributes may contain byte-strings that
                     # are not nice for further processing
                     attrs={}, #dict(file[field].attrs)
                 )
 
             xr.decode_cf(dataset, **kwargs)
-            dataset.load()
+            if not lazy:
+                dataset.load()
 
         return _xarray_rename_fields(dataset, mapping)
 
@@ -636,7 +802,8 @@ class NetCDF4(FileHandler):
         super().__init__(**kwargs)
 
     @expects_file_info()
-    def read(self, file_info, fields=None, mapping=None, **kwargs):
+    def read(self, file_info, fields=None, mapping=None, select=None,
+             lazy=False, chunks=None, **kwargs):
         """Read and parse NetCDF files and load them to a xarray.Dataset
 
         Args:
@@ -648,6 +815,21 @@ class NetCDF4(FileHandler):
                 new field names.
             mapping: A dictionary which is used for renaming the fields. If
                 given, `fields` must contain the old field names.
+            select: A dictionary with dimension names as keys and integers,
+                slices or integer arrays as values (like for
+                :meth:`xarray.Dataset.isel`). The selection is passed to the
+                netCDF4 library, i.e. only the selected parts of the variables
+                are read from the file. Dimension names can be the old or the
+                new names from `mapping`.
+            lazy: If true, the variables are not loaded but returned as
+                dask arrays. They are read when they are computed (the file
+                must still exist then). Requires dask and a local file.
+                Without `lazy`, files on remote file systems are read
+                partially via h5netcdf if it is installed. Otherwise (or for
+                netCDF3 files), they are fetched completely.
+            chunks: Only with `lazy`. A dictionary with dimension names (old
+                or new) and chunk sizes or *auto*. By default, the chunks of
+                each variable in the file are used.
             **kwargs: Additional keyword arguments for
                 :func:`xarray.decode_cf` such as `mask_and_scale`, etc.
 
@@ -666,26 +848,47 @@ class NetCDF4(FileHandler):
                 # OR if you want to load only some fields:
                 data = fh.read("filename.nc", fields=["temp", "lat", "lon"])
 
+                # OR only the first 100 elements and every second element of
+                # the second dimension:
+                data = fh.read(
+                    "filename.nc",
+                    select={"time": slice(0, 100), "y": slice(None, None, 2)}
+                )
+
+                # OR read nothing until the data is needed:
+                data = fh.read("filename.nc", lazy=True, chunks={"time": 1000})
+                mean = data["temp"].mean().compute()
+
         """
-        self._ensure_local_filesystem(file_info)
         # xr.open_dataset does still not support loading all groups from a
         # file except a very cumbersome (and expensive) way by using the
         # parameter `group`. To avoid this, we load all groups and their
         # variables by using the netCDF4 directly and load them later into a
         # xarray dataset.
 
-        with netCDF4.Dataset(file_info.path, "r") as root:
-            # xarray decode_cf scales, don't do it twice!
-            root.set_auto_scale(False)
-            dataset = xr.Dataset()
-            self._load_group(dataset, None, root, fields)
+        if lazy:
+            self._ensure_local_filesystem(file_info)
+
+        with _open_netcdf4(file_info.path, file_info.file_system) as root:
+            if lazy:
+                dataset = self._open_lazy(
+                    file_info.path, root, fields,
+                    _unmap_selection(select, mapping),
+                    _unmap_selection(chunks, mapping)
+                    if isinstance(chunks, dict) else chunks
+                )
+            else:
+                dataset = xr.Dataset()
+                self._load_group(
+                    dataset, root, fields, _unmap_selection(select, mapping)
+                )
 
             dataset = xr.decode_cf(dataset, **kwargs)
 
         return _xarray_rename_fields(dataset, mapping)
 
     @staticmethod
-    def _get_dimension_name(ds, group, path, dim):
+    def _get_dimension_name(sizes, group, path, dim):
         # If the dimension is defined in the subgroup, use NOT the one of the
         # parent group:
         if dim in group.variables or path == "":
@@ -703,7 +906,7 @@ class NetCDF4(FileHandler):
                 ancestor_dim = "/".join(
                     ancestor_groups[1:len(ancestor_groups) - i] + [dim])
 
-            ancestor_size = ds.dims.get(ancestor_dim, None)
+            ancestor_size = sizes.get(ancestor_dim, None)
 
             if ancestor_size is not None \
                     and group.dimensions[dim].size == ancestor_size:
@@ -714,40 +917,135 @@ class NetCDF4(FileHandler):
         return path + dim
 
     @staticmethod
-    def _load_group(ds, path, group, fields):
+    def _iter_groups(path, group, fields, sizes=None, parent_map=None):
+        """Iterate over a group and all its sub groups
+
+        Yields:
+            The path of the group (with trailing */*), the group, its
+            dimension mapping and the names of its variables that should be
+            loaded.
+        """
+        if sizes is None:
+            # The sizes of the loaded dimensions in the file (may differ from
+            # the ones in the dataset if a selection is given):
+            sizes = {}
+
         if path is None:
             # The current group is the root group
             path = ""
-            ds.attrs = dict(group.__dict__)
         else:
             path += "/"
 
         # Dimension (coordinate) mapping: A dimension might be defined in a
         # group, then it is valid for this group only. Otherwise, the
         # dimension from the parent group is taken (if it suits with name and
-        # size)
+        # size). Variables may also use dimensions that are only defined in
+        # an ancestor group:
         dim_map = {
-            dim: NetCDF4._get_dimension_name(ds, group, path, dim)
-            for dim in group.dimensions
+            **(parent_map or {}),
+            **{
+                dim: NetCDF4._get_dimension_name(sizes, group, path, dim)
+                for dim in group.dimensions
+            }
         }
 
-        # Load variables:
-        try:
-            for var_name, var in group.variables.items():
-                if fields is None or path + var_name in fields:
+        variables = []
+        for var_name, var in group.variables.items():
+            if fields is None or path + var_name in fields:
+                dims = [dim_map[dim] for dim in var.dimensions]
+                sizes.update(zip(dims, var.shape))
+                variables.append(var_name)
+
+        yield path, group, dim_map, variables
+
+        # Do the same for all sub groups:
+        for sub_group_name, sub_group in group.groups.items():
+            yield from NetCDF4._iter_groups(
+                path + sub_group_name, sub_group, fields, sizes, dim_map
+            )
+
+    @staticmethod
+    def _load_group(ds, root, fields, select=None):
+        ds.attrs = _attributes(root)
+
+        for path, group, dim_map, variables in NetCDF4._iter_groups(
+                None, root, fields):
+            # Load variables:
+            try:
+                for var_name in variables:
+                    var = group.variables[var_name]
                     dims = [dim_map[dim] for dim in var.dimensions]
                     if len(dims) == 0 and var[:] is np.ma.masked:
-                        ds[path + var_name] = dims, np.nan, dict(var.__dict__)
+                        ds[path + var_name] = dims, np.nan, _attributes(var)
+                    elif select and set(dims) & select.keys():
+                        # Let the netCDF4 library read only the selected
+                        # hyperslab. Integers drop their dimension:
+                        key = tuple(select.get(dim, slice(None))
+                                    for dim in dims)
+                        dims = [
+                            dim for dim, index in zip(dims, key)
+                            if not isinstance(index, (int, np.integer))
+                        ]
+                        ds[path + var_name] = \
+                            dims, var[key], _attributes(var)
                     else:
-                        ds[path + var_name] = dims, var[:], dict(var.__dict__)
-        except RuntimeError:
-            raise KeyError(f"Could not load the variable {path + var_name}!")
+                        ds[path + var_name] = dims, var[:], _attributes(var)
+            except RuntimeError:
+                raise KeyError(
+                    f"Could not load the variable {path + var_name}!")
 
-        # Do the same for all sub groups:
-        for sub_group_name, sub_group in group.groups.items():
-            NetCDF4._load_group(
-                ds, path + sub_group_name, sub_group, fields
+    @staticmethod
+    def _open_lazy(filename, root, fields, select=None, chunks=None):
+        """Open all groups of a file with dask arrays
+
+        The variables are only read when they are computed. Each group is
+        opened by xarray separately (it keeps the file open and cares about
+        locking).
+        """
+        if not dask_is_installed:
+            raise ImportError("Could not import dask, which is necessary for "
+                              "reading files lazily!")
+
+        dataset = xr.Dataset(attrs=_attributes(root))
+
+        for path, _, dim_map, variables in NetCDF4._iter_groups(
+                None, root, fields):
+            if not variables:
+                continue
+
+            if isinstance(chunks, str):
+                group_chunks = chunks
+            else:
+                # Dimensions without explicit chunks use the ones of the file:
+                group_chunks = {
+                    dim: chunks[name] for dim, name in dim_map.items()
+                    if chunks and name in chunks
+                }
+
+            group = xr.open_dataset(
+                filename, group=path.rstrip("/") or None, engine="netcdf4",
+                chunks=group_chunks, decode_cf=False, mask_and_scale=False,
+                decode_times=False,
             )
+            group = group.drop_vars(
+                [var for var in group.variables if var not in variables]
+            )
+            if path:
+                group = group.rename_vars(
+                    {var: path + var for var in variables})
+            group = group.rename_dims({
+                dim: dim_map[dim] for dim in group.dims
+                if dim_map.get(dim, dim) != dim
+            })
+            dataset.update(group)
+
+        if select:
+            dataset = dataset.isel(
+                {dim: index for dim, index in select.items()
+                 if dim in dataset.dims}
+            )
+
+        return dataset
 
     @expects_file_info(pos=2)
     def write(self, data, filename, **kwargs):
@@ -1,12 +1,13 @@
 from datetime import datetime, timedelta
+import os
 from os.path import dirname, join
 import warnings
 
 import numpy as np
 import pandas as pd
-from scipy.interpolate import interp1d
 import xarray as xr
 
+from typhon.environment import environ
 from .common import expects_file_info, HDF5
 
 
@@ -22,6 +23,14 @@ class SEVIRI(HDF5):
     # Cache the grid of SEVIRI since it is expensive to calculate
     _grid = None
 
+    # If set, the grid is also stored as a file in this directory, so other
+    # processes can map it instead of calculating it again. If None,
+    # $TYPHON_DATA_PATH/seviri is taken if defined (see :meth:`grid`):
+    grid_directory = None
+
+    # Cache the table for converting radiances to brightness temperatures
+    _bt_table = None
+
     channel_names = {
         'channel_1': 'VIS006',
         'channel_2': 'VIS008',
@@ -79,9 +88,14 @@ class SEVIRI(HDF5):
 
         Notes:
             When calling this method for the first time, the latitudes and
-            longitudes are going to be calculated. This may take a while. The
-            results is cached, so multiple calls are faster. The caching may
-            need a lot of space (the grid is HUGE)!
+            longitudes are going to be calculated. This may take a while.
+            The results are kept in memory. If :attr:`grid_directory` or
+            the environment variable *TYPHON_DATA_PATH* is set, they are also
+            stored in a file (about 220 MB) in :attr:`grid_directory` or
+            *$TYPHON_DATA_PATH/seviri*. The file is mapped copy-on-write into
+            memory, so later calls (also from other processes) are faster and
+            share the same memory. A file that does not contain the expected
+            grid is calculated again.
 
         Returns:
             A xarray.Dataset with lat and lon fields
@@ -89,8 +103,80 @@ class SEVIRI(HDF5):
         if SEVIRI._grid is not None:
             return SEVIRI._grid
 
+        directory = SEVIRI.grid_directory or SEVIRI._default_grid_directory()
+        if directory is None:
+            lat_lon = np.stack(SEVIRI._calculate_grid())
+        else:
+            lat_lon = SEVIRI._load_grid(
+                join(directory, "typhon-SEVIRI-grid.npy"))
+
+        ds = xr.Dataset({
+            "lat": (("line", "column"), lat_lon[0]),
+            "lon": (("line", "column"), lat_lon[1]),
+        })
+
+        ds["lat"].attrs = {
+            "long_name": "latitude",
+            "units": "degrees [-90, 180]",
+        }
+        ds["lon"].attrs = {
+            "long_name": "longitude",
+            "units": "degrees [-180, 180]",
+        }
+
+        SEVIRI._grid = ds
+
+        return SEVIRI._grid
+
+    @staticmethod
+    def _default_grid_directory():
+        if "TYPHON_DATA_PATH" in environ:
+            return join(environ["TYPHON_DATA_PATH"], "seviri")
+        return None
+
+    @staticmethod
+    def _load_grid(filename):
+        """Map the grid file or calculate and store it if it is not valid"""
+        try:
+            lat_lon = np.load(filename, mmap_mode="c")
+            SEVIRI._check_grid(lat_lon)
+        except (OSError, ValueError):
+            # Other processes might read the file while we are writing it:
+            os.makedirs(dirname(filename), exist_ok=True)
+            temp_path = f"{filename}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as file:
+                np.save(file, np.stack(SEVIRI._calculate_grid()))
+            os.replace(temp_path, filename)
+            lat_lon = np.load(filename, mmap_mode="c")
+
+        return lat_lon
+
+    @staticmethod
+    def _check_grid(lat_lon):
+        """Raise a ValueError if *lat_lon* is not the grid of SEVIRI"""
+        if lat_lon.shape != (2, 3712, 3712) or lat_lon.dtype != np.float64:
+            raise ValueError(
+                f"Unexpected grid {lat_lon.dtype} {lat_lon.shape}")
+
+        # Compare some pixels (in space and on the earth) with the ones that
+        # we calculate directly:
+        pixels = np.array([0, 500, 1000, 1856, 2700, 3711])
+        if not np.allclose(
+                lat_lon[:, pixels[:, np.newaxis], pixels],
+                SEVIRI._calculate_grid(pixels), equal_nan=True):
+            raise ValueError("Unexpected grid values")
+
+    @staticmethod
+    def _calculate_grid(height_width=None):
+        """Calculate the latitudes and longitudes of the SEVIRI pixels
+
+        Args:
+            height_width: Indices of the lines and columns that should be
+                calculated. Default are all 3712 lines and columns.
+        """
         # The SEVIRI image has a size of 3712x3712 pixels
-        height_width = np.arange(3712)
+        if height_width is None:
+            height_width = np.arange(3712)
 
         # Get the intermediate coordinates
         OFF = 1856
@@ -120,24 +206,7 @@ class SEVIRI(HDF5):
         lon = np.arctan(s2 / s1) * 180 / np.pi
         lat = np.arctan(1.006803 * (s3 / sxy)) * 180 / np.pi
 
-        # We cache the grid
-        ds = xr.Dataset({
-            "lat": (("line", "column"), -lat),
-            "lon": (("line", "column"), -lon),
-        })
-
-        ds["lat"].attrs = {
-            "long_name": "latitude",
-            "units": "degrees [-90, 180]",
-        }
-        ds["lon"].attrs = {
-            "long_name": "longitude",
-            "units": "degrees [-180, 180]",
-        }
-
-        SEVIRI._grid = ds
-
-        return SEVIRI._grid
+        return -lat, -lon
 
     @expects_file_info()
     def read(self, file_info, fields=None, calibration=True, **kwargs):
@@ -184,8 +253,11 @@ class SEVIRI(HDF5):
         if calibration:
             dataset = self.counts_to_bt(dataset)
 
-        # Add the latitudes and longitudes of the grid points:
-        dataset = xr.merge([dataset, self.grid()])
+        # Add the latitudes and longitudes of the grid points (without copying
+        # the shared grid):
+        grid = self.grid()
+        dataset["lat"] = grid["lat"]
+        dataset["lon"] = grid["lon"]
 
         # Add the time variable (is derived from the filename normally):
         if file_info.times[0] is None:
@@ -199,8 +271,11 @@ class SEVIRI(HDF5):
 
         # For collocating and other things, we always need the three dimensions
         # time, lat and lon to be "connected". Hence, add the time dimension to
-        # each data variable as extra dimension.
-        dataset = xr.concat([dataset], dim="time")
+        # each data variable as extra dimension (expand_dims creates views,
+        # xr.concat would copy the whole grid):
+        for name, var in dataset.data_vars.items():
+            if "time" not in var.dims:
+                dataset[name] = var.expand_dims("time")
 
         # We want the final field names to be meaningful
         mapping = {
@@ -211,6 +286,28 @@ class SEVIRI(HDF5):
         dataset = dataset.rename(mapping)
         return dataset
 
+    @staticmethod
+    def bt_table():
+        """Return the table for converting radiances to brightness temperatures
+
+        Returns:
+            A dictionary with the channel numbers (4 to 11) as keys and tuples
+            of radiances (sorted ascending) and brightness temperatures as
+            values.
+        """
+        if SEVIRI._bt_table is None:
+            table = pd.read_csv(
+                join(dirname(__file__), "seviri_radiances_to_bt.csv")
+            )
+            SEVIRI._bt_table = {}
+            for channel in range(4, 12):
+                radiances = table[f"ch{channel}"].values
+                order = np.argsort(radiances)
+                SEVIRI._bt_table[channel] = \
+                    radiances[order], table["BT"].values[order]
+
+        return SEVIRI._bt_table
+
     @staticmethod
     def counts_to_bt(dataset):
         """Convert the counts to brightness temperatures
@@ -229,29 +326,33 @@ class SEVIRI(HDF5):
         # parameters (these are stored in the SEVIRI HDF file).
         # 2) Convert the radiances into brightness temperatures (only
         # applicable to the warm channels).
-        conversion_table = pd.read_csv(
-            join(dirname(__file__), "seviri_radiances_to_bt.csv")
-        )
+        # Since the counts are small unsigned integers, we do both steps only
+        # once for each possible count and look up the results.
+        bt_table = SEVIRI.bt_table()
         for var in dataset.data_vars:
             if not var.startswith("channel_"):
                 continue
 
             channel = int(var.split("_")[1])
             coeffs = dataset["counts_to_rad"][channel-1].item(0)
-            dataset[f"channel_{channel}"] = \
-                coeffs[0]*dataset[f"channel_{channel}"] + coeffs[1]
+            counts = dataset[f"channel_{channel}"].values
+
+            def convert(values):
+                values = coeffs[0] * values + coeffs[1]
+                if channel < 4:
+                    return values
+                return np.interp(
+                    values, *bt_table[channel], left=np.nan, right=np.nan)
+
+            if counts.dtype.kind == "u" and counts.dtype.itemsize <= 2:
+                lookup_table = convert(
+                    np.arange(2 ** (8 * counts.dtype.itemsize)))
+                converted = lookup_table[counts]
+            else:
+                converted = convert(counts)
 
-            if channel < 4:
-                continue
-
-            # Build the converter function
-            converter = interp1d(
-                conversion_table[f"ch{channel}"], conversion_table["BT"],
-                fill_value=np.nan, bounds_error=False
-            )
             dataset[f"channel_{channel}"] = xr.DataArray(
-                converter(dataset[f"channel_{channel}"]),
-                dims=dataset[f"channel_{channel}"].dims
+                converted, dims=dataset[f"channel_{channel}"].dims
             )
 
         # Drop the conversion variable:
@@ -2,12 +2,11 @@ from datetime import datetime, timedelta
 
 import numpy as np
 import numexpr as ne
-from netCDF4 import Dataset
 from scipy.interpolate import CubicSpline
 from typhon.utils import Timer
 import xarray as xr
 
-from .common import NetCDF4, expects_file_info
+from .common import NetCDF4, _open_netcdf4, expects_file_info
 from .testers import check_lat_lon
 
 __all__ = [
@@ -42,7 +41,7 @@ class AAPP_HDF(NetCDF4):
 
     @expects_file_info()
     def get_info(self, file_info, **kwargs):
-        with Dataset(file_info.path, "r") as file:
+        with _open_netcdf4(file_info.path, file_info.file_system) as file:
             file_info.times[0] = \
                 datetime(int(file.startdatayr[0]), 1, 1) \
                 + timedelta(days=int(file.startdatady[0]) - 1) \
@@ -54,6 +53,89 @@ class AAPP_HDF(NetCDF4):
 
             return file_info
 
+    @staticmethod
+    def _scanlines_in_bbox(file_info, bbox):
+        """Get the range of scan lines with pixels in a bounding box
+
+        Only the geolocation fields are read for this.
+
+        Args:
+            file_info: FileInfo object of the file.
+            bbox: A tuple of *(lat_min, lon_min, lat_max, lon_max)* in
+                degrees. If *lon_min* is greater than *lon_max*, the box
+                crosses the date line.
+
+        Returns:
+            A slice object or None if no pixel lies in the box.
+        """
+        lat_min, lon_min, lat_max, lon_max = bbox
+
+        with _open_netcdf4(file_info.path, file_info.file_system) as file:
+            geo = file["Geolocation"]
+            lat = geo["Latitude"][:] * geo["Latitude"].Scale
+            lon = geo["Longitude"][:] * geo["Longitude"].Scale
+
+        inside = (lat >= lat_min) & (lat <= lat_max)
+        if lon_min <= lon_max:
+            inside &= (lon >= lon_min) & (lon <= lon_max)
+        else:
+            inside &= (lon >= lon_min) | (lon <= lon_max)
+
+        scnlines = np.flatnonzero(inside.any(axis=1))
+        if not scnlines.size:
+            return None
+        return slice(scnlines[0], scnlines[-1] + 1)
+
+    def _get_selection(self, file_info, select, bbox):
+        """Combine the scan line selection of the user and the bounding box
+
+        Returns:
+            A dictionary for the `select` parameter of
+            :meth:`~typhon.files.handlers.common.NetCDF4.read` or None if no
+            scan line lies in the bounding box.
+        """
+        select = dict(select or {})
+        if set(select) - {"scnline"}:
+            raise ValueError(
+                "Only scan lines can be selected in AAPP files!"
+            )
+
+        if bbox is not None:
+            if "scnline" in select:
+                raise ValueError(
+                    "Use either a scan line selection or a bounding box!"
+                )
+            scnlines = self._scanlines_in_bbox(file_info, bbox)
+            if scnlines is None:
+                return None
+            select["scnline"] = scnlines
+
+        return select
+
+    @staticmethod
+    def _number_scanlines(dataset, file_info, select):
+        """Number the scan lines from 1 on
+
+        Selected scan lines get the same numbers as in a full read of the
+        file.
+        """
+        index = select.get("scnline")
+        if index is None:
+            numbers = np.arange(1, dataset.scnline.size + 1)
+        elif isinstance(index, slice) and (index.start or 0) >= 0 \
+                and (index.step or 1) > 0:
+            numbers = (index.start or 0) + 1 \
+                + (index.step or 1) * np.arange(dataset.scnline.size)
+        elif not isinstance(index, slice) and np.all(np.asarray(index) >= 0):
+            numbers = np.asarray(index) + 1
+        else:
+            # Negative indices need the number of scan lines in the file:
+            with _open_netcdf4(file_info.path, file_info.file_system) as file:
+                size = file["Data"]["scnlin"].shape[0]
+            numbers = np.arange(1, size + 1)[index]
+
+        return dataset.assign_coords(scnline=("scnline", numbers))
+
     @staticmethod
     def _get_time_field(dataset, user_fields):
         time = \
@@ -127,7 +209,8 @@ class MHS_HDF(AAPP_HDF):
         }
 
     @expects_file_info()
-    def read(self, file_info, mask_and_scale=True, **kwargs):
+    def read(self, file_info, mask_and_scale=True, select=None, bbox=None,
+             **kwargs):
         """Read and parse MHS AAPP HDF5 files and load them to xarray
 
         Args:
@@ -137,12 +220,22 @@ class MHS_HDF(AAPP_HDF):
             mask_and_scale: Where the data contains missing values, it will be
                 masked with NaNs. Furthermore, data with scaling attributes
                 will be scaled with them.
+            select: A dictionary with a slice or index array for *scnline*.
+                Only the selected scan lines are read from the file. They
+                keep their numbers from a full read (which numbers the scan
+                lines from 1 on).
+            bbox: A tuple of *(lat_min, lon_min, lat_max, lon_max)*. Only
+                the range of scan lines with pixels in this box is read.
+                Cannot be combined with `select`.
             **kwargs: Additional keyword arguments that are valid for
                 :class:`~typhon.files.handlers.common.NetCDF4`.
 
         Returns:
-            A xrarray.Dataset object.
+            A xrarray.Dataset object or None if no pixel lies in `bbox`.
         """
+        select = self._get_selection(file_info, select, bbox)
+        if select is None:
+            return None
 
         # Make sure that the standard fields are always gonna be imported:
         user_fields = kwargs.pop("fields", {})
@@ -158,16 +251,11 @@ class MHS_HDF(AAPP_HDF):
 
         # Load the dataset from the file:
         dataset = super().read(
-            file_info, fields=fields, mapping=self.mapping,
+            file_info, fields=fields, mapping=self.mapping, select=select,
             mask_and_scale=mask_and_scale, **kwargs
         )
 
-        scnlines = dataset["scnline"].values
-        dataset = dataset.assign_coords(
-             scnline=dataset["scnline"]
-        )
-
-        dataset["scnline"] = np.arange(1, dataset.scnline.size+1)
+        dataset = self._number_scanlines(dataset, file_info, select)
         dataset["scnpos"] = np.arange(1, 91)
         dataset["channel"] = "channel", np.arange(1, 6)
 
@@ -212,7 +300,7 @@ class AVHRR_GAC_HDF(AAPP_HDF):
 
     @expects_file_info()
     def read(self, file_info, mask_and_scale=True, interpolate_packed_pixels=True,
-             max_nans_interpolation=10, **kwargs):
+             max_nans_interpolation=10, select=None, bbox=None, **kwargs):
         """Read and parse MHS AAPP HDF5 files and load them to xarray
 
         Args:
@@ -226,12 +314,28 @@ class AVHRR_GAC_HDF(AAPP_HDF):
                 interpolated to use them as reference for each pixel.
             max_nans_interpolation: How many NaN values are allowed in latitude
                 and longitudes before raising an error?
+            select: A dictionary with a slice or index array for *scnline*.
+                Only the selected scan lines are read from the file. They
+                keep their numbers from a full read (which numbers the scan
+                lines from 1 on).
+            bbox: A tuple of *(lat_min, lon_min, lat_max, lon_max)*. Only
+                the range of scan lines with pixels in this box is read.
+                Cannot be combined with `select`.
             **kwargs: Additional keyword arguments that are valid for
                 :class:`~typhon.files.handlers.common.NetCDF4`.
 
         Returns:
-            A xrarray.Dataset object.
+            A xrarray.Dataset object or None if no pixel lies in `bbox`.
         """
+        select = self._get_selection(file_info, select, bbox)
+        if select is None:
+            return None
+
+        # Currently, the AAPP converting tool seems to have a bug. Instead of
+        # retrieving 409 pixels per scanline, one gets 2048 pixels. The
+        # additional values are simply duplicates (or rather quintuplicates).
+        # We read only every fifth pixel (starting with the fourth):
+        select["scnpos"] = slice(3, None, 5)
 
         # Make sure that the standard fields are always gonna be imported:
         user_fields = kwargs.pop("fields", {})
@@ -247,26 +351,13 @@ class AVHRR_GAC_HDF(AAPP_HDF):
 
         # Load the dataset from the file:
         dataset = super().read(
-            file_info, fields=fields, mapping=self.mapping,
+            file_info, fields=fields, mapping=self.mapping, select=select,
             mask_and_scale=mask_and_scale, **kwargs
         )
 
-        # Keep the original scnlines
-        scnlines = dataset["scnline"].values
-
-        dataset = dataset.assign_coords(
-            scnline=dataset["scnline"]
-        )
-
-        dataset["scnline"] = np.arange(1, dataset.scnline.size+1)
-        dataset["scnpos"] = np.arange(1, 2049)
-        dataset["channel"] = "channel", np.arange(1, 6)
-
-        # Currently, the AAPP converting tool seems to have a bug. Instead of
-        # retrieving 409 pixels per scanline, one gets 2048 pixels. The
-        # additional values are simply duplicates (or rather quintuplicates):
-        dataset = dataset.sel(scnpos=slice(4, None, 5))
+        dataset = self._number_scanlines(dataset, file_info, select)
         dataset["scnpos"] = np.arange(1, 410)
+        dataset["channel"] = "channel", np.arange(1, 6)
 
         # Create the time variable (is built from several other variables):
         dataset = self._get_time_field(dataset, user_fields)
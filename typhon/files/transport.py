@@ -0,0 +1,176 @@
+"""
+This module contains a transport for big results between processes.
+
+Results of worker processes (e.g. in
+:meth:`~typhon.files.fileset.FileSet.map`) are normally pickled, sent through
+a pipe and unpickled by the parent process. For big numpy arrays (or
+xarray.Dataset objects holding them) this means copying the data several
+times. :class:`SharedResult` writes the big buffers to memory-mapped files
+instead (in */dev/shm* if available, i.e. in RAM) and only sends the small
+rest through the pipe. The parent process maps the files and reconstructs
+the arrays on top of them without copying.
+"""
+
+import logging
+import os
+import pickle
+import tempfile
+import weakref
+
+import numpy as np
+
+__all__ = [
+    "SharedResult",
+]
+
+logger = logging.getLogger(__name__)
+
+
+def _default_directory():
+    # /dev/shm is a RAM-backed file system on Linux:
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+def _remove(filename):
+    try:
+        os.unlink(filename)
+    except OSError as err:
+        # Windows does not allow us to remove mapped files
+        logger.debug(f"Could not remove {filename}: {err}")
+
+
+def _remove_all(filenames):
+    for filename in filenames:
+        _remove(filename)
+
+
+class SharedResult:
+    """Picklable wrapper that moves big buffers to memory-mapped files
+
+    Wrap the result in the worker process with :meth:`dump` and unwrap it in
+    the parent process with :meth:`load`. This works for all objects that
+    support pickle protocol 5 out-of-band buffers, such as numpy arrays and
+    xarray objects with numpy arrays.
+
+    Each result can be loaded only once: the files are removed after
+    mapping them. The data stays available as long as the loaded arrays
+    exist. Results that are not needed anymore should be removed with
+    :meth:`discard`. A result that was received from another process but
+    never loaded removes its files when it is garbage collected (or at the
+    latest when the interpreter exits).
+
+    Examples:
+
+    .. code-block:: python
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        from typhon.files import SharedResult
+
+        def worker(filename):
+            data = read_and_calibrate(filename)
+            return SharedResult.dump(data)
+
+        with ProcessPoolExecutor(4) as pool:
+            for result in pool.map(worker, filenames):
+                data = result.load()
+    """
+
+    def __init__(self, payload, filenames, nbytes):
+        self.payload = payload
+        self.filenames = filenames
+        self.nbytes = nbytes
+        self._finalizer = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_finalizer"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # The receiving process owns the files now. The sending process must
+        # not remove them when its copy is garbage collected.
+        self._finalizer = weakref.finalize(
+            self, _remove_all, list(self.filenames))
+
+    def discard(self):
+        """Remove the files without loading the wrapped object
+
+        Returns:
+            None
+        """
+        if self._finalizer is not None:
+            self._finalizer.detach()
+        _remove_all(self.filenames)
+        self.filenames = []
+
+    @classmethod
+    def dump(cls, obj, directory=None, min_bytes=1024 * 1024):
+        """Wrap an object and move its big buffers to files
+
+        Args:
+            obj: Any picklable object.
+            directory: Directory for the memory-mapped files. Default is
+                */dev/shm* if it exists, otherwise the temporary directory of
+                the system. If the files cannot be written (e.g. because the
+                directory is full), the object is pickled as usual.
+            min_bytes: Buffers smaller than this are pickled as usual.
+
+        Returns:
+            A SharedResult object.
+        """
+        if directory is None:
+            directory = _default_directory()
+
+        filenames = []
+        nbytes = 0
+
+        def store(buffer):
+            nonlocal nbytes
+            data = buffer.raw()
+            if data.nbytes < min_bytes:
+                # Pickle this buffer in-band:
+                return True
+            handle, filename = tempfile.mkstemp(
+                prefix="typhon-", suffix=".buffer", dir=directory)
+            filenames.append(filename)
+            with os.fdopen(handle, "wb") as file:
+                file.write(data)
+            nbytes += data.nbytes
+            return False
+
+        try:
+            payload = pickle.dumps(obj, protocol=5, buffer_callback=store)
+        except OSError as err:
+            # E.g. /dev/shm is full (only 64 MB in Docker containers by
+            # default). Send the buffers through the pipe as usual:
+            _remove_all(filenames)
+            logger.warning(f"Could not share the result via {directory}, "
+                           f"pickling it instead: {err}")
+            payload = pickle.dumps(obj, protocol=5)
+            return cls(payload, [], len(payload))
+        except BaseException:
+            _remove_all(filenames)
+            raise
+
+        return cls(payload, filenames, nbytes + len(payload))
+
+    def load(self):
+        """Reconstruct the wrapped object
+
+        Returns:
+            The original object. Its big numpy arrays are copy-on-write
+            mappings of the shared files, i.e. they are writable but changes
+            are not visible to other processes.
+        """
+        buffers = []
+        try:
+            for filename in self.filenames:
+                buffers.append(np.memmap(filename, mode="c"))
+        finally:
+            self.discard()
+
+        return pickle.loads(self.payload, buffers=buffers)
@@ -1,4 +1,7 @@
 import bz2
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import gzip
 import os
 import shutil
@@ -8,7 +11,7 @@ from contextlib import contextmanager
 
 __all__ = [
     'compress', 'compress_as', 'decompress',
-    'is_compression_format',
+    'is_compression_format', 'open_decompressed',
 ]
 
 _known_compressions = {
@@ -17,16 +20,24 @@ _known_compressions = {
     'zip': zipfile.ZipFile,
 }
 
+# Compressors for single blocks. Their outputs can be concatenated to one
+# valid file (multi-member gzip, multi-stream bzip2 and xz files):
+_block_compressors = {
+    'gz': gzip.compress,
+    'bz2': bz2.compress,
+}
+
 try:
     import lzma
 except ImportError:  # no lzma
     pass
 else:
-    _known_compressions['.xz'] = lzma.LZMAFile
+    _known_compressions['xz'] = lzma.LZMAFile
+    _block_compressors['xz'] = lzma.compress
 
 
 @contextmanager
-def compress(filename, fmt=None, tmpdir=None):
+def compress(filename, fmt=None, tmpdir=None, workers=1):
     """Compress a file after writing to it.
 
     Supported compression formats are: gzip, bzip2, zip, and lzma (Python
@@ -52,6 +63,8 @@ def compress(filename, fmt=None, tmpdir=None):
         tmpdir (str): Path to directory for temporary storage of the
             uncompressed file. The directory must exist. The default is the
             temporary dir of the system.
+        workers (int): Number of threads to compress with (see
+            :func:`compress_as`). Default is 1.
 
     Yields:
         Generator containing the path to the temporary file.
@@ -73,10 +86,10 @@ def compress(filename, fmt=None, tmpdir=None):
     with tempfile.TemporaryDirectory(dir=tmpdir) as tdir:
         tfile = os.path.join(tdir, 'temp')
         yield tfile
-        compress_as(tfile, fmt, filename, keep=True)
+        compress_as(tfile, fmt, filename, keep=True, workers=workers)
 
 
-def compress_as(filename, fmt, target=None, keep=True):
+def compress_as(filename, fmt, target=None, keep=True, workers=1):
     """Compress an existing file.
 
     Supported compression formats are: gzip, bzip2, zip, and lzma (Python
@@ -93,6 +106,12 @@ def compress_as(filename, fmt, target=None, keep=True):
             If you do not like it, you can set another filename here.
         keep: If true, keep the original file after compressing. Otherwise it
             will be deleted. Default is keeping.
+        workers: Number of threads to compress with. If greater than 1, the
+            file is split into blocks which are compressed in parallel and
+            stored as independent gzip members (or bzip2 / xz streams) like
+            *pigz* does. Any gzip, bzip2 or xz reader (such as
+            :func:`decompress`) reads those files. Zip files are always
+            compressed in one thread. Default is 1.
 
     Returns:
         The filename of the newly created file.
@@ -114,7 +133,10 @@ def compress_as(filename, fmt, target=None, keep=True):
     chunksize = 100 * 1024 * 1024
     compfile = get_compressor(fmt)
     try:
-        if fmt == "zip":
+        if workers > 1 and fmt in _block_compressors:
+            _compress_blocks(
+                filename, target, _block_compressors[fmt], workers)
+        elif fmt == "zip":
             with compfile(target, 'w') as f_out:
                 f_out.write(
                     filename, arcname=target_filename,
@@ -139,6 +161,29 @@ def compress_as(filename, fmt, target=None, keep=True):
     return target
 
 
+def _compress_blocks(filename, target, compressor, workers,
+                     block_size=16 * 1024 * 1024):
+    """Compress blocks of a file in parallel and concatenate them
+
+    zlib, bz2 and lzma release the GIL while compressing, hence threads are
+    enough. We keep at most two blocks per worker in memory.
+    """
+    pending = deque()
+    with open(filename, 'rb') as f_in, open(target, 'wb') as f_out, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        for block in iter(partial(f_in.read, block_size), b""):
+            if len(pending) >= 2 * workers:
+                f_out.write(pending.popleft().result())
+            pending.append(pool.submit(compressor, block))
+
+        if not pending and not f_out.tell():
+            # An empty file should still be a valid compressed file
+            pending.append(pool.submit(compressor, b""))
+
+        while pending:
+            f_out.write(pending.popleft().result())
+
+
 @contextmanager
 def decompress(filename, tmpdir=None, target=None):
     """Temporarily decompress file for reading.
@@ -203,6 +248,50 @@ def decompress(filename, tmpdir=None, target=None):
         os.unlink(tmpfile.name)
 
 
+@contextmanager
+def open_decompressed(filename, fs=None):
+    """Open a file for reading and decompress it on the fly.
+
+    Unlike :func:`decompress`, this does not write the decompressed content
+    to a temporary file. Instead, it yields a file-like object that
+    decompresses the data while it is read. If the file is not compressed,
+    the file object of the original file is yielded.
+
+    Supported compression formats are: gzip, bzip2, zip, and lzma.
+
+    Args:
+        filename (str): Input file.
+        fs: An fsspec file system object to open the file with. The default
+            is the local file system.
+
+    Yields:
+        A readable binary file-like object.
+
+    Example:
+        >>> with typhon.files.open_decompressed('datafile.csv.gz') as file:
+        >>>     data = pandas.read_csv(file)
+    """
+
+    filebase, fileext = os.path.splitext(filename)
+    filebase = os.path.basename(filebase)
+    fmt = fileext.lstrip(".")
+
+    opener = open if fs is None else fs.open
+    with opener(filename, 'rb') as raw:
+        if not is_compression_format(fmt):
+            yield raw
+        elif fmt == 'zip':
+            with zipfile.ZipFile(raw, 'r') as archive, \
+                    archive.open(filebase, 'r') as file:
+                yield file
+        elif fmt == 'gz':
+            with gzip.GzipFile(fileobj=raw, mode='rb') as file:
+                yield file
+        else:
+            with get_compressor(fmt)(raw, 'rb') as file:
+                yield file
+
+
 def get_compressor(fmt):
     return _known_compressions[fmt]
 
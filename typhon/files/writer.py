@@ -0,0 +1,175 @@
+"""
+This module contains a bounded writer queue for writing files in background.
+
+Writing big files (e.g. netCDF files with collocations) may take as long as
+creating their content. The :class:`BackgroundWriter` runs the writing in
+background threads, so the main program can continue with its computations.
+It limits the amount of data waiting to be written, so that a slow disk does
+not fill up the memory.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+
+__all__ = [
+    "BackgroundWriter",
+]
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundWriter:
+    """Run writing functions in background threads
+
+    You normally do not need to use this class directly, simply call
+    :meth:`~typhon.files.fileset.FileSet.write` with `in_background=True`.
+    If you want to change the number of threads or the memory limit, set
+    the `writer` attribute of the fileset.
+
+    Errors raised by the writing functions are not lost: the first error is
+    raised again by :meth:`join`, :meth:`close` or the next :meth:`submit`.
+
+    Examples:
+
+    .. code-block:: python
+
+        from typhon.files import BackgroundWriter, FileSet
+
+        output = FileSet("/dir/{year}/{doy}/{hour}{minute}{second}.nc")
+
+        # Keep at most 2 GB of data in the queue:
+        output.writer = BackgroundWriter(
+            max_workers=2, max_pending_bytes=2e9)
+
+        for filename, data in results:
+            output.write(data, filename, in_background=True)
+
+        # Wait until all files are written:
+        output.flush()
+    """
+
+    def __init__(self, max_workers=1, max_pending_bytes=2**30):
+        """Initialize a BackgroundWriter object
+
+        Args:
+            max_workers: Number of threads that write in parallel.
+            max_pending_bytes: Maximum number of bytes waiting to be written.
+                If a new submission would exceed it, :meth:`submit` blocks
+                until enough data has been written. The size of a submission
+                is the `nbytes` attribute of its data (if it has one). A
+                single submission that is bigger than the limit is accepted
+                when nothing else is pending. Default is 1 GiB, set it to
+                None for no limit.
+        """
+        self.max_workers = max_workers
+        self.max_pending_bytes = max_pending_bytes
+        self._start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getstate__(self):
+        # Threads and locks cannot be pickled (e.g. when a FileSet is passed
+        # to another process). The copy starts with an empty queue:
+        return {
+            "max_workers": self.max_workers,
+            "max_pending_bytes": self.max_pending_bytes,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._start()
+
+    def _start(self):
+        self._pool = None
+        self._condition = threading.Condition()
+        self._pending = 0
+        self._pending_bytes = 0
+        self._errors = []
+
+    @property
+    def pending(self):
+        """Number of submissions that have not been finished yet"""
+        return self._pending
+
+    @property
+    def pending_bytes(self):
+        """Number of bytes that have not been written yet"""
+        return self._pending_bytes
+
+    def submit(self, func, data, *args, **kwargs):
+        """Run a writing function in background
+
+        Args:
+            func: A function that writes *data*.
+            data: The first argument for *func*. Its `nbytes` attribute is
+                used to limit the memory usage.
+            *args: Further positional arguments for *func*.
+            **kwargs: Further keyword arguments for *func*.
+
+        Returns:
+            A :class:`concurrent.futures.Future` object.
+        """
+        nbytes = int(getattr(data, "nbytes", 0))
+
+        with self._condition:
+            self._raise_errors()
+            if self.max_pending_bytes is not None:
+                self._condition.wait_for(
+                    lambda: not self._pending
+                    or self._pending_bytes + nbytes <= self.max_pending_bytes
+                )
+            self._pending += 1
+            self._pending_bytes += nbytes
+
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        future = self._pool.submit(func, data, *args, **kwargs)
+        future.add_done_callback(
+            lambda future: self._finished(future, nbytes))
+        return future
+
+    def _finished(self, future, nbytes):
+        with self._condition:
+            self._pending -= 1
+            self._pending_bytes -= nbytes
+            if not future.cancelled() and future.exception() is not None:
+                logger.error(f"Background writing failed: "
+                             f"{future.exception()}")
+                self._errors.append(future.exception())
+            self._condition.notify_all()
+
+    def _raise_errors(self):
+        if self._errors:
+            error = self._errors[0]
+            self._errors.clear()
+            raise error
+
+    def join(self):
+        """Wait until all submitted data is written
+
+        Raises:
+            The first exception that was raised by a writing function since
+            the last call of this method.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: not self._pending)
+            self._raise_errors()
+
+    def close(self):
+        """Wait for all pending writes and stop the threads
+
+        Raises:
+            The same as :meth:`join`.
+        """
+        try:
+            self.join()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
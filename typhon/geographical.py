@@ -2,19 +2,28 @@
 
 """General functions for manipulating geographical data.
 """
+from collections import OrderedDict
+import hashlib
 from numbers import Number
+import os
+import pickle
+import threading
 
 import imageio
 import numpy as np
+from scipy.spatial import cKDTree
 from sklearn.neighbors import BallTree, KDTree
 from typhon.constants import earth_radius
-from typhon.geodesy import geocentric2cart
+from typhon.geodesy import geocentric2cart, great_circle_distance
+from typhon.trees import expand_ranges, jagged_to_pairs
 from typhon.utils import split_units
 
 
 __all__ = [
     'area_weighted_mean',
     'GeoIndex',
+    'GeoIndexCache',
+    'GridIndex',
     'gridded_mean',
     'sea_mask'
 ]
@@ -102,7 +111,7 @@ class GeoIndex:
     """Indexer that allows fast range queries with geographical coordinates"""
 
     def __init__(self, lat, lon, metric=None, tree_class=None,
-                 shuffle=True, **tree_kwargs):
+                 shuffle=True, workers=1, **tree_kwargs):
         """Initialize a GeoIndex
         
         Args:
@@ -116,13 +125,19 @@ class GeoIndex:
                 to compute. Rule of thumb: When searching for radii over
                 1000km, the error is ca. 1.4 kilometers.
             tree_class: Say what tree do you want to use for building the
-                spatial index. Either *Ball* or *KD* is allowed. Default is
-                *Ball*.
+                spatial index. Either *Ball*, *KD* or *cKD* is allowed.
+                *cKD* uses the KD tree from scipy which releases the GIL
+                while querying, i.e. it can be queried from several threads
+                in parallel. It only supports the *minkowski* metric. Default
+                is *Ball*.
             shuffle: The trees have a terrible performance for sorted data
                 as discussed in this issue:
                 https://github.com/scikit-learn/scikit-learn/issues/7687. For
                 sorted, almost-gridded data (such as from SEVIRI) you should
                 set this to *True*. Default is True.
+            workers: Number of threads that are used to query the index. Only
+                applicable if `tree_class` is *cKD*. Use -1 for all available
+                cores. Default is 1.
 
         Examples:
 
@@ -186,6 +201,17 @@ class GeoIndex:
             tree_class = BallTree
         elif tree_class == "KD":
             tree_class = KDTree
+        elif tree_class == "cKD":
+            if self.metric != "minkowski":
+                raise ValueError(
+                    "The cKD tree supports only the minkowski metric!")
+            tree_class = cKDTree
+            if "leaf_size" in tree_kwargs:
+                tree_kwargs["leafsize"] = tree_kwargs.pop("leaf_size")
+        elif isinstance(tree_class, str):
+            raise ValueError(f"Unknown tree class '{tree_class}'!")
+
+        self.workers = workers
 
         # KD- or ball trees have a very poor building performance for sorted
         # data (such as from SEVIRI) as discussed in this issue:
@@ -200,9 +226,12 @@ class GeoIndex:
             # The user does not want to shuffle
             self.shuffler = None
 
-        self.tree = tree_class(
-            points, **{**tree_kwargs, "metric": self.metric}
-        )
+        if tree_class is cKDTree:
+            self.tree = tree_class(points, **tree_kwargs)
+        else:
+            self.tree = tree_class(
+                points, **{**tree_kwargs, "metric": self.metric}
+            )
 
     def __getitem__(self, points):
         """Get nearest indices for given points.
@@ -257,8 +286,40 @@ class GeoIndex:
             built. The second row contains the matches in the query points.
             *distances* is a numpy array with distances in kilometers.
         """
+        return self._query_points(
+            self._to_metric(lat, lon), self._to_metric_radius(r),
+            return_distance
+        )
+
+    def iquery(self, lat, lon, r, return_distance=True, chunk_size=100_000):
+        """Find all neighbours within a radius of query points chunk-wise
+
+        Does the same as :meth:`query` but works as a generator. The query
+        points are processed in chunks, so only the pairs of one chunk are
+        held in memory at the same time. Use this when you expect a huge
+        number of pairs (e.g. when querying a geostationary grid).
+
+        Args:
+            lat: The same as in :meth:`query`.
+            lon: The same as in :meth:`query`.
+            r: The same as in :meth:`query`.
+            return_distance: The same as in :meth:`query`.
+            chunk_size: Number of query points per chunk. Default is 100 000.
+
+        Yields:
+            The same as :meth:`query` returns but for each chunk of query
+            points. The indices in the second row of *pairs* refer to all
+            query points, not only the ones in the chunk.
+        """
         points = self._to_metric(lat, lon)
+        r = self._to_metric_radius(r)
+
+        for offset in range(0, points.shape[0], chunk_size):
+            yield self._query_points(
+                points[offset:offset+chunk_size], r, return_distance, offset
+            )
 
+    def _to_metric_radius(self, r):
         # The user passes the radius in kilometers but we calculate with meters
         # internally
         r = to_kilometers(r)
@@ -266,6 +327,12 @@ class GeoIndex:
             r *= 1000.
         elif self.metric == "haversine":
             r *= 1000. / earth_radius
+        return r
+
+    def _query_points(self, points, r, return_distance, offset=0):
+        if isinstance(self.tree, cKDTree):
+            return self._query_points_ckd(
+                points, r, return_distance, offset)
 
         results = self.tree.query_radius(
             points, r, return_distance=return_distance
@@ -276,36 +343,487 @@ class GeoIndex:
         else:
             jagged_pairs = results
 
-        # Build the list of the collocation pairs:
-        pairs = np.array([
-            [build_point, query_point]
-            for query_point, build_points in enumerate(jagged_pairs)
-            for build_point in build_points
-        ]).T
+        # Build the array of the collocation pairs without looping over them:
+        pairs = jagged_to_pairs(jagged_pairs, offset)
+
+        if self.shuffler is not None and pairs.size:
+            # We shuffled the build points in the beginning, so the current
+            # indices in the first row (the collocation indices from the build
+            # points) are not correct
+            pairs[0] = self.shuffler[pairs[0]]
 
         if not return_distance:
             return pairs
 
-        if not pairs.any():
-            return pairs, pairs
-
-        distances = np.hstack([
-            distances_to_query
-            for distances_to_query in jagged_distances
-        ])
+        distances = np.empty(pairs.shape[1])
+        if distances.size:
+            np.concatenate(jagged_distances, out=distances)
 
         # Return the distances in kilometers
         distances /= 1000.
 
-        if self.shuffler is None:
-            return pairs, distances
+        return pairs, distances
+
+    def _query_points_ckd(self, points, r, return_distance, offset):
+        # scipy's tree releases the GIL and may use several threads on its
+        # own. But it returns only the indices, hence we calculate the
+        # distances of the found pairs afterwards:
+        jagged_pairs = self.tree.query_ball_point(
+            points, r, workers=self.workers, return_sorted=False
+        )
+        pairs = jagged_to_pairs(jagged_pairs, offset)
+
+        if return_distance:
+            distances = np.linalg.norm(
+                self.tree.data[pairs[0]] - points[pairs[1] - offset], axis=1
+            ) / 1000.
+
+        if self.shuffler is not None and pairs.size:
+            pairs[0] = self.shuffler[pairs[0]]
+
+        if not return_distance:
+            return pairs
+
+        return pairs, distances
+
+
+class GridIndex:
+    """Indexer for points on a regular latitude-longitude grid
+
+    Building a tree over millions of grid points is wasteful if the points
+    lie on a regular grid: the candidate grid cells around a query point can
+    be calculated arithmetically from the grid spacing. Only these candidates
+    are checked with :func:`~typhon.geodesy.great_circle_distance`.
+
+    The points may be passed in any order but must cover each cell of the
+    grid exactly once. Grids that are not regular in latitude and longitude
+    (such as the grids of geostationary satellites) are not supported, use
+    :class:`GeoIndex` for them.
+
+    Examples:
+
+    .. code-block:: python
+
+        import numpy as np
+        from typhon.geographical import GridIndex
+
+        lat, lon = np.meshgrid(
+            np.arange(-89.5, 90), np.arange(-179.5, 180), indexing="ij")
+        index = GridIndex(lat.ravel(), lon.ravel())
+
+        pairs, distances = index.query(
+            np.array([10.2, 53.5]), np.array([20.1, 10.]), r="100 km"
+        )
+    """
+
+    def __init__(self, lat, lon):
+        """Initialize a GridIndex
+
+        Args:
+            lat: Latitudes between -90 and 90 degrees as 1-dimensional numpy
+                array.
+            lon: Longitudes between -180 and 180 degrees as 1-dimensional numpy
+                array. Must have the same length as `lat`.
+
+        Raises:
+            ValueError: If the points do not form a regular grid.
+        """
+        lat = np.asarray(lat)
+        lon = np.asarray(lon)
+        if lat.ndim != 1 or lat.shape != lon.shape:
+            raise ValueError("lat and lon must be 1-dimensional arrays with "
+                             "the same length!")
+
+        self.lat = lat
+        self.lon = lon
+
+        self.lat0, self.dlat, rows = self._fit_axis(lat)
+        self.lon0, self.dlon, columns = self._fit_axis(lon)
+        self.shape = rows.max() + 1, columns.max() + 1
+
+        # Each cell must contain exactly one point. Then we can look up the
+        # points by their cells:
+        cells = rows * self.shape[1] + columns
+        if lat.size != self.shape[0] * self.shape[1] \
+                or np.bincount(cells, minlength=lat.size).max() != 1:
+            raise ValueError("The points do not form a regular grid!")
+
+        self.cell_to_point = np.empty(lat.size, dtype=np.int64)
+        self.cell_to_point[cells] = np.arange(lat.size)
+        self.cell_to_point = self.cell_to_point.reshape(self.shape)
+
+    @staticmethod
+    def _fit_axis(values):
+        """Find the origin, the spacing and the indices of grid coordinates"""
+        axis = np.unique(values)
+        if axis.size < 2:
+            raise ValueError("The points do not form a regular grid!")
+
+        spacing = np.diff(axis)
+        step = spacing.mean()
+        if not np.allclose(spacing, step, rtol=1e-3, atol=0):
+            raise ValueError("The points do not form a regular grid!")
+
+        indices = np.rint((values - axis[0]) / step).astype(np.int64)
+        return axis[0], step, indices
+
+    def query(self, lat, lon, r, return_distance=True):
+        """Find all grid points within a radius of query points
+
+        Args:
+            lat: Latitudes between -90 and 90 degrees as 1-dimensional numpy
+                array.
+            lon: Longitudes between -180 and 180 degrees as 1-dimensional numpy
+                array. Must have the same length as `lat`.
+            r: Radius in kilometers (if number is given). You can also use
+                another unit if you pass this as string (e.g. *'10 miles'*).
+            return_distance: If True, the distances will be returned.
+                Default is true.
+
+        Returns:
+            The same as :meth:`GeoIndex.query`. The distances are great
+            circle distances in kilometers.
+        """
+        lat = np.asarray(lat, dtype=float).ravel()
+        lon = np.asarray(lon, dtype=float).ravel()
+        radius = to_kilometers(r)
+        angle = np.rad2deg(radius * 1000 / earth_radius)
+
+        # All points within the radius lie in these rows:
+        first_rows = np.floor(
+            (lat - angle - self.lat0) / self.dlat).astype(np.int64)
+        last_rows = np.ceil(
+            (lat + angle - self.lat0) / self.dlat).astype(np.int64)
+
+        # The longitude difference of the points within the radius is
+        # limited by arcsin(sin(r) / cos(lat)) unless the circle around the
+        # query point encloses a pole. Since this is at most 90 degrees, the
+        # shifted longitude ranges below never overlap:
+        with np.errstate(divide="ignore"):
+            ratio = np.sin(np.deg2rad(min(angle, 90))) \
+                / np.cos(np.deg2rad(lat))
+        full_circle = ratio >= 1
+        width = np.rad2deg(np.arcsin(np.clip(ratio, 0, 1)))
+
+        queries, rows, columns = [], [], []
+        for shift in (-360, 0, 360):
+            if shift == 0:
+                first_columns = np.where(
+                    full_circle, 0,
+                    np.floor((lon - width - self.lon0) / self.dlon)
+                )
+                last_columns = np.where(
+                    full_circle, self.shape[1] - 1,
+                    np.ceil((lon + width - self.lon0) / self.dlon)
+                )
+            else:
+                # The longitude range may wrap around the date line. Full
+                # circles are covered by the unshifted range.
+                first_columns = np.where(
+                    full_circle, 0,
+                    np.floor((lon + shift - width - self.lon0) / self.dlon)
+                )
+                last_columns = np.where(
+                    full_circle, -1,
+                    np.ceil((lon + shift + width - self.lon0) / self.dlon)
+                )
+
+            ranges = self._expand_cells(
+                first_rows, last_rows, first_columns.astype(np.int64),
+                last_columns.astype(np.int64),
+            )
+            for collection, values in zip((queries, rows, columns), ranges):
+                collection.append(values)
+
+        queries = np.concatenate(queries)
+        points = self.cell_to_point[np.concatenate(rows),
+                                    np.concatenate(columns)]
+
+        distances = great_circle_distance(
+            lat[queries], lon[queries], self.lat[points], self.lon[points],
+            r=earth_radius / 1000
+        )
+        passed = distances <= radius
+
+        # Sort the pairs by the query points like GeoIndex does:
+        order = np.argsort(queries[passed], kind="stable")
+        pairs = np.array([points[passed][order], queries[passed][order]])
+
+        if return_distance:
+            return pairs, distances[passed][order]
+        return pairs
+
+    def iquery(self, lat, lon, r, return_distance=True, chunk_size=100_000):
+        """Find all grid points within a radius of query points chunk-wise
+
+        Args:
+            lat: The same as in :meth:`query`.
+            lon: The same as in :meth:`query`.
+            r: The same as in :meth:`query`.
+            return_distance: The same as in :meth:`query`.
+            chunk_size: Number of query points per chunk. Default is 100 000.
+
+        Yields:
+            The same as :meth:`GeoIndex.iquery`.
+        """
+        lat = np.asarray(lat).ravel()
+        lon = np.asarray(lon).ravel()
+        for offset in range(0, lat.size, chunk_size):
+            results = self.query(
+                lat[offset:offset+chunk_size], lon[offset:offset+chunk_size],
+                r, return_distance
+            )
+            pairs = results[0] if return_distance else results
+            pairs[1] += offset
+            yield results
+
+    def _expand_cells(self, first_rows, last_rows, first_columns,
+                      last_columns):
+        """Return the query indices, rows and columns of all candidate cells"""
+        # Ranges outside of the grid become empty:
+        first_rows = np.clip(first_rows, 0, self.shape[0])
+        last_rows = np.clip(last_rows, -1, self.shape[0] - 1)
+        first_columns = np.clip(first_columns, 0, self.shape[1])
+        last_columns = np.clip(last_columns, -1, self.shape[1] - 1)
+
+        nrows = np.maximum(last_rows - first_rows + 1, 0)
+        ncolumns = np.maximum(last_columns - first_columns + 1, 0)
+        ncells = nrows * ncolumns
+
+        # The rectangle of candidate cells of each query point is flattened:
+        queries, cells = expand_ranges(np.zeros_like(ncells), ncells)
+        ncolumns = ncolumns[queries]
+        rows = first_rows[queries] + cells // np.maximum(ncolumns, 1)
+        columns = first_columns[queries] + cells % np.maximum(ncolumns, 1)
+        return queries, rows, columns
+
+
+class GeoIndexCache:
+    """Least-recently-used cache of :class:`GeoIndex` objects
+
+    Building a spatial index is expensive. Data on a fixed grid (e.g. from
+    geostationary satellites such as SEVIRI) repeat the same coordinates in
+    every file, so the index should be built only once per grid. The cache
+    identifies a grid by a cheap fingerprint: a hash of the shape, the data
+    type and some sampled values of the coordinates. It does not compare
+    the full arrays, hence two grids that differ only in the non-sampled
+    values would share one index.
+
+    Optionally, the indices can be stored in a directory, so they can be
+    reused by other processes or later runs. The least recently used files
+    are removed from the directory if it holds more than `max_files`
+    indices. If `detect_grids` is set, points
+    on a regular latitude-longitude grid get a :class:`GridIndex` instead of
+    a :class:`GeoIndex`.
+
+    Examples:
+
+    .. code-block:: python
+
+        from typhon.geographical import GeoIndexCache
+
+        cache = GeoIndexCache(maxsize=2, directory="/path/to/indices")
+
+        # The index is only built at the first call:
+        index = cache.get(lat, lon)
+        index = cache.get(lat, lon)
+        print(cache.statistics)
+    """
+
+    def __init__(self, maxsize=4, directory=None, samples=1000,
+                 detect_grids=False, max_files=16):
+        """Initialize a GeoIndexCache object
+
+        Args:
+            maxsize: Maximum number of indices that are kept in memory.
+                Note that the index of a geostationary grid may require
+                several hundred megabytes. Default is 4.
+            directory: If given, the indices are stored as pickle files in
+                this directory and loaded from there if they are not in
+                memory.
+            samples: Number of sampled values per coordinate that are used
+                for the fingerprint. Default is 1000.
+            detect_grids: If True, a :class:`GridIndex` is built for points
+                that form a regular latitude-longitude grid. Note that it
+                returns great circle distances while :class:`GeoIndex`
+                returns tunnel distances per default. Default is False.
+            max_files: Maximum number of indices that are kept in
+                `directory`. Indices of swaths hardly ever recur, so only the
+                recently used ones are worth keeping. Default is 16.
+        """
+        self.maxsize = maxsize
+        self.directory = directory
+        self.max_files = max_files
+        self.samples = samples
+        self.detect_grids = detect_grids
+        self.statistics = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+        self._indices = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._indices)
+
+    def __getstate__(self):
+        # Locks cannot be pickled:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"GeoIndexCache(maxsize={self.maxsize}, " \
+               f"directory={self.directory!r})"
+
+    def fingerprint(self, lat, lon, **index_kwargs):
+        """Calculate the fingerprint of coordinates
+
+        Args:
+            lat: Latitudes as numpy array.
+            lon: Longitudes as numpy array.
+            **index_kwargs: Additional keyword arguments for :class:`GeoIndex`.
+                They are part of the fingerprint.
+
+        Returns:
+            A string with a hexadecimal hash.
+        """
+        hasher = hashlib.sha1()
+        for array in (lat, lon):
+            array = np.asarray(array)
+            hasher.update(f"{array.shape}{array.dtype}".encode())
+
+            # Strided views do not copy the whole array:
+            flat = array.reshape(-1)
+            step = max(flat.size // self.samples, 1)
+            hasher.update(np.ascontiguousarray(flat[::step]).tobytes())
+            if flat.size:
+                hasher.update(flat[-1:].tobytes())
+
+        hasher.update(repr(sorted(index_kwargs.items())).encode())
+        return hasher.hexdigest()
+
+    def contains(self, lat, lon, **index_kwargs):
+        """Check whether the cache has an index for these coordinates
+
+        Args:
+            lat: Latitudes as numpy array.
+            lon: Longitudes as numpy array.
+            **index_kwargs: Additional keyword arguments for :class:`GeoIndex`.
+
+        Returns:
+            True if the index is in memory or in the cache directory.
+        """
+        key = self.fingerprint(lat, lon, **index_kwargs)
+        return key in self._indices or (
+            self.directory is not None and os.path.exists(self._path(key)))
+
+    def get(self, lat, lon, **index_kwargs):
+        """Get the index for coordinates (and build it if necessary)
+
+        Args:
+            lat: Latitudes as numpy array.
+            lon: Longitudes as numpy array.
+            **index_kwargs: Additional keyword arguments for :class:`GeoIndex`.
+
+        Returns:
+            A :class:`GeoIndex` (or :class:`GridIndex`) object.
+        """
+        key = self.fingerprint(lat, lon, **index_kwargs)
+
+        with self._lock:
+            index = self._indices.get(key)
+            if index is not None:
+                self.statistics["hits"] += 1
+                self._indices.move_to_end(key)
+                return index
+
+        index = self._load(key)
+        if index is not None:
+            self.statistics["disk_hits"] += 1
         else:
-            # We shuffled the build points in the beginning, so the current
-            # indices in the second row (the collocation indices from the build
-            # points) are not correct
-            pairs[0, :] = self.shuffler[pairs[0, :]]
+            self.statistics["misses"] += 1
+            index = self._build(lat, lon, **index_kwargs)
+            self._dump(key, index)
+
+        with self._lock:
+            self._indices[key] = index
+            while len(self._indices) > self.maxsize:
+                self._indices.popitem(last=False)
 
-            return pairs, distances
+        return index
+
+    def clear(self):
+        """Remove all indices from memory (but not from the directory)
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._indices.clear()
+
+    def _build(self, lat, lon, **index_kwargs):
+        if self.detect_grids:
+            try:
+                return GridIndex(lat, lon)
+            except ValueError:
+                # The points are not on a regular grid
+                pass
+
+        return GeoIndex(lat, lon, **index_kwargs)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"GeoIndex-{key}.pickle")
+
+    def _load(self, key):
+        if self.directory is None:
+            return None
+
+        try:
+            with open(self._path(key), "rb") as file:
+                index = pickle.load(file)
+            # The modification time marks the last use (see _prune):
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            # Another process might have removed the file in the meantime
+            return None
+
+        return index
+
+    def _dump(self, key, index):
+        if self.directory is None:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Other processes might read the file while we are writing it:
+        temp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            pickle.dump(index, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self._path(key))
+
+        self._prune()
+
+    def _prune(self):
+        """Remove the least recently used indices from the directory"""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith("GeoIndex-") \
+                    and entry.name.endswith(".pickle"):
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    pass
+
+        files.sort()
+        for _, path in files[:max(len(files) - self.max_files, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Another process was faster
+                pass
 
 
 def gridded_mean(lat, lon, data, grid):
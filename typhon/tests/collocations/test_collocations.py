@@ -1,15 +1,40 @@
+import os
 from os.path import dirname, join
+import pickle
 import sys
 from tempfile import TemporaryDirectory
 
 import numpy as np
 import pytest
 from typhon.collocations import collapse, Collocator, Collocations, expand
-from typhon.files import FileSet, MHS_HDF
+from typhon.files import FileHandler, FileSet, MHS_HDF
 from typhon.files.utils import get_testfiles_directory
 import xarray as xr
 
 
+def _read_pickle(file_info, **kwargs):
+    with open(file_info.path, "rb") as file:
+        return pickle.load(file)
+
+
+def _write_pickle(data, file_info, **kwargs):
+    with open(file_info.path, "wb") as file:
+        pickle.dump(data, file)
+
+
+# The netCDF library is not thread-safe and FileSet.align reads the files in
+# threads. Use a simple file format instead:
+_PICKLE_HANDLER = FileHandler(reader=_read_pickle, writer=_write_pickle)
+
+
+def _fail_once(collocations, attributes, marker):
+    """Post processor that crashes its process at the first call"""
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return collocations
+
+
 class TestCollocations:
     """Testing the collocation functions."""
 
@@ -100,4 +125,151 @@ class TestCollocations:
         collapsed = collapse(collocations)
         expanded = expand(collocations)
 
+    def test_collocate_threads(self):
+        """Searching the time bins in threads must find the same pairs"""
+        size = 2000
+        test1 = xr.Dataset({
+            "time": ("time", np.arange(
+                "2000-01-01", size, dtype="M8[m]").astype("M8[ns]")),
+            "lat": ("time", 30. * np.sin(np.linspace(-3.14, 3.14, size))),
+            "lon": ("time", np.linspace(-90, 90, size)),
+        })
+        test2 = test1.assign(lat=test1.lat + 0.5)
+
+        results = [
+            Collocator(threads=threads).collocate(
+                test1, test2, max_interval="1 hour", max_distance="100 km",
+            )
+            for threads in (None, 4)
+        ]
+
+        # The indices in compact collocations depend on the order of the
+        # found pairs, the times of the expanded collocations do not:
+        pairs = [
+            set(zip(
+                expanded["primary/time"].values,
+                expanded["secondary/time"].values
+            ))
+            for expanded in map(expand, results)
+        ]
+        assert pairs[0]
+        assert pairs[0] == pairs[1]
+
+    @staticmethod
+    def create_filesets(directory):
+        """Create a primary, a secondary and an output fileset"""
+        filesets = []
+        for name, lat_offset in [("primary", 0), ("secondary", 0.1)]:
+            fileset = FileSet(
+                str(directory / name / "{year}{month}{day}_{hour}{minute}"
+                                       "{second}-{end_hour}{end_minute}"
+                                       "{end_second}.pickle"),
+                name=name, handler=_PICKLE_HANDLER,
+            )
+            for hour in range(0, 6):
+                time = np.arange(
+                    f"2018-01-01T{hour:02d}:00", f"2018-01-01T{hour:02d}:59",
+                    dtype="M8[s]"
+                )
+                data = xr.Dataset({
+                    "time": ("time", time.astype("M8[ns]")),
+                    "lat": ("time",
+                            np.linspace(-30, 30, time.size) + lat_offset),
+                    "lon": ("time", np.linspace(-30, 30, time.size)),
+                })
+                fileset.write(data, fileset.get_filename(
+                    [time[0].item(), time[-1].item()]))
+            filesets.append(fileset)
+
+        output = FileSet(
+            str(directory / "output" / "{year}{month}{day}_{hour}{minute}"
+                                       "{second}-{end_hour}{end_minute}"
+                                       "{end_second}.pickle"),
+            handler=_PICKLE_HANDLER,
+        )
+        return filesets, output
+
+    def test_collocate_filesets(self, tmp_path):
+        """The scheduler must find all collocations and retry crashed tasks"""
+        filesets, output = self.create_filesets(tmp_path)
+
+        def collocate(**kwargs):
+            collocator = Collocator()
+            results = list(collocator.collocate_filesets(
+                filesets, start="2018-01-01", end="2018-01-02",
+                max_interval="5 min", max_distance="20 km", output=output,
+                **kwargs
+            ))
+            times = sorted(
+                time
+                for filename in results
+                for time in expand(output.read(filename))[
+                    "primary/time"].values
+            )
+            return times, collocator.statistics
+
+        expected, statistics = collocate(processes=1)
+        assert expected
+        assert statistics["finished"] == statistics["tasks"]
+
+        times, statistics = collocate(
+            processes=3, post_processor=_fail_once,
+            post_processor_kwargs={"marker": str(tmp_path / "marker")},
+        )
+        assert times == expected
+        assert statistics["crashed"] == 1
+        assert statistics["retried"] == 1
+        assert statistics["failed"] == 0
+
+    def test_ledger(self, tmp_path):
+        """Finished matches must be skipped when resuming"""
+        filesets, output = self.create_filesets(tmp_path)
+        ledger = str(tmp_path / "ledger.sqlite")
+
+        def collocate(end="2018-01-02", **kwargs):
+            collocator = Collocator()
+            results = list(collocator.collocate_filesets(
+                filesets, start="2018-01-01", end=end,
+                max_interval="5 min", output=output, ledger=ledger, **kwargs
+            ))
+            return sorted(results), collocator.statistics
+
+        expected, statistics = collocate(max_distance="20 km")
+        assert expected
+        assert statistics["skipped"] == 0
+
+        files, statistics = collocate(max_distance="20 km")
+        assert files == expected
+        assert statistics["skipped"] == statistics["tasks"]
+        assert statistics["finished"] == 0
+
+        # Missing outputs must be created again:
+        os.remove(expected[0])
+        files, statistics = collocate(max_distance="20 km")
+        assert files == expected
+        assert statistics["finished"] == 1
+
+        # A longer period must not redo finished matches:
+        files, statistics = collocate(end="2018-01-05", max_distance="20 km")
+        assert files == expected
+        assert statistics["finished"] == 0
+
+        # Another bundling writes other files, hence these are new tasks:
+        daily, statistics = collocate(max_distance="20 km", bundle="daily")
+        assert statistics["skipped"] == 0
+        assert statistics["finished"] == statistics["tasks"]
+        assert not set(daily) & set(expected)
+        files, statistics = collocate(max_distance="20 km", bundle="daily")
+        assert files == daily
+        assert statistics["finished"] == 0
+
+        # Only the matches whose files are cut by the period depend on it
+        # (the last primary and the primary that matches the last secondary):
+        files, statistics = collocate(
+            end="2018-01-01 05:30:00", max_distance="20 km")
+        assert statistics["finished"] == 2
+        assert statistics["skipped"] == statistics["tasks"] - 2
 
+        # Other parameters are other tasks:
+        files, statistics = collocate(max_distance="10 km")
+        assert statistics["skipped"] == 0
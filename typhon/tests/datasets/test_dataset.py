@@ -0,0 +1,411 @@
+import collections
+import datetime
+import time
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from typhon import utils
+from typhon.datasets import dataset, filters
+
+
+class SyntheticDataset(dataset.Dataset):
+    """Hourly granules with one measurement per minute, stored as npy files
+    """
+    directory = None
+    start_date = datetime.datetime(2010, 1, 1)
+    end_date = datetime.datetime(2010, 1, 2)
+    # Granules are read slower the earlier they start:
+    slow = False
+
+    def create(self, hours):
+        for hour in hours:
+            start = np.datetime64(self.start_date, "ms") \
+                + np.timedelta64(hour, "h")
+            M = np.zeros(60, dtype=[("time", "M8[ms]"), ("lat", "f8"),
+                                    ("lon", "f8"), ("x", "i4")])
+            M["time"] = start + np.arange(60) * np.timedelta64(1, "m")
+            M["lat"] = np.linspace(-60, 60, 60)
+            M["lon"] = hour
+            M["x"] = hour * 60 + np.arange(60)
+            np.save(self._path(hour), M)
+
+    def _path(self, hour):
+        return self.directory / f"{hour:02d}.npy"
+
+    def find_granules(self, start=None, end=None, include_last_before=False,
+                      return_time=False):
+        granules = sorted(self.directory.glob("*.npy"))
+        times = [self.start_date + datetime.timedelta(hours=int(g.stem))
+                 for g in granules]
+        for (i, (g_start, gran)) in enumerate(zip(times, granules)):
+            if not (start <= g_start <= end or include_last_before
+                    and g_start < start and (i + 1 == len(times)
+                                             or times[i + 1] > start)):
+                continue
+            yield (g_start, gran) if return_time else gran
+
+    find_granules_sorted = find_granules
+
+    def find_most_recent_granule_before(self, instant, **locator_args):
+        raise NotImplementedError()
+
+    @staticmethod
+    def as_xarray_dataset(M):
+        x = np.asarray(M["x"])
+        return xr.Dataset({
+            "lat": ("time", np.asarray(M["lat"])),
+            "x": ("time", x),
+            "y": (("channel", "time"), np.stack([x, -x])),
+        }, coords={
+            "time": np.asarray(M["time"]).astype("M8[ns]"),
+            "channel": [1, 2],
+        })
+
+    def _read(self, f, fields="all"):
+        if self.slow:
+            time.sleep(0.01 * (24 - int(f[-6:-4]) % 24))
+        try:
+            M = np.ma.MaskedArray(np.load(f))
+        except ValueError as exc:
+            raise dataset.InvalidFileError(f"Cannot read {f}") from exc
+        if fields != "all":
+            M = M[fields]
+        return (M, {})
+
+
+class NegativeFilter(filters.OrbitFilter):
+    """Mask the odd values of x in-place (like HIRSCalibCountFilter)"""
+    def filter(self, scanlines, **extra):
+        odd = scanlines["x"] % 2 == 1
+        scanlines["x"][odd] *= -1
+        scanlines.mask["x"][odd] = True
+        return scanlines
+
+
+@pytest.fixture
+def synthetic(tmp_path, request):
+    # Datasets are singletons per name:
+    ds = SyntheticDataset(name=request.node.name, directory=tmp_path)
+    ds.slow = False
+    ds.create(range(6))
+    return ds
+
+
+class TestReadPeriod:
+    """Testing the reading of periods."""
+
+    start = datetime.datetime(2010, 1, 1, 0, 30)
+    end = datetime.datetime(2010, 1, 1, 5, 30)
+
+    def test_workers_order(self, synthetic):
+        """Workers must give the granules in the same order"""
+        expected = synthetic.read_period(self.start, self.end, NO_CACHE=True)
+        assert expected.size == 300
+
+        synthetic.slow = True
+        for max_workers in [1, 3, 8]:
+            M = synthetic.read_period(self.start, self.end, NO_CACHE=True,
+                                      max_workers=max_workers)
+            assert np.array_equal(M, expected)
+
+    def test_workers_skip(self, synthetic):
+        """Broken granules must be skipped (or raise) with workers"""
+        synthetic._path(2).write_bytes(b"broken")
+        M = synthetic.read_period(self.start, self.end, NO_CACHE=True,
+                                  max_workers=3)
+        assert M.size == 240
+        assert not np.isin(np.arange(120, 180), M["x"]).any()
+
+        with pytest.raises(dataset.InvalidFileError):
+            synthetic.read_period(self.start, self.end, NO_CACHE=True,
+                                  max_workers=3, onerror="raise")
+
+    def test_workers_exception(self, synthetic):
+        """Exceptions outside of excs must be propagated from workers"""
+        def broken(M, D, H, fn):
+            raise ZeroDivisionError()
+
+        with pytest.raises(ZeroDivisionError):
+            synthetic.read_period(self.start, self.end, NO_CACHE=True,
+                                  max_workers=3,
+                                  pseudo_fields={"broken": broken})
+
+    @pytest.mark.parametrize("max_workers", [None, 3])
+    def test_orbit_filter_cached(self, synthetic, max_workers):
+        """Orbit filters may change granules that are in the read cache"""
+        (cached, _) = synthetic.read(str(synthetic._path(2)))
+        M = synthetic.read_period(self.start, self.end, NO_CACHE=True,
+                                  orbit_filters=[NegativeFilter()],
+                                  max_workers=max_workers,
+                                  worker_type="thread")
+        assert M.size == 300
+        assert M["x"].mask.sum() == 150
+        assert (M["x"].data[M["x"].mask] < 0).all()
+
+        # The cached granule must not have been changed:
+        assert not np.ma.getmaskarray(cached["x"]).any()
+        assert cached["x"].tolist() == list(range(120, 180))
+
+    def test_cache_directory(self, synthetic, tmp_path, monkeypatch):
+        """Other processes must find the results in the cache directory"""
+        cache = dataset.Dataset.read_period.cache
+        monkeypatch.setattr(cache, "directory", str(tmp_path / "cache"))
+        expected = synthetic.read_period(self.start, self.end)
+
+        # Another process has only the directory and its own dataset object:
+        cache.clear()
+        del SyntheticDataset._instances[SyntheticDataset][synthetic.name]
+        other = SyntheticDataset(name=synthetic.name,
+                                 directory=synthetic.directory)
+        assert other is not synthetic
+        disk_hits = cache.statistics["disk_hits"]
+        M = other.read_period(self.start, self.end)
+        assert cache.statistics["disk_hits"] == disk_hits + 1
+        assert np.array_equal(M, expected)
+
+
+class TestIterPeriod:
+    """Testing the reading of periods chunk by chunk."""
+
+    start = datetime.datetime(2010, 1, 1, 0, 30)
+    end = datetime.datetime(2010, 1, 1, 5, 30)
+
+    def test_chunks(self, synthetic):
+        """Chunks must split granules and give the same as read_period"""
+        chunk = datetime.timedelta(minutes=45)
+        chunks = list(synthetic.iter_period(
+            self.start, self.end, chunk=chunk))
+        assert len(chunks) == 7
+        for (i, M) in enumerate(chunks):
+            chunk_start = np.datetime64(self.start + i * chunk)
+            assert (M["time"] >= chunk_start).all()
+            assert (M["time"] < chunk_start + np.timedelta64(chunk)).all()
+
+        expected = synthetic.read_period(self.start, self.end, NO_CACHE=True)
+        M = np.ma.concatenate(chunks)
+        assert np.array_equal(M, expected[expected["time"] < self.end])
+
+    def test_empty_chunks(self, synthetic):
+        """Chunks without data must be skipped"""
+        for hour in (2, 3):
+            synthetic._path(hour).unlink()
+        chunks = list(synthetic.iter_period(
+            self.start, self.end, chunk=datetime.timedelta(minutes=30),
+            max_workers=3))
+        starts = [M["time"].min() for M in chunks]
+        assert [M.size for M in chunks] == [30] * 6
+        assert starts[2:4] == [np.datetime64("2010-01-01T01:30"),
+                               np.datetime64("2010-01-01T04:00")]
+
+        expected = synthetic.read_period(self.start, self.end, NO_CACHE=True)
+        M = np.ma.concatenate(chunks)
+        assert np.array_equal(M, expected[expected["time"] < self.end])
+
+    def test_unsorted(self, synthetic):
+        """Unsorted granules would lose data and must be rejected"""
+        with pytest.raises(ValueError):
+            next(synthetic.iter_period(self.start, self.end, sorted=False))
+
+
+class TestDatasetDeque:
+    """Testing the sliding window through a dataset."""
+
+    window = datetime.timedelta(hours=2)
+    init_time = datetime.datetime(2010, 1, 1, 2)
+
+    @staticmethod
+    def read(ds, start, end):
+        return ds.as_xarray_dataset(ds.read_period(start, end, NO_CACHE=True))
+
+    def test_move(self, synthetic):
+        """Moving must give the same as concatenating the new data"""
+        synthetic.create(range(12))
+        deque = dataset.DatasetDeque(synthetic, self.window, self.init_time)
+        expected = self.read(synthetic, *deque.edges)
+        assert deque.data.identical(expected)
+
+        period = datetime.timedelta(minutes=40)
+        views = [(deque.data, deque.data.copy(deep=True))]
+        for _ in range(10):
+            new = self.read(
+                synthetic, deque.edges[1], deque.edges[1] + period)
+            # This is how DatasetDeque.move worked before:
+            start = min(np.datetime64(deque.edges[0] + period),
+                        expected["time"][0].values + np.timedelta64(period))
+            expected = xr.concat(
+                (expected.sel(time=slice(start, None)), new), dim="time")
+
+            deque.move(period, NO_CACHE=True)
+            assert deque.data.identical(expected)
+            views.append((deque.data, deque.data.copy(deep=True)))
+
+        # Earlier views of the data must not have been overwritten by the
+        # moves, also not by reallocations:
+        for (view, copy) in views:
+            assert view.identical(copy)
+
+    def test_resize(self, synthetic):
+        """Resizing must give the same as reading the new window"""
+        synthetic.create(range(12))
+        deque = dataset.DatasetDeque(synthetic, self.window,
+                                     datetime.datetime(2010, 1, 1, 6))
+        views = [(deque.data, deque.data.copy(deep=True))]
+        for hours in (4, 1, 3, 6, 2):
+            deque.resize(datetime.timedelta(hours=hours))
+            assert deque.data.identical(self.read(synthetic, *deque.edges))
+            views.append((deque.data, deque.data.copy(deep=True)))
+
+        for (view, copy) in views:
+            assert view.identical(copy)
+
+        # Moving still works after resizing:
+        deque.move(datetime.timedelta(hours=1))
+        assert deque.data.identical(self.read(synthetic, *deque.edges))
+
+
+class TestCombine:
+    """Testing the joining of measurements of two datasets."""
+
+    @pytest.fixture
+    def other(self, tmp_path, request):
+        directory = tmp_path / "other"
+        directory.mkdir()
+        ds = SyntheticDataset(name=request.node.name + "-other",
+                              directory=directory)
+        ds.slow = False
+        ds.create(range(6))
+        return ds
+
+    @staticmethod
+    def record_periods(monkeypatch, ds):
+        """Record the periods that are read from ds"""
+        periods = []
+        read_period = ds.read_period
+
+        def recorder(start, end, **kwargs):
+            periods.append((start, end))
+            return read_period(start, end, NO_CACHE=True, **kwargs)
+
+        monkeypatch.setattr(ds, "read_period", recorder)
+        return periods
+
+    def test_combine(self, synthetic, other, monkeypatch):
+        """Secondaries must be found in the periods around the primaries"""
+        M = synthetic.read_period(datetime.datetime(2010, 1, 1),
+                                  datetime.datetime(2010, 1, 1, 6),
+                                  NO_CACHE=True)
+        # Two periods with a gap and times off by less than the tolerance:
+        M = M[(M["x"] % 7 == 0) & ((M["x"] < 90) | (M["x"] >= 240))]
+        M["time"] += np.timedelta64(300, "ms")
+        periods = self.record_periods(monkeypatch, other)
+
+        combined = synthetic.combine(M, other)
+        assert combined.size == M.size
+        assert combined["x"].tolist() == M["x"].tolist()
+        assert periods == [
+            (datetime.datetime(2010, 1, 1, 0, 0, 0, 300000)
+             - datetime.timedelta(seconds=1),
+             datetime.datetime(2010, 1, 1, 1, 24, 0, 300000)
+             + datetime.timedelta(seconds=1)),
+            (datetime.datetime(2010, 1, 1, 4, 5, 0, 300000)
+             - datetime.timedelta(seconds=1),
+             datetime.datetime(2010, 1, 1, 5, 57, 0, 300000)
+             + datetime.timedelta(seconds=1)),
+        ]
+
+        # Secondaries out of the tolerance are masked:
+        M["time"][0] += np.timedelta64(1, "s")
+        combined = synthetic.combine(M, other)
+        assert combined["x"].mask.tolist() == [True] + [False] * (M.size-1)
+
+    def test_read_for_combine(self, other, monkeypatch):
+        """Overlapping parts of the secondary must not break the join"""
+        times = np.array(["2010-01-01T00:10", "2010-01-01T00:20",
+                          "2010-01-01T04:30"], dtype="M8[ms]")
+        periods = self.record_periods(monkeypatch, other)
+        data = dataset.Dataset._read_for_combine(
+            other, times[[2, 0, 1]], {}, np.timedelta64(10, "m"),
+            np.timedelta64(5, "m"))
+        assert [(np.datetime64(start), np.datetime64(end))
+                for (start, end) in periods] == [
+            (times[0] - np.timedelta64(10, "m"),
+             times[0] + np.timedelta64(10, "m")),
+            (times[1] - np.timedelta64(10, "m"),
+             times[1] + np.timedelta64(10, "m")),
+            (times[2] - np.timedelta64(10, "m"),
+             times[2] + np.timedelta64(10, "m")),
+        ]
+        # The first two periods overlap:
+        assert data.size == 60
+        assert np.unique(data["x"]).size == 50
+
+        M = np.zeros(3, dtype=data.dtype)
+        M["time"] = times
+        M["lat"] = data["lat"][[10, 30, 50]]
+        M["lon"] = data["lon"][[10, 30, 50]]
+        (ii, near) = dataset.Dataset._join_on_keys(
+            other, M, data, collections.OrderedDict(
+                (f, f) for f in ("time", "lat", "lon")),
+            np.timedelta64(1, "s"))
+        assert near.all()
+        assert data["x"][ii].tolist() == [10, 20, 270]
+
+    def test_join_on_keys(self, synthetic):
+        """The match with the nearest first key must be taken"""
+        dtype = [("time", "M8[ms]"), ("lat", "f8"), ("x", "i4")]
+        other = np.zeros(5, dtype=dtype)
+        other["time"] = np.datetime64("2010-01-01T00:00") \
+            + np.array([0, 500, 800, 900, 3000]).astype("m8[ms]")
+        other["lat"] = [10, 10, 20, 10, 10]
+        other["x"] = np.arange(5)
+
+        mine = np.zeros(4, dtype=dtype)
+        mine["time"] = np.datetime64("2010-01-01T00:00") \
+            + np.array([400, 0, 850, 4500]).astype("m8[ms]")
+        mine["lat"] = [10, 10, 10, 10]
+
+        trans = collections.OrderedDict([("time", "time"), ("lat", "lat")])
+        (ii, near) = synthetic._join_on_keys(
+            mine, other, trans, np.timedelta64(1, "s"))
+        assert near.tolist() == [True, True, True, False]
+        # 800 is nearer to 850 but its latitude does not match:
+        assert ii[near].tolist() == [1, 0, 3]
+
+    def test_key_index_cache(self, synthetic, monkeypatch):
+        """Sorted keys must be cached by the identity of read-only data"""
+        cache = utils.cache.ResultCache(max_bytes=2**20)
+        monkeypatch.setattr(dataset.Dataset, "key_index_cache", cache)
+        M = synthetic.read_period(datetime.datetime(2010, 1, 1),
+                                  datetime.datetime(2010, 1, 1, 5, 59))
+        assert not M.flags.writeable
+        trans = collections.OrderedDict([("time", "time"), ("lat", "lat")])
+
+        (ii, near) = synthetic._join_on_keys(
+            M, M, trans, np.timedelta64(1, "s"))
+        assert near.all()
+        assert ii.tolist() == list(range(M.size))
+        assert len(cache) == 1
+        # Another view of the same data:
+        synthetic._join_on_keys(M[::2], M.view(), trans,
+                                np.timedelta64(1, "s"))
+        assert len(cache) == 1
+        assert cache.statistics["hits"] == 1
+
+        # Writeable data might change in-place, other fields are others:
+        synthetic._join_on_keys(M, M.copy(), trans, np.timedelta64(1, "s"))
+        synthetic._join_on_keys(
+            M, M, collections.OrderedDict([("x", "x")]),
+            np.timedelta64(1, "s"))
+        assert len(cache) == 2
+        assert cache.statistics["hits"] == 1
+
+    def test_find_nearest(self):
+        """The indices of the nearest elements must be found"""
+        x = np.array([0, 10, 20])
+        xx = np.array([-5, 4, 6, 15, 25])
+        assert dataset.Dataset._find_nearest(x, xx).tolist() \
+            == [0, 0, 1, 1, 2]
+        assert dataset.Dataset._find_nearest(x[:1], xx).tolist() \
+            == [0] * 5
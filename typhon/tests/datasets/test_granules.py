@@ -0,0 +1,173 @@
+import datetime
+
+import pytest
+
+from typhon.datasets import dataset
+from typhon.datasets.granules import GranuleIndex, locator_key
+
+
+class HourlyDataset(dataset.MultiFileDataset):
+    """Hourly granules in daily directories (only the file names are used)
+    """
+    subdir = "{year:04d}/{month:02d}/{day:02d}"
+    re = r"(?P<hour>\d{2})(?P<minute>\d{2})\.npy"
+    granule_duration = datetime.timedelta(hours=1)
+    start_date = datetime.datetime(2010, 1, 1)
+    end_date = datetime.datetime(2100, 1, 1)
+
+    def create(self, *times):
+        for time in times:
+            directory = self.basedir / f"{time:%Y/%m/%d}"
+            directory.mkdir(parents=True, exist_ok=True)
+            (directory / f"{time:%H%M}.npy").touch()
+
+    def _read(self, f, fields="all"):
+        raise NotImplementedError()
+
+
+@pytest.fixture
+def index(tmp_path):
+    return GranuleIndex(tmp_path / "granules.sqlite")
+
+
+def _day(day):
+    return datetime.date(2010, 1, day)
+
+
+def _hour(day, hour):
+    return datetime.datetime(2010, 1, day, hour)
+
+
+class TestGranuleIndex:
+    """Testing the persistent index of granules."""
+
+    def test_query(self, index):
+        """Granules overlapping with the period must be found"""
+        index.set_many([
+            ("a", _hour(1, 0), _hour(1, 1)),
+            ("b", _hour(1, 1), _hour(1, 2)),
+            # A long granule starting long before the period:
+            ("c", _hour(1, 0), _hour(2, 0)),
+            ("d", _hour(1, 6), _hour(1, 7)),
+        ])
+        index.set("e", _hour(1, 6), _hour(1, 7), locator="other")
+
+        found = [path.name for (_, _, path)
+                 in index.query(_hour(1, 5), _hour(1, 6))]
+        assert found == ["c", "d"]
+        assert [path.name for (_, _, path) in index.query(
+            _hour(1, 5), _hour(1, 6), "other")] == ["e"]
+        assert index.get("b") == (_hour(1, 1), _hour(1, 2))
+        assert index.get("f") is None
+        assert len(index) == 5
+
+    def test_coverage(self, index):
+        """Adjacent and overlapping date ranges must be merged"""
+        index.add_coverage(_day(1), _day(3))
+        index.add_coverage(_day(4), _day(5))
+        index.add_coverage(_day(10), _day(12))
+        assert index.covers(_day(1), _day(5))
+        assert not index.covers(_day(1), _day(10))
+
+        index.add_coverage(_day(5), _day(11))
+        assert index.covers(_day(1), _day(12))
+
+        # Dates from today on might still get new granules:
+        today = datetime.datetime.utcnow().date()
+        index.add_coverage(today - datetime.timedelta(days=2), today)
+        assert index.covers(today - datetime.timedelta(days=2),
+                            today - datetime.timedelta(days=1))
+        assert not index.covers(today, today)
+
+    def test_reset(self, index):
+        """Resetting must remove granules and split the coverage"""
+        index.set_many([(str(day), _hour(day, 12), _hour(day, 13))
+                        for day in range(1, 6)])
+        index.add_coverage(_day(1), _day(5))
+        index.reset(_day(2), _day(3))
+        assert index.covers(_day(1), _day(1))
+        assert index.covers(_day(4), _day(5))
+        assert not index.covers(_day(1), _day(4))
+        assert [path.name for (_, _, path) in index.query(
+            _hour(1, 0), _hour(6, 0))] == ["1", "4", "5"]
+
+
+class TestFindGranules:
+    """Testing the granule index of MultiFileDataset."""
+
+    @staticmethod
+    def dataset(request, basedir):
+        # Datasets are singletons per name:
+        return HourlyDataset(name=request.node.name, basedir=basedir,
+                             granule_cache_file="granules")
+
+    def test_index(self, tmp_path, request):
+        """Searched periods must be answered from the index"""
+        ds = self.dataset(request, tmp_path)
+        ds.create(_hour(1, 0), _hour(1, 6), _hour(2, 0))
+
+        def find():
+            return list(ds.find_granules(_hour(1, 0), _hour(2, 23)))
+
+        assert len(find()) == 3
+        assert ds._granule_index.covers(_day(1), _day(2), locator_key({}))
+
+        # New granules of the past are only seen after updating the index:
+        ds.create(_hour(1, 12))
+        assert len(find()) == 3
+        assert ds.update_granule_index(_hour(1, 0), _hour(2, 23)) == 4
+        assert len(find()) == 4
+
+    def test_missing_directories(self, tmp_path, request):
+        """Only dates with directories must be marked as indexed"""
+        ds = self.dataset(request, tmp_path)
+        ds.create(_hour(1, 0), _hour(3, 0))
+        assert len(list(ds.find_granules(_hour(1, 0), _hour(3, 23)))) == 2
+        assert ds._granule_index.covers(_day(1), _day(1), locator_key({}))
+        assert ds._granule_index.covers(_day(3), _day(3), locator_key({}))
+        assert not ds._granule_index.covers(_day(1), _day(3),
+                                            locator_key({}))
+
+        # Directories that appear later are searched:
+        ds.create(_hour(2, 0))
+        assert len(list(ds.find_granules(_hour(1, 0), _hour(3, 23)))) == 3
+        assert ds._granule_index.covers(_day(1), _day(3), locator_key({}))
+
+    def test_index_directories(self, tmp_path, request):
+        """The index must give the granules of the searched directories"""
+        ds = self.dataset(request, tmp_path)
+        # This granule reaches into the second day:
+        ds.create(_hour(1, 23).replace(minute=30), _hour(2, 0))
+
+        def find():
+            return list(ds.find_granules(_hour(2, 0), _hour(2, 0)))
+
+        searched = find()
+        assert [g.name for g in searched] == ["0000.npy"]
+        list(ds.find_granules(_hour(1, 0), _hour(2, 23)))
+        assert ds._granule_index.covers(_day(1), _day(2), locator_key({}))
+        assert find() == searched
+
+    def test_today(self, tmp_path, request):
+        """Directories of today must be searched every time"""
+        ds = self.dataset(request, tmp_path)
+        now = datetime.datetime.utcnow()
+        start = datetime.datetime.combine(now.date(), datetime.time())
+        yesterday = start - datetime.timedelta(days=1)
+        ds.create(yesterday, start)
+        assert len(list(ds.find_granules(yesterday, now))) == 2
+
+        ds.create(start + datetime.timedelta(minutes=1))
+        assert len(list(ds.find_granules(yesterday, now))) == 3
+
+    def test_shelve(self, tmp_path, request):
+        """Old granule caches must not be overwritten"""
+        # Older versions stored a shelve under this name:
+        (tmp_path / "granules").write_bytes(b"no SQLite database" * 100)
+        ds = self.dataset(request, tmp_path)
+        assert ds._granule_index.filename == str(tmp_path / "granules.sqlite")
+        assert (tmp_path / "granules").read_bytes().startswith(b"no SQLite")
+
+        ds.create(_hour(1, 0))
+        assert len(list(ds.find_granules(_hour(1, 0), _hour(1, 23)))) == 1
+        assert len(ds._granule_index) == 1
@@ -0,0 +1,72 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from typhon.datasets import tovs
+
+
+@pytest.fixture
+def hirs(tmp_path):
+    return tovs.HIRS4(satname="noaa18", basedir=str(tmp_path))
+
+
+@pytest.fixture
+def granule(hirs, tmp_path):
+    """A small synthetic uncompressed HIRS/4 granule"""
+    n_lines = 10
+    header = np.zeros(1, hirs.header_dtype)
+    header["hrs_h_siteid"] = b"NSS"
+    header["hrs_h_dataname"] = b"NSS.HIRX.NN.D10001.S0000.E0100.B0000001.GC"
+    header["hrs_h_scnlin"] = n_lines
+
+    # Random content but valid times and positions:
+    rng = np.random.default_rng(0)
+    lines = np.frombuffer(rng.integers(
+        0, 256, n_lines * hirs.line_dtype.itemsize, dtype="u1").tobytes(),
+        hirs.line_dtype).copy()
+    lines["hrs_scnlinyr"] = 2010
+    lines["hrs_scnlindy"] = 1
+    lines["hrs_scnlintime"] = np.arange(n_lines) * 6400
+    pos = np.stack([
+        np.linspace(-50, 50, n_lines * hirs.n_perline),
+        np.linspace(-100, 100, n_lines * hirs.n_perline),
+    ], axis=-1)
+    lines["hrs_pos"] = (pos.reshape(n_lines, -1) * 1e4).astype(int)
+
+    path = tmp_path / "NSS.HIRX.NN.D10001.S0000.E0100.B0000001.GC"
+    with open(path, "wb") as file:
+        file.write(header.tobytes())
+        file.write(lines.tobytes())
+    return str(path)
+
+
+class TestHIRS:
+    """Testing the reading routines of HIRS."""
+
+    @pytest.mark.parametrize("apply_calibration", [True, False])
+    def test_read_fields(self, hirs, granule, apply_calibration):
+        """Memory-mapped reads of some fields must equal the full read"""
+        header, scanlines = hirs._read_records(granule)
+        assert isinstance(scanlines, np.memmap)
+
+        if apply_calibration:
+            fields = ["time", "lat", "bt", "radiance", "counts", "temp_iwt",
+                      "sat_za", "hrs_scnlin", "hrs_calcof"]
+        else:
+            fields = ["time", "hrs_scnlin", "hrs_calcof", "hrs_elem"]
+
+        with warnings.catch_warnings():
+            # The random calibration gives invalid brightness temperatures
+            warnings.simplefilter("ignore", RuntimeWarning)
+            full, _ = hirs._read(granule, apply_calibration=apply_calibration)
+            some, _ = hirs._read(granule, fields=fields,
+                                 apply_calibration=apply_calibration)
+
+        assert some.dtype.names == tuple(fields)
+        for field in fields:
+            assert some.dtype[field] == full.dtype[field]
+            assert np.array_equal(
+                np.ma.getdata(some[field]), np.ma.getdata(full[field]),
+                equal_nan=full.dtype[field].base.kind == "f"
+            )
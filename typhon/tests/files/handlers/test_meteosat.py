@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import xarray as xr
+
+from typhon.files.handlers.meteosat import SEVIRI
+
+
+class TestSEVIRI:
+    def test_counts_to_bt(self):
+        """The lookup tables must give the same as converting each count"""
+        calibration = np.zeros(
+            11, dtype=[("Cal_Slope", "f8"), ("Cal_Offset", "f8")])
+        calibration["Cal_Slope"] = np.linspace(0.01, 0.2, 11)
+        calibration["Cal_Offset"] = -51 * calibration["Cal_Slope"]
+
+        counts = np.arange(1024, dtype="u2").reshape(32, 32)
+        dataset = xr.Dataset({
+            f"channel_{channel}": (("line", "column"), counts)
+            for channel in (1, 9)
+        })
+        dataset["counts_to_rad"] = "x", calibration
+
+        converted = SEVIRI.counts_to_bt(dataset.copy())
+        direct = SEVIRI.counts_to_bt(dataset.assign(
+            channel_1=dataset["channel_1"].astype(float),
+            channel_9=dataset["channel_9"].astype(float),
+        ))
+        assert "counts_to_rad" not in converted
+        for var in ("channel_1", "channel_9"):
+            assert np.allclose(
+                converted[var], direct[var], equal_nan=True)
+        assert np.nanmin(converted["channel_9"]) > 100
+        assert np.isnan(converted["channel_9"][0, 0])
+
+    def test_grid(self, tmp_path, monkeypatch):
+        """The grid must be stored only in a given directory and validated"""
+        monkeypatch.setattr(SEVIRI, "_grid", None)
+        monkeypatch.delenv("TYPHON_DATA_PATH", raising=False)
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+        monkeypatch.setenv("HOME", str(tmp_path))
+
+        grid = SEVIRI.grid()
+        assert not os.listdir(tmp_path)
+        assert grid["lat"].shape == (3712, 3712)
+        assert SEVIRI.grid() is grid
+        # The sub-satellite point and a pixel in space:
+        assert np.allclose(grid["lat"][1855:1857, 1855:1857], 0, atol=0.05)
+        assert np.isnan(grid["lon"][0, 0])
+
+        monkeypatch.setattr(SEVIRI, "_grid", None)
+        monkeypatch.setattr(SEVIRI, "grid_directory", str(tmp_path / "grid"))
+        filename = tmp_path / "grid" / "typhon-SEVIRI-grid.npy"
+        stored = SEVIRI.grid()
+        assert filename.exists()
+        assert stored.equals(grid)
+
+        # The mapped grid is copy-on-write:
+        stored["lat"].values[0, 0] = 1
+        assert np.isnan(np.load(filename, mmap_mode="r")[0, 0, 0])
+
+        # Other processes map the stored file instead of calculating it:
+        monkeypatch.setattr(SEVIRI, "_grid", None)
+        inode = os.stat(filename).st_ino
+        assert SEVIRI.grid().equals(grid)
+        assert os.stat(filename).st_ino == inode
+
+        # A corrupted file is replaced:
+        monkeypatch.setattr(SEVIRI, "_grid", None)
+        lat_lon = np.load(filename, mmap_mode="r+")
+        lat_lon[0, 1000, 1000] += 1
+        lat_lon.flush()
+        del lat_lon
+        lat, lon = SEVIRI._calculate_grid(np.array([1000]))
+        assert SEVIRI.grid()["lat"][1000, 1000] == lat[0, 0]
+        assert os.stat(filename).st_ino != inode
@@ -1,10 +1,34 @@
 import os
 import tempfile
 
+import fsspec
+import netCDF4
 import numpy as np
+import pytest
 import xarray as xr
 
-from typhon.files import NetCDF4
+from typhon.files import FileInfo, NetCDF4
+from typhon.files.handlers import common
+from typhon.files.handlers.common import dask_is_installed
+
+
+def _write_inherited_dims(filename):
+    """Write a file whose subgroups use the dimensions of the root group
+
+    The typhon writer defines all dimensions in the groups that use them,
+    hence we need the netCDF4 library directly.
+    """
+    with netCDF4.Dataset(filename, "w") as root:
+        root.createDimension("x", 20)
+        root.createDimension("y", 10)
+        root.createVariable("a", "f8", ("x", "y"))[:] = \
+            np.arange(200.).reshape(20, 10)
+        group = root.createGroup("group")
+        group.createVariable("c", "i8", ("x",))[:] = np.arange(20)
+        subgroup = group.createGroup("subgroup")
+        subgroup.createDimension("z", 3)
+        subgroup.createVariable("d", "f8", ("x", "z"))[:] = \
+            np.arange(60.).reshape(20, 3)
 
 
 class TestNetCDF4:
@@ -113,3 +137,117 @@ class TestNetCDF4:
             fh.write(before, tfile)
             after = fh.read(tfile)
             assert np.allclose(before["a"], after["a"])
+
+    def test_select(self):
+        """Selections must give the same as selecting after reading"""
+        fh = NetCDF4()
+
+        with tempfile.TemporaryDirectory() as tdir:
+            tfile = os.path.join(tdir, "testfile.nc")
+            before = xr.Dataset({
+                "a": (("x", "y"), np.arange(200.).reshape(20, 10)),
+                "b": ("x", np.arange(20)),
+                "group/c": (("group/x", "y"), np.arange(50).reshape(5, 10)),
+            })
+            fh.write(before, tfile)
+
+            after = fh.read(tfile, select={
+                "x": slice(2, 15, 3), "y": 4, "group/x": [0, 3],
+            })
+            check = fh.read(tfile).isel(
+                x=slice(2, 15, 3), y=4, **{"group/x": [0, 3]})
+            assert after.equals(check)
+
+            # Dimensions can be selected by their new names:
+            after = fh.read(
+                tfile, mapping={"x": "time", "group/x": "time"},
+                select={"time": slice(0, 3)},
+            )
+            assert after["a"].shape == (3, 10)
+            assert after["group/c"].shape == (3, 10)
+
+            # Subgroups may use the dimensions of their ancestors:
+            _write_inherited_dims(tfile)
+            after = fh.read(tfile, select={"x": slice(2, 15, 3)})
+            check = fh.read(tfile)
+            assert check["group/subgroup/d"].dims == \
+                ("x", "group/subgroup/z")
+            assert after.equals(check.isel(x=slice(2, 15, 3)))
+
+    @pytest.mark.parametrize("h5netcdf", [True, False])
+    def test_remote(self, h5netcdf, monkeypatch):
+        """Remote files must give the same as local files"""
+        if h5netcdf and not common.h5netcdf_is_installed:
+            pytest.skip("h5netcdf not installed")
+        monkeypatch.setattr(common, "h5netcdf_is_installed", h5netcdf)
+        fh = NetCDF4()
+        fs = fsspec.filesystem("memory")
+
+        with tempfile.TemporaryDirectory() as tdir:
+            tfile = os.path.join(tdir, "testfile.nc")
+            before = xr.Dataset({
+                "a": (("x", "y"), np.arange(200.).reshape(20, 10)),
+                "group/c": (("group/x", "y"), np.arange(50).reshape(5, 10)),
+            }, attrs={"title": "remote"})
+            before["a"][0, 0] = np.nan
+            before["a"].encoding = {
+                "scale_factor": 0.1, "_FillValue": -1, "dtype": "int16"}
+            fh.write(before, tfile)
+            with open(tfile, "rb") as file:
+                fs.pipe("/remote/testfile.nc", file.read())
+
+            remote = FileInfo("/remote/testfile.nc", fs=fs)
+            select = {"x": slice(2, 15, 3), "group/x": [0, 3]}
+            assert fh.read(remote).identical(fh.read(tfile))
+            assert fh.read(remote, select=select).identical(
+                fh.read(tfile, select=select))
+
+            # netCDF3 files are fetched completely:
+            before.drop_vars("group/c").to_netcdf(
+                tfile, format="NETCDF3_CLASSIC")
+            with open(tfile, "rb") as file:
+                fs.pipe("/remote/testfile.nc", file.read())
+            assert fh.read(remote).identical(fh.read(tfile))
+
+    @pytest.mark.skipif(not dask_is_installed, reason="dask not installed")
+    def test_lazy(self):
+        """Lazy reading must give the same data as eager reading"""
+        fh = NetCDF4()
+
+        with tempfile.TemporaryDirectory() as tdir:
+            tfile = os.path.join(tdir, "testfile.nc")
+            before = xr.Dataset({
+                "a": (("x", "y"), np.arange(200.).reshape(20, 10)),
+                "group/b": ("group/x", np.arange(5)),
+                "group/subgroup/c": ("group/x", np.arange(5) * 2.),
+            })
+            before["a"].encoding = {"_FillValue": 0.}
+            fh.write(before, tfile)
+
+            eager = fh.read(tfile)
+            lazy = fh.read(tfile, lazy=True, chunks={"x": 5})
+            assert lazy["a"].chunks == ((5, 5, 5, 5), (10,))
+            assert lazy["group/b"].chunks is not None
+            assert lazy.load().equals(eager)
+
+            lazy = fh.read(
+                tfile, lazy=True, fields=["a", "group/b"],
+                mapping={"x": "time"}, select={"time": slice(0, 3)},
+            )
+            assert set(lazy.variables) == {"a", "group/b"}
+            assert lazy["a"].chunks is not None
+            assert lazy["a"].compute().equals(
+                eager["a"].isel(x=slice(0, 3)).rename(x="time"))
+
+            # Subgroups may use the dimensions of their ancestors (the lazy
+            # datasets above may still keep the first file open):
+            tfile = os.path.join(tdir, "inherited.nc")
+            _write_inherited_dims(tfile)
+            eager = fh.read(tfile)
+            lazy = fh.read(tfile, lazy=True, chunks={"x": 5})
+            assert lazy["group/subgroup/d"].dims == ("x", "group/subgroup/z")
+            assert lazy["group/subgroup/d"].chunks == ((5, 5, 5, 5), (3,))
+            assert lazy.load().equals(eager)
+
+            lazy = fh.read(tfile, lazy=True, select={"x": slice(2, 15, 3)})
+            assert lazy.load().equals(eager.isel(x=slice(2, 15, 3)))
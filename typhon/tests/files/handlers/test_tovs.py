@@ -0,0 +1,64 @@
+import fsspec
+import h5py
+import numpy as np
+import pytest
+
+from typhon.files import FileInfo, MHS_HDF
+
+
+@pytest.fixture
+def mhs_file(tmp_path):
+    """A small MHS file with 20 scan lines from south to north"""
+    path = tmp_path / "mhs.h5"
+    scnlines = 20
+    with h5py.File(path, "w") as file:
+        data = file.create_group("Data")
+        # The scan line numbers of the file are not used by the handler:
+        data["scnlin"] = np.arange(101, scnlines + 101, dtype="i4")
+        data["scnlinyr"] = np.full(scnlines, 2010, dtype="i4")
+        data["scnlindy"] = np.full(scnlines, 5, dtype="i4")
+        data["scnlintime"] = (np.arange(scnlines) * 2667).astype("i4")
+        data["btemps"] = np.arange(
+            scnlines * 90 * 5, dtype="i4").reshape(scnlines, 90, 5)
+        data["btemps"].attrs["Scale"] = 0.01
+
+        geolocation = file.create_group("Geolocation")
+        lat = np.linspace(-80, 80, scnlines)[:, np.newaxis].repeat(90, 1)
+        lon = np.linspace(-50, 50, 90)[np.newaxis, :].repeat(scnlines, 0)
+        for name, values in (("Latitude", lat), ("Longitude", lon)):
+            geolocation[name] = (values * 1e4).astype("i4")
+            geolocation[name].attrs["Scale"] = 1e-4
+    return str(path)
+
+
+class TestMHS:
+    def test_select(self, mhs_file):
+        """Selections must keep the original scan line numbers"""
+        fh = MHS_HDF()
+        full = fh.read(mhs_file)
+        assert full["scnline"].values.tolist() == list(range(1, 21))
+
+        selected = fh.read(mhs_file, select={"scnline": slice(5, 10)})
+        assert selected.identical(full.isel(scnline=slice(5, 10)))
+        assert selected["scnline"].values.tolist() == [6, 7, 8, 9, 10]
+
+        last = fh.read(mhs_file, select={"scnline": slice(-3, None)})
+        assert last.identical(full.isel(scnline=slice(-3, None)))
+        some = fh.read(mhs_file, select={"scnline": [0, 4, 19]})
+        assert some["scnline"].values.tolist() == [1, 5, 20]
+
+        in_bbox = fh.read(mhs_file, bbox=(0, -60, 30, 60))
+        assert in_bbox.identical(full.isel(scnline=slice(10, 14)))
+        assert fh.read(mhs_file, bbox=(85, -60, 90, 60)) is None
+
+    def test_remote(self, mhs_file):
+        """Bounding boxes must work on other file systems, too"""
+        fs = fsspec.filesystem("memory")
+        with open(mhs_file, "rb") as file:
+            fs.pipe("/remote/mhs.h5", file.read())
+
+        fh = MHS_HDF()
+        remote = FileInfo("/remote/mhs.h5", fs=fs)
+        in_bbox = fh.read(remote, bbox=(0, -60, 30, 60))
+        assert in_bbox.identical(
+            fh.read(mhs_file).isel(scnline=slice(10, 14)))
@@ -0,0 +1,157 @@
+import os
+from datetime import datetime
+
+from typhon.files import (
+    FileCatalogue, FileHandler, FileInfo, FileInfoStore, FileSet
+)
+
+
+class TestFileCatalogue:
+    """Testing the persistent file catalogue of filesets."""
+
+    @staticmethod
+    def create_files(directory, days):
+        for day in days:
+            for satellite in ("SatA", "SatB"):
+                subdir = directory / satellite / f"2018-01-{day:02d}"
+                subdir.mkdir(parents=True, exist_ok=True)
+                for hour in range(0, 24, 6):
+                    (subdir / f"{hour:02d}0000-{hour+5:02d}5959.nc").touch()
+
+    @staticmethod
+    def fileset(directory, catalogue=None):
+        return FileSet(
+            str(directory / "{satellite}" / "{year}-{month}-{day}"
+                / "{hour}{minute}{second}-{end_hour}{end_minute}{end_second}"
+                  ".nc"),
+            catalogue=catalogue,
+        )
+
+    def test_find(self, tmp_path):
+        """The catalogue must find the same files as the file system walk"""
+        self.create_files(tmp_path / "data", range(1, 4))
+        walker = self.fileset(tmp_path / "data")
+        indexed = self.fileset(
+            tmp_path / "data", str(tmp_path / "catalogue.sqlite"))
+
+        for args in [
+            {},
+            {"start": "2018-01-02", "end": "2018-01-02 12:00:00"},
+            {"start": "2018-01-01 05:00:00", "end": "2018-01-01 07:00:00",
+             "filters": {"satellite": "SatA"}},
+            {"start": "2018-01-02", "filters": {"!satellite": "SatA"}},
+        ]:
+            expected = list(walker.find(**args))
+            found = list(indexed.find(**args))
+            assert expected
+            assert [f.path for f in found] == [f.path for f in expected]
+            assert [f.times for f in found] == [f.times for f in expected]
+            assert [f.attr for f in found] == [f.attr for f in expected]
+
+        assert len(indexed.catalogue) == 24
+
+    def test_update(self, tmp_path):
+        """Only new or removed files should change the catalogue"""
+        self.create_files(tmp_path / "data", range(1, 3))
+        catalogue_file = str(tmp_path / "catalogue.sqlite")
+        indexed = self.fileset(tmp_path / "data", catalogue_file)
+        assert len(list(indexed.find())) == 16
+
+        # The catalogue is persistent, a new fileset object reuses it:
+        self.create_files(tmp_path / "data", [3])
+        indexed = self.fileset(tmp_path / "data", catalogue_file)
+        assert len(list(indexed.find())) == 16
+
+        indexed.update_catalogue()
+        assert len(list(indexed.find())) == 24
+
+        os.remove(tmp_path / "data/SatB/2018-01-03/000000-055959.nc")
+        # Make sure that the modification time is different:
+        os.utime(tmp_path / "data/SatB/2018-01-03", (0, 0))
+        indexed.update_catalogue()
+        files = list(indexed.find("2018-01-03", "2018-01-03 01:00:00"))
+        assert [f.attr["satellite"] for f in files] == ["SatA"]
+        assert files[0].times == [
+            datetime(2018, 1, 3), datetime(2018, 1, 3, 5, 59, 59)]
+
+    def test_max_duration(self, tmp_path):
+        """Long files from any directory must be found by queries"""
+        catalogue = FileCatalogue(str(tmp_path / "catalogue.sqlite"))
+        catalogue.set_files("/b/", "1", [
+            FileInfo("/b/long", [datetime(2018, 1, 1), datetime(2018, 1, 9)]),
+        ])
+        # A later directory with shorter files must not lower the bound:
+        catalogue.set_files("/a/", "1", [
+            FileInfo("/a/short", [datetime(2018, 1, 5),
+                                  datetime(2018, 1, 5, 1)]),
+        ])
+        catalogue.set_files("/c/", "1", [])
+
+        files = catalogue.query(datetime(2018, 1, 8), datetime(2018, 1, 8))
+        assert [f.path for f in files] == ["/b/long"]
+
+
+# Paths of the files whose information has been retrieved via the handler:
+_opened = []
+
+
+def _get_info(file_info):
+    """Get the time coverage from the content of the file"""
+    _opened.append(file_info.path)
+    with open(file_info.path) as file:
+        start, end = file.read().split()
+    return FileInfo(
+        file_info.path, [datetime.fromisoformat(start),
+                         datetime.fromisoformat(end)], {"size": len(start)})
+
+
+class TestFileInfoStore:
+    """Testing the persistent store of handler information."""
+
+    @staticmethod
+    def fileset(directory, info_store):
+        return FileSet(
+            str(directory / "{year}" / "{doy}.txt"),
+            handler=FileHandler(info=_get_info), info_via="handler",
+            info_store=info_store,
+        )
+
+    def test_get_info(self, tmp_path):
+        """Files must be opened only once as long as they do not change"""
+        (tmp_path / "2018").mkdir()
+        for day in range(1, 5):
+            with open(tmp_path / "2018" / f"00{day}.txt", "w") as file:
+                file.write(f"2018-01-0{day}T06:00 2018-01-0{day}T18:00")
+
+        store_file = str(tmp_path / "infos.sqlite")
+        _opened.clear()
+        files = list(self.fileset(tmp_path, store_file).find())
+        assert len(_opened) == 4
+        assert files[0].times == [
+            datetime(2018, 1, 1, 6), datetime(2018, 1, 1, 18)]
+
+        # Another fileset (e.g. in another process) reuses the information:
+        fileset = self.fileset(tmp_path, FileInfoStore(store_file))
+        assert list(fileset.find()) == files
+        assert len(_opened) == 4
+        assert len(fileset.info_store) == 4
+
+        # The validated information is kept in memory, the store is not
+        # asked again:
+        store_get = fileset.info_store.get
+        queried = []
+        fileset.info_store.get = \
+            lambda info: queried.append(info) or store_get(info)
+        assert list(fileset.find()) == files
+        assert not queried
+
+        # Changed files are opened again (after resetting the memory cache):
+        with open(tmp_path / "2018" / "002.txt", "w") as file:
+            file.write("2018-01-02T00:00:00 2018-01-02T23:59:59")
+        fileset.reset_cache()
+        files = list(fileset.find())
+        assert len(queried) == 4
+        assert _opened[4:] == [str(tmp_path / "2018" / "002.txt")]
+        assert files[1].times == [
+            datetime(2018, 1, 2), datetime(2018, 1, 2, 23, 59, 59)]
+        assert files[1].attr == {"size": 19}
@@ -0,0 +1,102 @@
+import pickle
+import time
+
+import numpy as np
+
+from typhon.files import FileHandler, FileSet
+
+
+def _is_mapped(array):
+    """Is this array a view of a memory-mapped file?"""
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = getattr(array, "base", None)
+    return False
+
+
+# Start and end time of each read:
+_reads = []
+
+
+def _read_slowly(file_info):
+    """Read a pickle file, the first file is the slowest"""
+    start = time.time()
+    with open(file_info.path, "rb") as file:
+        data = pickle.load(file)
+    time.sleep(0.5 if data[0] == 0 else 0.01)
+    _reads.append((start, time.time()))
+    return data
+
+
+class TestFileSetMap:
+    """Testing the parallel map methods of filesets."""
+
+    @staticmethod
+    def create_fileset(directory, days=6, size=1000):
+        fileset = FileSet(
+            str(directory / "{year}" / "{doy}.pickle"),
+            handler=FileHandler(reader=_read_slowly),
+        )
+        for day in range(days):
+            filename = fileset.get_filename(f"2018-01-{day+1:02d}")
+            fileset.make_dirs(filename)
+            with open(filename, "wb") as file:
+                pickle.dump(np.full(size, day), file)
+        return fileset
+
+    def test_imap_unordered(self, tmp_path):
+        """Unordered results must not wait for slow files"""
+        fileset = self.create_fileset(tmp_path)
+        kwargs = {
+            "start": "2018-01-01", "end": "2018-01-07", "max_workers": 2,
+            "return_info": True,
+        }
+
+        ordered = [data[0] for _, data in fileset.icollect(**kwargs)]
+        assert ordered == list(range(6))
+
+        unordered = [
+            data[0] for _, data in fileset.icollect(ordered=False, **kwargs)
+        ]
+        assert sorted(unordered) == list(range(6))
+        assert unordered[-1] == 0
+
+    def test_imap_prefetch(self, tmp_path):
+        """The number of files in flight must be limited"""
+        fileset = self.create_fileset(tmp_path)
+        kwargs = {
+            "start": "2018-01-01", "end": "2018-01-07", "max_workers": 3,
+        }
+
+        # Every result has 8000 bytes. With this limit, the files are read
+        # one after another:
+        _reads.clear()
+        results = fileset.icollect(
+            prefetch=4, max_inflight_bytes=10000, **kwargs)
+        assert [data[0] for data in results] == list(range(6))
+        _reads.sort()
+        assert all(
+            end <= next_start
+            for (_, end), (next_start, _) in zip(_reads[:-1], _reads[1:])
+        )
+
+        results = list(fileset.icollect(prefetch=1, ordered=False, **kwargs))
+        assert [data[0] for data in results] == list(range(6))
+
+    def test_collect_processes(self, tmp_path):
+        """Big results of processes must be passed via shared memory"""
+        fileset = self.create_fileset(tmp_path, days=3, size=200000)
+        files, data = fileset.collect(
+            "2018-01-01", "2018-01-04", worker_type="process",
+            max_workers=2, return_info=True,
+        )
+        assert [array[0] for array in data] == [0, 1, 2]
+        assert all(array.shape == (200000,) for array in data)
+        assert all(_is_mapped(array) for array in data)
+
+        data = fileset.collect(
+            "2018-01-01", "2018-01-04", worker_type="process",
+            max_workers=2, shared_memory=False,
+        )
+        assert [array[-1] for array in data] == [0, 1, 2]
@@ -0,0 +1,111 @@
+import pickle
+import threading
+import time
+
+from fsspec.implementations.local import LocalFileSystem
+from fsspec.spec import AbstractBufferedFile, AbstractFileSystem
+import h5py
+import numpy as np
+import xarray as xr
+
+from typhon.files import FileSet, HDF5
+
+
+class _SlowFileSystem(AbstractFileSystem):
+    """Local files that behave like files on a slow remote server
+
+    Each listing takes some time and files are read in byte ranges.
+    """
+    protocol = "slow"
+
+    def __init__(self, latency=0.05, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.listings = 0
+        self.requests = []
+        self._lock = threading.Lock()
+        self._local = LocalFileSystem()
+
+    def ls(self, path, detail=True, **kwargs):
+        time.sleep(self.latency)
+        with self._lock:
+            self.listings += 1
+        return self._local.ls(path, detail=detail)
+
+    def info(self, path, **kwargs):
+        return self._local.info(path)
+
+    def _open(self, path, mode="rb", block_size=None, autocommit=True,
+              cache_options=None, **kwargs):
+        return _SlowFile(self, path, mode, block_size or 4096,
+                         cache_options=cache_options, **kwargs)
+
+
+class _SlowFile(AbstractBufferedFile):
+    def _fetch_range(self, start, end):
+        self.fs.requests.append((start, end))
+        with open(self.path, "rb") as file:
+            file.seek(start)
+            return file.read(end - start)
+
+
+class TestRemoteFileSet:
+    """Testing filesets on remote file systems."""
+
+    @staticmethod
+    def create_files(directory):
+        fileset = FileSet(
+            str(directory / "{year}" / "{doy}" / "{hour}.nc"))
+        for day in range(1, 5):
+            for hour in (0, 12):
+                data = xr.Dataset({"day": ("x", np.full(10, day))})
+                fileset.write(
+                    data, fileset.get_filename(f"2018-01-0{day} {hour}:00"))
+        return fileset
+
+    def test_find(self, tmp_path):
+        """Parallel listing must find the same files as the local search"""
+        local = self.create_files(tmp_path)
+        files = list(local.find("2018-01-01", "2018-01-04"))
+
+        fs = _SlowFileSystem()
+        remote = FileSet(local.path, fs=fs, listing_workers=8)
+        start = time.time()
+        remote_files = list(remote.find("2018-01-01", "2018-01-04"))
+        assert remote_files == files
+        # With sequential listing, this would take at least 0.05 seconds
+        # per directory:
+        assert time.time() - start < fs.latency * fs.listings
+
+        remote.listing_workers = 1
+        assert list(remote.find("2018-01-01", "2018-01-04")) == files
+
+        assert remote_files[-1].file_system is fs
+        data = remote.read(remote_files[-1])
+        assert data["day"].values.tolist() == [3] * 10
+
+    def test_block_cache(self, tmp_path):
+        """Remote HDF5 files must be read in byte ranges and cached"""
+        filename = str(tmp_path / "2018" / "001.h5")
+        (tmp_path / "2018").mkdir()
+        with h5py.File(filename, "w") as file:
+            file["small"] = np.arange(10)
+            file["big"] = np.zeros(1_000_000)
+
+        fs = _SlowFileSystem(latency=0)
+        fileset = FileSet(
+            str(tmp_path / "{year}" / "{doy}.h5"), handler=HDF5(), fs=fs,
+            block_cache=str(tmp_path / "cache"),
+        )
+        file_info, = fileset.find("2018-01-01", "2018-01-02")
+        data = fileset.read(file_info, fields=["small"])
+        assert data["small"].values.tolist() == list(range(10))
+        assert 0 < sum(end - start for start, end in fs.requests) < 100_000
+
+        # The blocks are read from the cache now:
+        fs.requests.clear()
+        fileset.read(file_info, fields=["small"])
+        assert not fs.requests
+
+        # A fileset with cache must still be picklable:
+        assert pickle.loads(pickle.dumps(fileset)).path == fileset.path
@@ -0,0 +1,122 @@
+import errno
+import os
+import pickle
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from typhon.files import FileSet, SharedResult, transport
+
+
+def _is_mapped(array):
+    """Is this array a view of a memory-mapped file?"""
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = getattr(array, "base", None)
+    return False
+
+
+def _big(file_info):
+    if file_info.times[0].day == 4:
+        raise ValueError("broken file")
+    return np.zeros(300000)
+
+
+class TestSharedResult:
+    """Testing the shared memory transport of results."""
+
+    def test_dump_load(self, tmp_path):
+        """Big buffers must be moved to files and restored without copies"""
+        dataset = xr.Dataset(
+            {"data": ("time", np.random.rand(200000))},
+            coords={"time": np.arange(200000)},
+        )
+        result = SharedResult.dump(
+            (dataset, np.arange(10), "info"), directory=str(tmp_path))
+        assert len(result.filenames) == 2
+        assert len(os.listdir(tmp_path)) == 2
+        assert result.nbytes > dataset.nbytes
+
+        # This is what happens when sending it to another process:
+        result = pickle.loads(pickle.dumps(result))
+        loaded, small, info = result.load()
+        assert not os.listdir(tmp_path)
+        assert loaded.identical(dataset)
+        assert _is_mapped(loaded["data"].values)
+        assert small.tolist() == list(range(10))
+        assert info == "info"
+
+        # The arrays are writable copies-on-write:
+        loaded["data"][0] = -1
+        assert loaded["data"][0] == -1
+
+    def test_full_directory(self, tmp_path, monkeypatch):
+        """A full directory must not break the transport"""
+        mkstemp = transport.tempfile.mkstemp
+        created = []
+
+        def mkstemp_once(*args, **kwargs):
+            if created:
+                raise OSError(errno.ENOSPC, "No space left on device")
+            created.append(mkstemp(*args, **kwargs))
+            return created[-1]
+
+        monkeypatch.setattr(transport.tempfile, "mkstemp", mkstemp_once)
+        data = [np.random.rand(200000), np.random.rand(200000)]
+        result = SharedResult.dump(data, directory=str(tmp_path))
+        assert len(created) == 1
+        assert not result.filenames
+        assert not os.listdir(tmp_path)
+
+        loaded = pickle.loads(pickle.dumps(result)).load()
+        assert all(np.array_equal(a, b) for a, b in zip(loaded, data))
+
+    def test_discard(self, tmp_path):
+        """Results that are never loaded must not leave files behind"""
+        result = SharedResult.dump(
+            np.random.rand(200000), directory=str(tmp_path))
+        result.discard()
+        assert not os.listdir(tmp_path)
+
+        # The sender must not remove the files of a received result:
+        result = SharedResult.dump(
+            np.random.rand(200000), directory=str(tmp_path))
+        received = pickle.loads(pickle.dumps(result))
+        del result
+        assert len(os.listdir(tmp_path)) == 1
+
+        # But the receiver does as soon as it does not need them anymore:
+        del received
+        assert not os.listdir(tmp_path)
+
+    def test_fileset(self, tmp_path, monkeypatch):
+        """Stopping FileSet.imap early or errors must not leak files"""
+        shared = tmp_path / "shared"
+        shared.mkdir()
+        # The worker processes are forked after this:
+        monkeypatch.setattr(
+            transport, "_default_directory", lambda: str(shared))
+
+        fileset = FileSet(str(tmp_path / "{year}" / "{doy}.txt"))
+        for day in range(1, 9):
+            filename = fileset.get_filename(f"2018-01-0{day}")
+            fileset.make_dirs(filename)
+            open(filename, "w").close()
+
+        results = fileset.imap(
+            _big, worker_type="process", max_workers=2, prefetch=4,
+            start="2018-01-01", end="2018-01-04",
+        )
+        assert next(results).size == 300000
+        results.close()
+        assert not os.listdir(shared)
+
+        with pytest.raises(ValueError):
+            list(fileset.imap(_big, worker_type="process", max_workers=2))
+        assert not os.listdir(shared)
+
+        with pytest.raises(ValueError):
+            fileset.map(_big, worker_type="process", max_workers=2)
+        assert not os.listdir(shared)
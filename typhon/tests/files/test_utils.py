@@ -1,7 +1,10 @@
 import os
 from tempfile import TemporaryDirectory
 
-from typhon.files import compress, decompress
+from typhon.files import (
+    compress, compress_as, decompress, open_decompressed, CSV, FileHandler,
+    FileSet)
+from typhon.files.utils import _block_compressors, _compress_blocks
 
 
 class TestCompression:
@@ -50,3 +53,50 @@ class TestCompression:
 
             with decompress(tfile + ".xz") as uncompressed_file:
                 assert self.check_file(uncompressed_file)
+
+    def test_open_decompressed(self):
+        with TemporaryDirectory() as tdir:
+            for fmt in ["", ".zip", ".gz", ".bz2", ".xz"]:
+                tfile = os.path.join(tdir, 'testfile') + fmt
+                with compress(tfile) as compressed_file:
+                    self.create_file(compressed_file)
+
+                with open_decompressed(tfile) as file:
+                    assert file.read().decode() == self.data
+
+    def test_fileset_streaming(self, tmp_path):
+        """Handlers accepting file objects must not need a temporary file"""
+        with compress(str(tmp_path / "2018-01-01.csv.gz")) as file:
+            with open(file, "w") as csv_file:
+                csv_file.write("a,b\n1,2\n3,4\n")
+
+        # Decompressing to a temporary file would fail in this directory:
+        fileset = FileSet(
+            str(tmp_path / "{year}-{month}-{day}.csv.gz"), handler=CSV(),
+            temp_dir=str(tmp_path / "missing"),
+        )
+        data = fileset.read(str(tmp_path / "2018-01-01.csv.gz"))
+        assert data["b"].values.tolist() == [2, 4]
+
+        assert not FileHandler().accepts_file_objects
+        assert FileHandler(accepts_file_objects=True).accepts_file_objects
+
+    def test_compress_parallel(self, tmp_path):
+        """Block-wise compressed files must be readable as usual"""
+        data = os.urandom(1000).hex() * 50
+        tfile = str(tmp_path / "testfile")
+        with open(tfile, "w") as file:
+            file.write(data)
+
+        for fmt, compressor in _block_compressors.items():
+            # Use tiny blocks to get many gzip members / bz2 / xz streams:
+            _compress_blocks(tfile, f"{tfile}.{fmt}", compressor, workers=3,
+                             block_size=1000)
+            with decompress(f"{tfile}.{fmt}") as uncompressed_file:
+                with open(uncompressed_file) as file:
+                    assert file.read() == data
+
+            target = compress_as(
+                tfile, fmt, target=f"{tfile}2.{fmt}", workers=2)
+            with open_decompressed(target) as file:
+                assert file.read().decode() == data
@@ -0,0 +1,134 @@
+import pickle
+import threading
+
+import numpy as np
+import pytest
+
+from typhon.files import BackgroundWriter, FileHandler, FileSet
+
+
+def _write_pickle(data, file_info):
+    with open(file_info.path, "wb") as file:
+        pickle.dump(data, file)
+
+
+def _double(file_info):
+    with open(file_info.path, "rb") as file:
+        data = pickle.load(file)
+    return np.concatenate([data, data])
+
+
+def _fail(data, file_info):
+    raise OSError("disk full")
+
+
+class TestBackgroundWriter:
+    """Testing the background writer of filesets."""
+
+    def test_pending_bytes(self):
+        """The writer must block if too much data is waiting"""
+        release = threading.Event()
+        written = []
+
+        def write(data):
+            release.wait(10)
+            written.append(data.size)
+
+        writer = BackgroundWriter(max_workers=2, max_pending_bytes=1000)
+        writer.submit(write, np.zeros(100))
+        assert writer.pending_bytes == 800
+
+        # This would exceed the limit, hence it has to wait for the first one:
+        submitter = threading.Thread(
+            target=writer.submit, args=(write, np.zeros(50)))
+        submitter.start()
+        submitter.join(0.2)
+        assert submitter.is_alive()
+        assert writer.pending == 1
+
+        release.set()
+        submitter.join(10)
+        writer.close()
+        assert written == [100, 50]
+        assert writer.pending_bytes == 0
+
+    def test_errors(self, tmp_path):
+        """Errors of the writing functions must be raised by flush"""
+        fileset = FileSet(
+            str(tmp_path / "{year}" / "{doy}.pickle"),
+            handler=FileHandler(writer=_fail),
+        )
+        fileset.write(np.arange(10), fileset.get_filename("2018-01-01"),
+                      in_background=True)
+        with pytest.raises(OSError):
+            fileset.flush()
+
+        # The error was reported once, the writer can be used again:
+        fileset.handler = FileHandler(writer=_write_pickle)
+        fileset.write(np.arange(10), fileset.get_filename("2018-01-01"),
+                      in_background=True)
+        fileset.flush()
+        assert len(list(fileset.find("2018-01-01", "2018-01-02"))) == 1
+
+    def test_fileset(self, tmp_path):
+        """FileSet.write must write in background if requested"""
+        fileset = FileSet(
+            str(tmp_path / "{year}" / "{doy}.pickle"),
+            handler=FileHandler(writer=_write_pickle),
+        )
+        for day in range(1, 6):
+            fileset.write(
+                np.arange(day), fileset.get_filename(f"2018-01-0{day}"),
+                in_background=True,
+            )
+        assert isinstance(fileset.writer, BackgroundWriter)
+        # The default writer limits the memory:
+        assert fileset.writer.max_pending_bytes is not None
+        fileset.flush()
+        assert len(list(fileset.find("2018-01-01", "2018-01-06"))) == 5
+
+        # A fileset with a writer must still be copyable and picklable:
+        copied = pickle.loads(pickle.dumps(fileset.copy()))
+        assert copied.writer.pending == 0
+
+    @pytest.mark.parametrize("worker_type", ["thread", "process"])
+    def test_map(self, tmp_path, worker_type):
+        """FileSet.map must write its output through the background writer"""
+        fileset = FileSet(
+            str(tmp_path / "input" / "{year}" / "{doy}.pickle"),
+            handler=FileHandler(writer=_write_pickle),
+        )
+        for day in range(1, 6):
+            fileset.write(
+                np.arange(day), fileset.get_filename(f"2018-01-0{day}"))
+
+        output = FileSet(
+            str(tmp_path / "output" / "{year}" / "{doy}.pickle"),
+            handler=FileHandler(writer=_write_pickle),
+        )
+        output.writer = BackgroundWriter(max_pending_bytes=16)
+        results = fileset.map(
+            _double, output=output, worker_type=worker_type, max_workers=2,
+            write_in_background=True,
+        )
+        assert results == [True] * 5
+        # map waits until all files are written:
+        assert output.writer.pending == 0
+        for day, file in enumerate(output.find("2018-01-01", "2018-01-06")):
+            with open(file.path, "rb") as handle:
+                assert pickle.load(handle).tolist() == list(range(day + 1)) * 2
+
+        # Errors of the writer must not get lost:
+        output.handler = FileHandler(writer=_fail)
+        with pytest.raises(OSError):
+            fileset.map(_double, output=output, worker_type=worker_type,
+                        write_in_background=True)
+
+        # Without write_in_background, the workers write the files:
+        output.handler = FileHandler(writer=_write_pickle)
+        output.writer = None
+        assert fileset.map(
+            _double, output=output, worker_type=worker_type,
+            max_workers=2) == [True] * 5
+        assert output.writer is None
+        assert len(list(output.find("2018-01-01", "2018-01-06"))) == 5
@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
 """Testing the functions in typhon.geographical.
 """
+import os
+
 import numpy as np
+import pytest
 
 from typhon import geographical
+from typhon.constants import earth_radius
+from typhon.geodesy import great_circle_distance
 
 
 class TestGeographical:
@@ -44,3 +49,133 @@ class TestGeoIndex:
         ]
 
         assert pairs.tolist() == check_pairs
+
+    def test_iquery(self):
+        """Querying chunk-wise must give the same pairs as querying at once"""
+        lat1 = 30. * np.sin(np.linspace(-3.14, 3.14, 240)) + 20
+        lon1 = np.linspace(0, 90, 240)
+        lat2 = 30. * np.sin(np.linspace(-3.14, 3.14, 240) + 1.) + 20
+        lon2 = np.linspace(0, 90, 240)
+
+        index = geographical.GeoIndex(lat1, lon1)
+        pairs, distances = index.query(lat2, lon2, r="500 km")
+        assert pairs.dtype == np.int64
+        assert pairs.shape == (2, distances.size)
+        assert np.all(distances <= 500)
+
+        chunks = list(index.iquery(lat2, lon2, r="500 km", chunk_size=17))
+        assert len(chunks) == 15
+        chunk_pairs = np.hstack([chunk[0] for chunk in chunks])
+        chunk_distances = np.hstack([chunk[1] for chunk in chunks])
+        assert np.array_equal(pairs, chunk_pairs)
+        assert np.allclose(distances, chunk_distances)
+
+        pairs = index.query(lat2, lon2, r="1 m", return_distance=False)
+        assert pairs.shape == (2, 0)
+
+    def test_ckd_tree(self):
+        """The scipy KD tree must find the same pairs as the BallTree"""
+        lat1 = 30. * np.sin(np.linspace(-3.14, 3.14, 240)) + 20
+        lon1 = np.linspace(0, 90, 240)
+        lat2 = 30. * np.sin(np.linspace(-3.14, 3.14, 240) + 1.) + 20
+        lon2 = np.linspace(0, 90, 240)
+
+        pairs, distances = geographical.GeoIndex(lat1, lon1).query(
+            lat2, lon2, r="500 km")
+        ckd_pairs, ckd_distances = geographical.GeoIndex(
+            lat1, lon1, tree_class="cKD", workers=2, leaf_size=10
+        ).query(lat2, lon2, r="500 km")
+
+        order = np.lexsort(pairs)
+        ckd_order = np.lexsort(ckd_pairs)
+        assert np.array_equal(pairs[:, order], ckd_pairs[:, ckd_order])
+        assert np.allclose(distances[order], ckd_distances[ckd_order])
+
+
+class TestGeoIndexCache:
+    """Testing the GeoIndexCache."""
+
+    def test_get(self, tmp_path):
+        """Indices must be reused for the same grid only"""
+        lat, lon = np.meshgrid(
+            np.linspace(-60, 60, 50), np.linspace(0, 90, 40))
+        other_lat = lat.copy()
+        other_lat[0, 0] += 1
+
+        cache = geographical.GeoIndexCache(maxsize=1, directory=str(tmp_path))
+        index = cache.get(lat.ravel(), lon.ravel())
+        assert cache.get(lat.ravel(), lon.ravel()) is index
+        assert cache.contains(lat.ravel(), lon.ravel())
+        assert not cache.contains(lat.ravel(), lon.ravel(), leaf_size=10)
+        assert cache.get(other_lat.ravel(), lon.ravel()) is not index
+        assert len(cache) == 1
+        assert cache.statistics == {"hits": 1, "disk_hits": 0, "misses": 2}
+
+        # The first index was dropped from memory but is still on disk:
+        cache = geographical.GeoIndexCache(directory=str(tmp_path))
+        index = cache.get(lat.ravel(), lon.ravel())
+        assert cache.statistics["disk_hits"] == 1
+        pairs, _ = index.query(np.array([0.]), np.array([45.]), r=500)
+        assert pairs.shape[1]
+
+    def test_max_files(self, tmp_path):
+        """Only the recently used indices must be kept on disk"""
+        lat, lon = np.meshgrid(
+            np.linspace(-60, 60, 20), np.linspace(0, 90, 10))
+        cache = geographical.GeoIndexCache(
+            maxsize=1, directory=str(tmp_path), max_files=2)
+
+        # Use the first grid again after the second one:
+        for offset in [0, 1, 0, 2]:
+            cache.get(lat.ravel() + offset, lon.ravel())
+            # The modification times must differ:
+            for file in tmp_path.iterdir():
+                os.utime(file, (file.stat().st_mtime - 10,) * 2)
+
+        assert len(list(tmp_path.iterdir())) == 2
+        assert cache.contains(lat.ravel(), lon.ravel())
+        assert cache.contains(lat.ravel() + 2, lon.ravel())
+        assert not cache.contains(lat.ravel() + 1, lon.ravel())
+
+
+class TestGridIndex:
+    """Testing the GridIndex."""
+
+    def test_query(self):
+        """The grid index must find the same points as a brute-force search"""
+        lat, lon = np.meshgrid(
+            np.arange(-89.5, 90), np.arange(-179.5, 180), indexing="ij")
+        shuffler = np.random.permutation(lat.size)
+        lat, lon = lat.ravel()[shuffler], lon.ravel()[shuffler]
+        index = geographical.GridIndex(lat, lon)
+
+        # Check also points close to the poles and the date line:
+        query_lat = np.array([89.9, -89.95, 0, 45.2, 50.1, -10.3])
+        query_lon = np.array([179.99, -179.99, -179.99, 179.7, -5.1, 30.])
+        for radius in [50, 300, 3000]:
+            pairs, distances = index.query(query_lat, query_lon, r=radius)
+            all_distances = great_circle_distance(
+                lat[:, np.newaxis], lon[:, np.newaxis],
+                query_lat, query_lon, r=earth_radius / 1000
+            )
+            expected = set(zip(*np.nonzero(all_distances <= radius)))
+            assert pairs.shape[1] == len(expected)
+            assert set(zip(*pairs)) == expected
+            assert np.allclose(distances, all_distances[tuple(pairs)])
+
+    def test_irregular(self):
+        """Points that are not on a regular grid must be rejected"""
+        lat, lon = np.meshgrid(
+            np.arange(-10, 10.), np.arange(0, 20.), indexing="ij")
+        with pytest.raises(ValueError):
+            geographical.GridIndex(lat.ravel()[1:], lon.ravel()[1:])
+        with pytest.raises(ValueError):
+            geographical.GridIndex(lat.ravel() ** 2, lon.ravel())
+
+        cache = geographical.GeoIndexCache(detect_grids=True)
+        assert isinstance(
+            cache.get(lat.ravel(), lon.ravel()), geographical.GridIndex)
+        assert isinstance(
+            cache.get(lat.ravel() ** 2 / 10, lon.ravel()),
+            geographical.GeoIndex
+        )
@@ -0,0 +1,93 @@
+"""Testing the functions in typhon.trees.
+"""
+import numpy as np
+
+from typhon.trees import (
+    expand_ranges, jagged_to_pairs, overlapping_intervals, RangeTree
+)
+
+
+class TestHelpers:
+    """Testing the helpers for index ranges and radius queries."""
+
+    def test_expand_ranges(self):
+        owners, elements = expand_ranges(
+            np.array([2, 5, 0, 7]), np.array([4, 5, 1, 10]))
+        assert owners.tolist() == [0, 0, 2, 3, 3, 3]
+        assert elements.tolist() == [2, 3, 0, 7, 8, 9]
+
+    def test_jagged_to_pairs(self):
+        jagged = np.empty(3, dtype=object)
+        jagged[:] = [[4, 1], [], [7]]
+        pairs = jagged_to_pairs(jagged, offset=10)
+        assert pairs.tolist() == [[4, 1, 7], [10, 10, 12]]
+        assert jagged_to_pairs(np.empty(0, dtype=object)).shape == (2, 0)
+
+
+class TestOverlappingIntervals:
+    """Testing the vectorized interval overlap search."""
+
+    @staticmethod
+    def brute_force(intervals1, intervals2):
+        return sorted(
+            (i, j)
+            for i, (start1, end1) in enumerate(intervals1)
+            for j, (start2, end2) in enumerate(intervals2)
+            if start1 <= end2 and end1 >= start2
+        )
+
+    def test_random(self):
+        """Compare the results with a brute-force search"""
+        rng = np.random.RandomState(42)
+        for _ in range(10):
+            starts1 = rng.randint(0, 100, 50)
+            intervals1 = np.column_stack(
+                [starts1, starts1 + rng.randint(0, 20, 50)])
+            starts2 = rng.randint(0, 100, 30)
+            intervals2 = np.column_stack(
+                [starts2, starts2 + rng.randint(0, 5, 30)])
+
+            indices1, indices2 = overlapping_intervals(intervals1, intervals2)
+            assert list(zip(indices1.tolist(), indices2.tolist())) \
+                == self.brute_force(intervals1, intervals2)
+
+    def test_datetime(self):
+        """Intervals can be datetime64 arrays and enclose each other"""
+        intervals1 = np.array([
+            ["2018-01-01", "2018-01-31"],
+            ["2018-02-01", "2018-02-02"],
+        ], dtype="M8[s]")
+        intervals2 = np.array([
+            ["2017-12-01", "2018-03-01"],
+            ["2018-01-10", "2018-01-11"],
+            ["2018-01-31", "2018-02-01"],
+            ["2019-01-01", "2019-01-02"],
+        ], dtype="M8[s]")
+
+        indices1, indices2 = overlapping_intervals(intervals1, intervals2)
+        assert indices1.tolist() == [0, 0, 0, 1, 1]
+        assert indices2.tolist() == [0, 1, 2, 0, 2]
+
+        indices1, indices2 = overlapping_intervals(intervals1, intervals2[:0])
+        assert not indices1.size and not indices2.size
+
+
+class TestRangeTree:
+    """Testing the RangeTree class."""
+
+    def test_query_radius(self):
+        """Compare the found pairs with a brute-force search"""
+        rng = np.random.RandomState(0)
+        points = rng.uniform(0, 100, 200)
+        query_points = rng.uniform(0, 100, 50)
+
+        tree = RangeTree(points)
+        pairs = tree.query_radius(query_points, 2.)
+
+        expected = sorted(
+            (i, j)
+            for j, query_point in enumerate(query_points)
+            for i, point in enumerate(points)
+            if abs(point - query_point) <= 2.
+        )
+        assert sorted(zip(*pairs.tolist())) == expected
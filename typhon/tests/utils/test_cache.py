@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Testing the caches in typhon.utils.
+"""
+import os
+
+import numpy
+import pytest
+import xarray
+
+from typhon.utils import hash_arguments, ResultCache, result_cache
+
+
+class TestResultCache:
+    """Testing the typhon.utils.cache functions."""
+    def test_hash_arguments(self, tmp_path):
+        """Hashes must depend on contents, not on object ids"""
+        array = numpy.arange(100)
+        assert hash_arguments(array, a=1, b=2) \
+            == hash_arguments(array.copy(), b=2, a=1)
+        assert hash_arguments(array) != hash_arguments(array + 1)
+        assert hash_arguments(array) != hash_arguments(array.astype("f8"))
+        assert hash_arguments(1) != hash_arguments("1")
+
+        # Other objects are identified by their identity:
+        obj = object()
+        assert hash_arguments(obj) == hash_arguments(obj)
+        assert hash_arguments(obj) != hash_arguments(object())
+
+        # Files are identified by their size and modification time:
+        filename = tmp_path / "file.txt"
+        filename.write_text("a")
+        before = hash_arguments(str(filename))
+        assert hash_arguments(str(filename)) == before
+        filename.write_text("abc")
+        assert hash_arguments(str(filename)) != before
+        assert hash_arguments(filename) != hash_arguments(str(filename))
+
+    def test_max_bytes(self):
+        """The least recently used results must be dropped"""
+        cache = ResultCache(max_bytes=2000)
+        for key in "abc":
+            cache.set(key, numpy.zeros(100))
+        assert len(cache) == 2 and cache.nbytes == 1600
+        assert cache.get("a") is None
+        assert cache.get("b") is not None
+
+        cache.set("d", numpy.zeros(100))
+        assert cache.get("c") is None
+        assert cache.get("b") is not None
+
+        # Too big results are not kept at all:
+        cache.set("e", numpy.zeros(1000))
+        assert cache.get("e") is None
+        assert cache.statistics == {"hits": 2, "disk_hits": 0, "misses": 3}
+
+    def test_read_only(self):
+        """Results must be returned without copies but read-only"""
+        cache = ResultCache()
+        data = numpy.ma.MaskedArray(numpy.arange(5), mask=[0, 1, 0, 0, 0])
+        dataset = xarray.Dataset({"x": ("t", numpy.arange(5))})
+        cache.set("key", (data, dataset))
+
+        cached_data, cached_dataset = cache.get("key")
+        assert numpy.shares_memory(cached_data, data)
+        with pytest.raises(ValueError):
+            cached_data[0] = 1
+        with pytest.raises(ValueError):
+            cached_data.mask[0] = True
+        with pytest.raises(ValueError):
+            cached_dataset["x"].values[0] = 1
+        assert not data.mask[0]
+
+        # Copies can be modified:
+        copied = cached_dataset.copy(deep=True)
+        copied["x"].values[0] = 10
+        assert cache.get("key")[1]["x"].values[0] == 0
+
+    def test_directory(self, tmp_path):
+        """Results must be loaded from the directory"""
+        directory = str(tmp_path / "cache")
+        data = numpy.ma.MaskedArray(numpy.arange(5), mask=[0, 1, 0, 0, 0])
+        dataset = xarray.Dataset({"x": ("t", numpy.arange(5.))})
+
+        cache = ResultCache(directory=directory)
+        cache.set("tuple", (data, {"header": 1}))
+        cache.set("array", data)
+        cache.set("dataset", dataset)
+        assert sorted(os.listdir(directory)) == [
+            "result-array.npz", "result-dataset.nc"]
+
+        cache = ResultCache(directory=directory)
+        assert cache.get("tuple") is None
+        assert numpy.ma.allequal(cache.get("array"), data)
+        assert cache.get("array").mask.tolist() == data.mask.tolist()
+        assert cache.get("dataset").equals(dataset)
+        assert cache.statistics == {"hits": 1, "disk_hits": 2, "misses": 1}
+
+        cache.clear(disk=True)
+        assert not os.listdir(directory)
+
+    def test_result_cache(self):
+        """Functions must be called only for new arguments"""
+        calls = []
+
+        @result_cache(max_bytes=10000)
+        def function(array, factor=1):
+            calls.append(factor)
+            return array * factor
+
+        array = numpy.arange(10)
+        assert function(array, factor=2).tolist() == (array * 2).tolist()
+        function(array.copy(), factor=2)
+        function(array, factor=3)
+        function(array, factor=2, NO_CACHE=True)
+        function(array, factor=2, CLEAR_CACHE=True)
+        assert calls == [2, 3, 2, 2]
+        assert function.cache.statistics["hits"] == 1
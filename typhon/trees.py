@@ -16,9 +16,133 @@ from sklearn.neighbors import BallTree, KDTree
 __all__ = [
     "IntervalTree",
     "RangeTree",
+    "expand_ranges",
+    "jagged_to_pairs",
+    "overlapping_intervals",
 ]
 
 
+def expand_ranges(lower, upper):
+    """Expand index ranges to flat index arrays
+
+    Args:
+        lower: Array with the (inclusive) lower bounds of the ranges.
+        upper: Array with the (exclusive) upper bounds of the ranges.
+
+    Returns:
+        Two numpy arrays: the index of the range each element belongs to and
+        the elements themselves.
+    """
+    counts = np.maximum(upper - lower, 0)
+    owners = np.repeat(np.arange(counts.size), counts)
+
+    # The position of each element within its range plus the range's offset:
+    range_starts = np.cumsum(counts) - counts
+    elements = np.arange(counts.sum()) \
+        - np.repeat(range_starts, counts) + np.repeat(lower, counts)
+    return owners, elements
+
+
+def jagged_to_pairs(jagged, offset=0):
+    """Convert the jagged result of a radius query to an array of pairs
+
+    Args:
+        jagged: A numpy object array with one index array (or list) per query
+            point (as returned by `query_radius` of scikit-learn trees or
+            `query_ball_point` of scipy's cKDTree).
+        offset: This number is added to the query point indices.
+
+    Returns:
+        A *2xN* numpy.int64 array. The first row contains the indices of the
+        tree points, the second row the indices of the query points.
+    """
+    lengths = np.fromiter(
+        (len(indices) for indices in jagged), dtype=np.int64,
+        count=len(jagged)
+    )
+
+    pairs = np.empty((2, lengths.sum()), dtype=np.int64)
+    if pairs.shape[1]:
+        # Empty lists would be cast to floats otherwise:
+        np.concatenate(jagged, out=pairs[0], casting="unsafe")
+    pairs[1] = np.repeat(
+        np.arange(offset, offset + lengths.size, dtype=np.int64), lengths)
+    return pairs
+
+
+def overlapping_intervals(intervals1, intervals2):
+    """Find all pairs of overlapping intervals
+
+    This is a vectorized alternative to :class:`IntervalTree`: instead of
+    querying a tree interval by interval, all overlapping pairs are found at
+    once with sorting and binary searches. Two closed intervals overlap if the
+    start of one of them lies within the other one. Hence, we only need to
+    search for the starting points of the first intervals in the second
+    intervals and vice versa.
+
+    Args:
+        intervals1: A numpy.array with the shape *Nx2* (the lower and higher
+            boundaries of each interval). Can be numbers or numpy.datetime64
+            objects.
+        intervals2: A numpy.array with the shape *Mx2*. Must have the same
+            data type as `intervals1`.
+
+    Returns:
+        Two numpy arrays with indices of overlapping intervals: the first
+        refers to `intervals1`, the second to `intervals2`. The pairs are
+        sorted by the first and then by the second index.
+
+    Examples:
+
+    .. code-block:: python
+
+        import numpy as np
+        from typhon.trees import overlapping_intervals
+
+        intervals = np.asarray([np.arange(1000)-0.5, np.arange(1000)+0.5]).T
+        query_intervals = np.asarray(
+            [np.arange(1000)-1, np.arange(1000)+1]).T
+        indices, query_indices = overlapping_intervals(
+            intervals, query_intervals)
+    """
+    intervals1 = np.asarray(intervals1)
+    intervals2 = np.asarray(intervals2)
+
+    if not intervals1.size or not intervals2.size:
+        return np.array([], dtype=int), np.array([], dtype=int)
+
+    if intervals1.ndim != 2 or intervals1.shape[1] != 2 \
+            or intervals2.ndim != 2 or intervals2.shape[1] != 2:
+        raise ValueError("The intervals must be arrays with the shape Nx2!")
+
+    order1 = np.argsort(intervals1[:, 0], kind="stable")
+    starts1 = intervals1[order1, 0]
+    order2 = np.argsort(intervals2[:, 0], kind="stable")
+    starts2 = intervals2[order2, 0]
+
+    # The first intervals start within the second intervals:
+    # start2 <= start1 <= end2
+    query2, elements = expand_ranges(
+        np.searchsorted(starts1, intervals2[:, 0], side="left"),
+        np.searchsorted(starts1, intervals2[:, 1], side="right"),
+    )
+    query1 = order1[elements]
+
+    # The second intervals start within the first intervals (but not at the
+    # same time, otherwise we would count them twice):
+    # start1 < start2 <= end1
+    indices1, elements = expand_ranges(
+        np.searchsorted(starts2, intervals1[:, 0], side="right"),
+        np.searchsorted(starts2, intervals1[:, 1], side="right"),
+    )
+    indices2 = order2[elements]
+
+    indices1 = np.concatenate([query1, indices1])
+    indices2 = np.concatenate([query2, indices2])
+    order = np.lexsort((indices2, indices1))
+    return indices1[order], indices2[order]
+
+
 class IntervalTreeNode:
     """Helper class for IntervalTree.
 
@@ -231,12 +355,8 @@ class RangeTree:
 
         jagged_pairs = self.tree.query_radius(query_points, r)
 
-        # Build the list of pairs:
-        pairs = np.array([
-            [build_point, query_point]
-            for query_point, build_points in enumerate(jagged_pairs)
-            for build_point in build_points
-        ]).T
+        # Build the array of pairs:
+        pairs = jagged_to_pairs(jagged_pairs)
 
         if self.shuffler is None:
             return pairs
@@ -9,17 +9,32 @@
 # All those contributions are dual-licensed under the MIT license for use
 # in typhon, and the GNU General Public License version 3.
 
+from collections import OrderedDict
 import functools
+import hashlib
 import logging
 import copy
+import os
+import sys
+import threading
+import uuid
+import weakref
+
+import numpy as np
+import xarray as xr
 
 
 __all__ = [
+    'hash_arguments',
     'mutable_cache',
+    'ResultCache',
+    'result_cache',
 ]
 
 
 logger = logging.getLogger(__name__)
+
+
 def mutable_cache(maxsize=10):
     """In-memory cache like functools.lru_cache but for any object
 
@@ -89,3 +104,420 @@ def mutable_cache(maxsize=10):
         return functools.update_wrapper(wrapper, user_function)
 
     return decorating_function
+
+
+# Objects without a content-based hash are identified by a random token that
+# lives as long as the object (ids can be reused after garbage collection):
+_identity_tokens = weakref.WeakKeyDictionary()
+_identity_lock = threading.Lock()
+
+
+def _identity(obj):
+    try:
+        with _identity_lock:
+            token = _identity_tokens.get(obj)
+            if token is None:
+                token = _identity_tokens[obj] = uuid.uuid4().hex
+        return token
+    except TypeError:
+        # Not weak-referenceable (or not hashable):
+        return str(id(obj))
+
+
+def _update_hash(hasher, obj):
+    """Feed an object into a hashlib hasher"""
+    hasher.update(type(obj).__qualname__.encode())
+
+    if obj is None or isinstance(obj, (bool, int, float, complex)):
+        hasher.update(repr(obj).encode())
+    elif isinstance(obj, (str, os.PathLike)):
+        path = os.fspath(obj)
+        hasher.update(path.encode() if isinstance(path, str) else path)
+        # Paths of existing files also include their size and modification
+        # time, so the results for changed files are not taken from the cache
+        if isinstance(obj, os.PathLike) or os.sep in path:
+            try:
+                stat = os.stat(path)
+                hasher.update(f"{stat.st_size}-{stat.st_mtime_ns}".encode())
+            except (OSError, ValueError):
+                pass
+    elif isinstance(obj, bytes):
+        hasher.update(obj)
+    elif isinstance(obj, np.ndarray):
+        hasher.update(f"{obj.dtype.descr}{obj.shape}".encode())
+        if obj.dtype.hasobject:
+            _update_hash(hasher, obj.tolist())
+        else:
+            hasher.update(np.ascontiguousarray(obj).view(np.uint8).data)
+        if isinstance(obj, np.ma.MaskedArray):
+            _update_hash(hasher, np.ma.getmaskarray(obj))
+    elif isinstance(obj, np.generic):
+        _update_hash(hasher, np.asarray(obj))
+    elif isinstance(obj, (list, tuple)):
+        hasher.update(str(len(obj)).encode())
+        for item in obj:
+            _update_hash(hasher, item)
+    elif isinstance(obj, dict):
+        hasher.update(str(len(obj)).encode())
+        # The order of the items does not matter:
+        for item in sorted(hash_arguments(key, value)
+                           for key, value in obj.items()):
+            hasher.update(item.encode())
+    elif isinstance(obj, (set, frozenset)):
+        hasher.update(str(len(obj)).encode())
+        for item in sorted(hash_arguments(item) for item in obj):
+            hasher.update(item.encode())
+    elif hasattr(obj, "isoformat"):
+        # datetime, date, time:
+        hasher.update(obj.isoformat().encode())
+    elif hasattr(obj, "total_seconds"):
+        hasher.update(repr(obj).encode())
+    elif hasattr(type(obj), "_cache_identity"):
+        # A stable identity, so that results can be found again in the cache
+        # directory by other processes:
+        hasher.update(obj._cache_identity().encode())
+    else:
+        hasher.update(_identity(obj).encode())
+
+
+def hash_arguments(*args, **kwargs):
+    """Create a stable hash of function arguments
+
+    Other than `str(args)`, this hashes the content of numpy arrays
+    completely and is independent of the order of dictionaries. Paths to
+    existing files (strings with a path separator or path-like objects) are
+    combined with the size and modification time of the file.
+    :class:`~typhon.datasets.dataset.Dataset` objects are identified by
+    their class and name. All other objects are identified by their
+    identity (which is only valid in the current process).
+
+    Args:
+        *args: Positional arguments.
+        **kwargs: Keyword arguments.
+
+    Returns:
+        A hexadecimal string.
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+    _update_hash(hasher, args)
+    _update_hash(hasher, kwargs)
+    return hasher.hexdigest()
+
+
+def _nbytes(obj):
+    """Estimate the memory size of a result"""
+    if isinstance(obj, np.ma.MaskedArray):
+        return obj.nbytes + np.ma.getmaskarray(obj).nbytes
+    if isinstance(obj, (np.ndarray, xr.Dataset, xr.DataArray)):
+        return obj.nbytes
+    if isinstance(obj, (list, tuple)):
+        return sum(_nbytes(item) for item in obj)
+    if isinstance(obj, dict):
+        return sum(_nbytes(item) for item in obj.values())
+    return sys.getsizeof(obj)
+
+
+def _read_only(obj):
+    """Return a view of a cached result that cannot be modified in-place"""
+    if isinstance(obj, np.ndarray):
+        view = obj.view()
+        view.flags.writeable = False
+        if isinstance(view, np.ma.MaskedArray) \
+                and view._mask is not np.ma.nomask:
+            # The mask of the view is shared with the cached array:
+            view._mask = view._mask.view()
+            view._mask.flags.writeable = False
+        return view
+    if isinstance(obj, (xr.Dataset, xr.DataArray)):
+        obj = obj.copy(deep=False)
+        variables = obj.variables.values() if isinstance(obj, xr.Dataset) \
+            else [obj.variable, *obj.coords.variables.values()]
+        for variable in variables:
+            if isinstance(variable._data, np.ndarray):
+                variable._data.flags.writeable = False
+        return obj
+    if isinstance(obj, tuple):
+        return tuple(_read_only(item) for item in obj)
+    if isinstance(obj, list):
+        return [_read_only(item) for item in obj]
+    return obj
+
+
+class ResultCache:
+    """Cache for results of expensive functions bounded by bytes
+
+    The results are kept in memory until their total size exceeds
+    `max_bytes`, then the least recently used ones are dropped. Optionally,
+    results are stored in a directory, too (numpy arrays as *npz*,
+    xarray.Dataset objects as netCDF files). Results found there are loaded
+    again instead of calling the function.
+
+    Results are returned without copying. Numpy arrays (also in tuples,
+    lists or xarray objects) are read-only views, hence they cannot be
+    modified by accident. Use their *copy* method if you need to modify
+    them.
+
+    You normally use this class via the :func:`result_cache` decorator.
+
+    Examples:
+
+    .. code-block:: python
+
+        from typhon.utils import ResultCache, hash_arguments
+
+        cache = ResultCache(max_bytes=2**30, directory="/tmp/results")
+
+        key = hash_arguments(filename, fields=["lat", "lon"])
+        data = cache.get(key)
+        if data is None:
+            data = cache.set(key, read(filename, fields=["lat", "lon"]))
+
+        print(cache.statistics)
+    """
+
+    def __init__(self, max_bytes=2**31, directory=None):
+        """Initialize a ResultCache object
+
+        Args:
+            max_bytes: Maximum number of bytes of all results in memory.
+                Results that are bigger than this are not kept in memory at
+                all. Default is 2 GiB.
+            directory: If given, results are also stored in this directory
+                and loaded from there if they are not in memory. Only numpy
+                arrays (also masked and structured ones), tuples or lists of
+                them and xarray.Dataset objects are stored.
+        """
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.statistics = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+        self._lock = threading.RLock()
+        self._results = OrderedDict()
+        self._sizes = {}
+        self._nbytes = 0
+
+    def __contains__(self, key):
+        return key in self._results or self._disk_path(key) is not None
+
+    def __len__(self):
+        return len(self._results)
+
+    def __repr__(self):
+        return f"ResultCache(max_bytes={self.max_bytes}, " \
+               f"directory={self.directory!r})"
+
+    @property
+    def nbytes(self):
+        """Number of bytes of all results in memory"""
+        return self._nbytes
+
+    def clear(self, disk=False):
+        """Remove all results from memory
+
+        Args:
+            disk: If true, remove also all results from the directory.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._results.clear()
+            self._sizes.clear()
+            self._nbytes = 0
+
+        if disk and self.directory is not None \
+                and os.path.isdir(self.directory):
+            for filename in os.listdir(self.directory):
+                if filename.startswith("result-"):
+                    os.remove(os.path.join(self.directory, filename))
+
+    def get(self, key, default=None):
+        """Get a result from the cache
+
+        Args:
+            key: A key (e.g. from :func:`hash_arguments`).
+            default: Returned if the key is not in the cache.
+
+        Returns:
+            The result (see the notes about copying above) or `default`.
+        """
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.statistics["hits"] += 1
+                return _read_only(self._results[key])
+
+        result = self._load(key)
+        if result is not None:
+            self.statistics["disk_hits"] += 1
+            self._remember(key, result)
+            return _read_only(result)
+
+        self.statistics["misses"] += 1
+        return default
+
+    def set(self, key, result):
+        """Put a result into the cache
+
+        Args:
+            key: A key (e.g. from :func:`hash_arguments`).
+            result: The result.
+
+        Returns:
+            A read-only view of `result`. You should use this instead of
+            `result`, since modifying `result` would also modify the cached
+            value.
+        """
+        self._remember(key, result)
+        self._dump(key, result)
+        return _read_only(result)
+
+    def _remember(self, key, result):
+        nbytes = _nbytes(result)
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._results:
+                self._nbytes -= self._sizes[key]
+            self._results[key] = result
+            self._results.move_to_end(key)
+            self._sizes[key] = nbytes
+            self._nbytes += nbytes
+
+            while self._nbytes > self.max_bytes:
+                old_key, _ = self._results.popitem(last=False)
+                self._nbytes -= self._sizes.pop(old_key)
+
+    def _disk_path(self, key):
+        if self.directory is None:
+            return None
+        for suffix in (".npz", ".nc"):
+            path = os.path.join(self.directory, f"result-{key}{suffix}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _load(self, key):
+        path = self._disk_path(key)
+        if path is None:
+            return None
+
+        try:
+            if path.endswith(".nc"):
+                with xr.open_dataset(path) as dataset:
+                    return dataset.load()
+
+            with np.load(path, allow_pickle=False) as file:
+                kind = str(file["kind"])
+                items = [
+                    np.ma.MaskedArray(file[f"{i}"], mask=file[f"{i}_mask"])
+                    if f"{i}_mask" in file else file[f"{i}"]
+                    for i in range(int(file["length"]))
+                ]
+        except (OSError, ValueError, KeyError) as err:
+            logger.warning(f"Could not load cached result {path}: {err}")
+            return None
+
+        if kind == "array":
+            return items[0]
+        return tuple(items) if kind == "tuple" else items
+
+    def _dump(self, key, result):
+        if self.directory is None:
+            return
+
+        if isinstance(result, xr.Dataset):
+            suffix = ".nc"
+        elif isinstance(result, np.ndarray) and not result.dtype.hasobject:
+            suffix = ".npz"
+            kind, items = "array", [result]
+        elif isinstance(result, (tuple, list)) and all(
+                isinstance(item, np.ndarray) and not item.dtype.hasobject
+                for item in result):
+            suffix = ".npz"
+            kind, items = type(result).__name__, result
+        else:
+            logger.debug(
+                f"Cannot store results of type {type(result)} on disk")
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"result-{key}{suffix}")
+
+        # Other processes might read the file while we are writing it:
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            if suffix == ".nc":
+                result.to_netcdf(temp_path, format="NETCDF4")
+            else:
+                arrays = {"kind": kind, "length": len(items)}
+                for i, item in enumerate(items):
+                    arrays[f"{i}"] = np.ma.getdata(item)
+                    if isinstance(item, np.ma.MaskedArray):
+                        arrays[f"{i}_mask"] = np.ma.getmaskarray(item)
+                with open(temp_path, "wb") as file:
+                    np.savez(file, **arrays)
+            os.replace(temp_path, path)
+        except (OSError, ValueError, TypeError) as err:
+            logger.warning(f"Could not store result on disk: {err}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+def result_cache(max_bytes=2**31, directory=None):
+    """Cache the results of a function in a :class:`ResultCache`
+
+    The arguments are hashed with :func:`hash_arguments`, i.e. arrays are
+    compared by their content and paths to files by their size and
+    modification time. The cache is available via the attribute *cache* of
+    the decorated function (e.g. to look at its statistics).
+
+    Like :func:`mutable_cache`, the decorated function accepts the keyword
+    arguments `CLEAR_CACHE` (clear the cache before calling) and `NO_CACHE`
+    (neither use nor fill the cache).
+
+    Args:
+        max_bytes: Maximum number of bytes of the results in memory.
+        directory: If given, results are also stored in this directory.
+
+    Returns:
+        New function that has caching implemented.
+
+    Examples:
+
+    .. code-block:: python
+
+        from typhon.utils import result_cache
+
+        @result_cache(max_bytes=2**30)
+        def read(filename, fields):
+            ...
+
+        data = read("file.nc", ["lat", "lon"])
+        data = read("file.nc", ["lat", "lon"])  # from the cache now
+        print(read.cache.statistics)
+    """
+
+    def decorating_function(user_function):
+        cache = ResultCache(max_bytes=max_bytes, directory=directory)
+
+        def wrapper(*args, **kwargs):
+            if kwargs.pop("CLEAR_CACHE", False):
+                cache.clear()
+            if kwargs.pop("NO_CACHE", False):
+                return user_function(*args, **kwargs)
+
+            key = hash_arguments(user_function.__qualname__, *args, **kwargs)
+            result = cache.get(key)
+            if result is not None:
+                logger.debug(f"Getting result for {user_function} from cache "
+                             f"(key {key})")
+                return result
+
+            return cache.set(key, user_function(*args, **kwargs))
+
+        wrapper.cache = cache
+        return functools.update_wrapper(wrapper, user_function)
+
+    return decorating_function